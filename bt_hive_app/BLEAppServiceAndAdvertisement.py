@@ -8,13 +8,16 @@ from bt_hive_app.characteristics.Modifications_tab.Config_rw_Char import Config_
 from bt_hive_app.characteristics.AudVid_tab.FileInfo_Char import FileInfoCharacteristic
 from bt_hive_app.characteristics.AudVid_tab.FileTransfer_Char import FileTransferCharacteristic, ResetOffsetCharacteristic
 from bt_hive_app.characteristics.AudVid_tab.FileRead_LBL_Char import FileRead_LBL_Characteristic
+from bt_hive_app.characteristics.AudVid_tab.LevelProfile_Char import LevelProfileCharacteristic
 from bt_hive_app.characteristics.Commands_tab.Commands_Char import CommandCharacteristic, CommandCharacteristicWResponse
 from bt_hive_app.characteristics.Sensor_Files.SF_read_Char import SF_Read_Characteristic, SF_Read_LBL_Characteristic, ResetLineOffsetCharacteristic
+from bt_hive_app.characteristics.Sensor_Files.SF_Aggregate_Char import SF_Aggregate_Characteristic
 from bt_hive_app.characteristics.Password.password_char import PasswordVerificationCharacteristic
 from bt_hive_app.characteristics.Sensor_States_Tab.sensor_states import SensorStateCharacteristic
 from bt_hive_app.characteristics.Sensor_Files.sensor_readings import TempCharacteristic, UnitCharacteristic
 
 from bt_hive_app.characteristics.file_sensor_data import CPUFileReadAllCharacteristic
+from bt_hive_app.characteristics.Archive_tab.Catalog_Char import CatalogQueryCharacteristic
 
 
 BLE_SVC_UUID = "00000001-710e-4a5b-8d75-3e5b444bc3cf"
@@ -56,6 +59,7 @@ class BLEService(Service):
         add_sensor_characteristics():
         add_command_characteristics():
         add_sensor_reading_characteristics():
+        add_archive_characteristics():
         is_farenheit():
         set_farenheit():
     """
@@ -77,6 +81,7 @@ class BLEService(Service):
         self.add_sensor_characteristics()
         self.add_command_characteristics()
         self.add_sensor_reading_characteristics()
+        self.add_archive_characteristics()
 
         # Password Verification
         self.add_characteristic(PasswordVerificationCharacteristic(self, '00000601-710e-4a5b-8d75-3e5b444bc3cf', '/home/bee/GATT_server/password.txt'))
@@ -107,6 +112,9 @@ class BLEService(Service):
         self.add_characteristic(FileInfoCharacteristic(self, '00000201-710e-4a5b-8d75-3e5b444bc3cf', '/home/bee/appmais/bee_tmp/audio/', 'audio'));
         self.add_characteristic(FileInfoCharacteristic(self, '00000202-710e-4a5b-8d75-3e5b444bc3cf', '/home/bee/appmais/bee_tmp/video/', 'video'));
 
+        # Characteristic for the per second RMS and peak levels and silent stretches of the most recent audio recording.
+        self.add_characteristic(LevelProfileCharacteristic(self, '00000214-710e-4a5b-8d75-3e5b444bc3cf', '/home/bee/appmais/bee_tmp/audio/'))
+
         # Adding a characteristic for pulling a video file. File pulled in chunks.
         video_file_transfer_characteristic = (FileTransferCharacteristic(self, '00000203-710e-4a5b-8d75-3e5b444bc3cf', '/home/bee/appmais/bee_tmp/video/', 'video'))
         self.add_characteristic(video_file_transfer_characteristic)
@@ -122,9 +130,15 @@ class BLEService(Service):
         self.add_characteristic(read_line_by_line_characteristic)
         self.add_characteristic(ResetOffsetCharacteristic(self, '00000210-710e-4a5b-8d75-3e5b444bc3cf', read_line_by_line_characteristic))
 
-        # audio_file_transfer_characteristic = (FileTransferCharacteristic(self, '00000205-710e-4a5b-8d75-3e5b444bc3cf', '/home/bee/appmais/bee_tmp/audio/', 'audio'))
-        # self.add_characteristic(audio_file_transfer_characteristic)
-        # self.add_characteristic(ResetOffsetCharacteristic(self, '00000206-710e-4a5b-8d75-3e5b444bc3cf', audio_file_transfer_characteristic))
+        # Characteristic for pulling the waveform envelope (int8 min/max pairs) of the most recent audio recording.
+        audio_file_transfer_characteristic = (FileTransferCharacteristic(self, '00000205-710e-4a5b-8d75-3e5b444bc3cf', '/home/bee/appmais/bee_tmp/audio/', 'audio'))
+        self.add_characteristic(audio_file_transfer_characteristic)
+        self.add_characteristic(ResetOffsetCharacteristic(self, '00000206-710e-4a5b-8d75-3e5b444bc3cf', audio_file_transfer_characteristic))
+
+        # Characteristic for pulling the band energy summary (spectrum) of the most recent audio recording.
+        spectrum_transfer_characteristic = (FileTransferCharacteristic(self, '00000215-710e-4a5b-8d75-3e5b444bc3cf', '/home/bee/appmais/bee_tmp/audio/', 'spectrum'))
+        self.add_characteristic(spectrum_transfer_characteristic)
+        self.add_characteristic(ResetOffsetCharacteristic(self, '00000216-710e-4a5b-8d75-3e5b444bc3cf', spectrum_transfer_characteristic))
 
         # Characteristics for pulling sensor file data. Data files collected in the appmais directory.
         self.add_characteristic(FileTransferCharacteristic(self, '00000211-710e-4a5b-8d75-3e5b444bc3cf', '/home/bee/appmais/bee_tmp/cpu/', 'sensor'))
@@ -154,6 +168,9 @@ class BLEService(Service):
         self.add_characteristic(read_line_by_line_characteristic)
         self.add_characteristic(reset_offset_characteristic)
 
+        # Characteristic for charting sensor data, returns min/max/mean/count per time bucket instead of every row.
+        self.add_characteristic(SF_Aggregate_Characteristic(self, '00000309-710e-4a5b-8d75-3e5b444bc3cf', '/home/bee/appmais/bee_tmp/'))
+
     
     def add_sensor_characteristics(self):
         """
@@ -186,6 +203,17 @@ class BLEService(Service):
         self.add_characteristic(UnitCharacteristic(self))
 
 
+    def add_archive_characteristics(self):
+        """
+        Adds characteristics for querying and pulling older recordings from the file catalog
+        """
+        self.add_characteristic(CatalogQueryCharacteristic(self, '00000701-710e-4a5b-8d75-3e5b444bc3cf'))
+
+        catalog_file_transfer_characteristic = FileTransferCharacteristic(self, '00000702-710e-4a5b-8d75-3e5b444bc3cf', '/home/bee/appmais/bee_tmp/', 'catalog')
+        self.add_characteristic(catalog_file_transfer_characteristic)
+        self.add_characteristic(ResetOffsetCharacteristic(self, '00000703-710e-4a5b-8d75-3e5b444bc3cf', catalog_file_transfer_characteristic))
+
+
     def is_farenheit(self):
         """
         Checks if the temperature unit if Fahrenheit
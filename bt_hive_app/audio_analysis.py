@@ -0,0 +1,334 @@
+import json, os, wave
+import numpy as np
+from collections import OrderedDict
+from bt_hive_app.file_index import write_file_atomic, SIDECAR_DIR
+from bt_hive_app.worker_pool import RecordingWorker
+from bt_hive_app.waveform_envelope import EnvelopeBuilder, envelope_path, get_envelope_path
+from bt_hive_app.band_spectrum import SpectrumBuilder, spectrum_path, get_spectrum_path
+
+
+# Recordings (and seconds of a recording) with an RMS level below this are reported as silent
+SILENCE_THRESHOLD = 100
+# Recordings are read and analysed this many seconds at a time, which bounds the memory used by the analysis
+BLOCK_SECONDS = 1
+# Bitrate ffmpeg exports MP3 with by default, used to estimate the size of a recording once compressed
+MP3_BITRATE = 128000
+# Recordings whose metadata is kept in memory, a day of recordings fits easily
+MAX_CACHE_ENTRIES = 256
+# Version of the metadata sidecar, increased whenever the metadata returned by analyse_recording() changes
+METADATA_VERSION = 1
+
+
+def metadata_key(audio_path, stat):
+    return (audio_path, stat.st_size, stat.st_mtime_ns)
+
+
+def metadata_path(audio_path):
+    """
+    Path of the metadata sidecar of a recording.
+    """
+    return os.path.join(SIDECAR_DIR, os.path.basename(audio_path) + '.meta')
+
+
+def save_metadata(path, stat, metadata):
+    """
+    Writes the metadata of a recording to its sidecar as JSON, replacing it atomically.
+
+    Args:
+        path (str): Path of the sidecar
+        stat (os.stat_result): Stat of the recording, stored to detect when the recording changes
+        metadata (dict): Metadata returned by analyse_recording()
+    """
+    sidecar = {'version': METADATA_VERSION, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'metadata': metadata}
+    write_file_atomic(path, json.dumps(sidecar).encode())
+
+
+def load_metadata(audio_path, stat):
+    """
+    Reads the metadata sidecar of a recording if it was written for the current version of the recording.
+
+    Args:
+        audio_path (str): Path of the recording
+        stat (os.stat_result): Stat of the recording
+
+    Returns:
+        dict: Metadata, None if the sidecar is missing or out of date
+    """
+    try:
+        with open(metadata_path(audio_path)) as file:
+            sidecar = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if (sidecar.get('version') != METADATA_VERSION or sidecar.get('size') != stat.st_size
+            or sidecar.get('mtime') != stat.st_mtime_ns):
+        return None
+    return sidecar['metadata']
+
+
+def decode_samples(data, sample_width):
+    """
+    Converts raw little endian PCM data to signed samples.
+
+    Args:
+        data (bytes): Frames read from the WAV file
+        sample_width (int): Bytes per sample, 1 (unsigned), 2, 3, or 4
+
+    Returns:
+        ndarray: Samples of all channels, interleaved, as int32
+    """
+    if sample_width == 1:
+        return np.frombuffer(data, dtype=np.uint8).astype(np.int32) - 128
+    if sample_width == 2:
+        return np.frombuffer(data, dtype='<i2').astype(np.int32)
+    if sample_width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        return np.where(samples & 0x800000, samples - 0x1000000, samples)
+    if sample_width == 4:
+        return np.frombuffer(data, dtype='<i4').astype(np.int32)
+    raise ValueError(f"Unsupported sample width {sample_width}")
+
+
+def read_blocks(wav_file, block_frames):
+    """
+    Reads a WAV file block by block.
+
+    Args:
+        wav_file (Wave_read): Open recording
+        block_frames (int): Frames per block, the last block may be shorter
+
+    Yields:
+        ndarray: Samples of one block, interleaved, as int32
+    """
+    sample_width = wav_file.getsampwidth()
+    while True:
+        data = wav_file.readframes(block_frames)
+        if not data:
+            return
+        yield decode_samples(data, sample_width)
+
+
+def silent_segments(levels, threshold=SILENCE_THRESHOLD):
+    """
+    Finds the runs of silent blocks.
+
+    Args:
+        levels (list): (rms, peak) of every block
+        threshold (int): RMS level below which a block is silent
+
+    Returns:
+        list: [start, end) block ranges of silence
+    """
+    segments = []
+    for block, (rms_level, peak) in enumerate(levels):
+        if rms_level >= threshold:
+            continue
+        if segments and segments[-1][1] == block:
+            segments[-1][1] = block + 1
+        else:
+            segments.append([block, block + 1])
+    return segments
+
+
+def analyse_recording(audio_path):
+    """
+    Computes the metadata and level profile of a recording in a single pass, BLOCK_SECONDS at a time, and writes it to
+    its metadata sidecar along with its waveform envelope (waveform_envelope.py) and band spectrum (band_spectrum.py)
+    sidecars. Runs in the worker process.
+
+    Args:
+        audio_path (str): Path of the .wav recording
+
+    Returns:
+        tuple: Cache key of the analysed version of the recording
+        dict: 'wav_size', 'duration' (s), 'rms', 'peak', 'silent', 'mp3_size' (estimated), 'levels' ((rms, peak) per
+            block), 'silence' ([start, end) block ranges), 'envelope_points', and 'spectrum_rows'
+    """
+    stat = os.stat(audio_path)
+    levels = []
+    sum_squares = 0.0
+    sample_count = 0
+    with wave.open(audio_path, 'rb') as wav_file:
+        frame_rate = wav_file.getframerate()
+        duration = wav_file.getnframes() / frame_rate
+        envelope = EnvelopeBuilder(frame_rate, wav_file.getnchannels())
+        spectrum = SpectrumBuilder(frame_rate, wav_file.getnchannels(), wav_file.getsampwidth(), wav_file.getnframes())
+        for samples in read_blocks(wav_file, frame_rate * BLOCK_SECONDS):
+            envelope.add(samples)
+            spectrum.add(samples)
+            squares = float(np.dot(samples, samples.astype(np.float64)))
+            sum_squares += squares
+            sample_count += len(samples)
+            peak = max(int(samples.max()), -int(samples.min()))
+            levels.append((int(round(np.sqrt(squares / len(samples)))), peak))
+
+        envelope_points = envelope.save(envelope_path(audio_path), stat, wav_file.getsampwidth())
+        spectrum_rows = spectrum.save(spectrum_path(audio_path), stat)
+
+    rms_level = int(round(np.sqrt(sum_squares / sample_count))) if sample_count else 0
+    metadata = {
+        'wav_size': stat.st_size,
+        'duration': duration,
+        'rms': rms_level,
+        'peak': max((peak for _, peak in levels), default=0),
+        'silent': rms_level < SILENCE_THRESHOLD,
+        'mp3_size': int(duration * MP3_BITRATE / 8),
+        'levels': levels,
+        'silence': silent_segments(levels),
+        'envelope_points': envelope_points,
+        'spectrum_rows': spectrum_rows,
+    }
+    save_metadata(metadata_path(audio_path), stat, metadata)
+    return metadata_key(audio_path, stat), metadata
+
+
+def format_level_profile(metadata):
+    """
+    Formats the level profile of a recording for LevelProfileCharacteristic.
+
+    Args:
+        metadata (dict): Metadata returned by analyse_recording()
+
+    Returns:
+        list: Encoded lines, 'second,rms,peak' for every block followed by 'silence,start,end' for every silent run
+    """
+    lines = [f"{block * BLOCK_SECONDS},{rms_level},{peak}\n".encode()
+             for block, (rms_level, peak) in enumerate(metadata['levels'])]
+    lines += [f"silence,{start * BLOCK_SECONDS},{end * BLOCK_SECONDS}\n".encode()
+              for start, end in metadata['silence']]
+    return lines
+
+
+class AudioMetadataCache:
+    """
+    Metadata of recordings keyed by path, size, and mtime, filled by the AudioAnalysisWorker so reads never analyse a
+    recording themselves. Recordings missing from memory are loaded from their metadata sidecar, so a restart does not
+    analyse them again. The least recently used entries are dropped once more than max_entries are kept.
+
+    Attributes:
+        max_entries (int): Upper bound on the number of recordings kept
+        entries (OrderedDict): (path, size, mtime) -> metadata returned by analyse_recording()
+
+    Methods:
+        get(audio_path): Gets the metadata of the current version of a recording
+        add(key, metadata): Stores the metadata of a recording
+    """
+    def __init__(self, max_entries=MAX_CACHE_ENTRIES):
+        """
+        Initialize the class
+
+        Args:
+            max_entries (int): Upper bound on the number of recordings kept
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+
+    def get(self, audio_path):
+        """
+        Gets the metadata of the current version of a recording.
+
+        Args:
+            audio_path (str): Path of the recording
+
+        Returns:
+            dict: Metadata, None if the recording was not analysed yet or changed since
+        """
+        stat = os.stat(audio_path)
+        key = metadata_key(audio_path, stat)
+        metadata = self.entries.get(key)
+        if metadata is not None:
+            self.entries.move_to_end(key)
+            return metadata
+        metadata = load_metadata(audio_path, stat)
+        if metadata is not None:
+            self.add(key, metadata)
+        return metadata
+
+
+    def add(self, key, metadata):
+        """
+        Stores the metadata of a recording, replacing the metadata of older versions of it.
+
+        Args:
+            key (tuple): Key returned by analyse_recording()
+            metadata (dict): Metadata returned by analyse_recording()
+        """
+        for old_key in [k for k in self.entries if k[0] == key[0]]:
+            del self.entries[old_key]
+        self.entries[key] = metadata
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+_audio_metadata_cache = None
+
+
+def get_audio_metadata_cache():
+    """
+    Gets the metadata cache shared by all characteristics.
+
+    Returns:
+        AudioMetadataCache: The shared cache
+    """
+    global _audio_metadata_cache
+    if _audio_metadata_cache is None:
+        _audio_metadata_cache = AudioMetadataCache()
+    return _audio_metadata_cache
+
+
+class AudioAnalysisWorker(RecordingWorker):
+    """
+    Analyses every finished recording once in the worker process and stores the results in the metadata cache, the
+    waveform envelope and band spectrum are written to their sidecars by the job.
+
+    Methods:
+        is_done(path): Checks if the metadata of a recording is cached
+        create_job(path): Gets the analysis job of a recording
+        job_done(path, result): Stores the metadata of a recording
+    """
+    def __init__(self, base_path):
+        """
+        Initialize the class
+
+        Args:
+            base_path (str): Audio directory to watch
+        """
+        RecordingWorker.__init__(self, base_path, '.wav')
+
+
+    def is_done(self, path):
+        return (get_audio_metadata_cache().get(path) is not None and get_envelope_path(path) is not None
+                and get_spectrum_path(path) is not None)
+
+
+    def create_job(self, path):
+        return analyse_recording, (path,)
+
+
+    def job_done(self, path, result):
+        key, metadata = result
+        get_audio_metadata_cache().add(key, metadata)
+        print(f"Analysed {path}: {metadata['duration']:.1f} s, RMS {metadata['rms']}")
+
+
+_audio_analysis_workers = {}
+
+
+def get_audio_analysis_worker(base_path):
+    """
+    Gets the analysis worker for an audio directory, creating and starting it on first use.
+
+    Args:
+        base_path (str): Audio directory
+
+    Returns:
+        AudioAnalysisWorker: Worker shared by every characteristic reading base_path
+    """
+    key = os.path.normpath(base_path)
+    worker = _audio_analysis_workers.get(key)
+    if worker is None:
+        worker = AudioAnalysisWorker(base_path)
+        _audio_analysis_workers[key] = worker
+        worker.start()
+    return worker
@@ -0,0 +1,213 @@
+import io, os, wave
+from collections import OrderedDict
+from pydub import AudioSegment
+from bt_hive_app.worker_pool import get_worker_pool, cpu_too_hot
+
+
+# Excerpts are downmixed to mono and encoded at a bitrate which streams over BLE in a few seconds per second of audio
+EXCERPT_FORMAT = 'mp3'
+EXCERPT_BITRATE = '24k'
+EXCERPT_FRAME_RATE = 16000
+DEFAULT_EXCERPT_SECONDS = 10
+MAX_EXCERPT_SECONDS = 30
+# Upper bound on the bytes of encoded excerpts kept in memory, a 30 second excerpt is about 90 KB
+MAX_CACHE_BYTES = 2 * 1024 * 1024
+
+
+def encode_excerpt(audio_path, start, length):
+    """
+    Encodes length seconds of a recording starting at start. Only the frames of the excerpt are read from the WAV
+    file. Runs in the worker process.
+
+    Args:
+        audio_path (str): Path of the .wav recording
+        start (float): Start of the excerpt in seconds
+        length (float): Length of the excerpt in seconds
+
+    Returns:
+        bytes: The encoded excerpt
+        bool: True if the whole window was encoded, False if it was cut short by the end of the recording
+    """
+    with wave.open(audio_path, 'rb') as wav_file:
+        frame_rate = wav_file.getframerate()
+        first_frame = int(start * frame_rate)
+        if first_frame >= wav_file.getnframes():
+            raise ValueError(f"Excerpt starts after the end of {audio_path}")
+        wav_file.setpos(first_frame)
+        frame_count = int(length * frame_rate)
+        data = wav_file.readframes(frame_count)
+        complete = len(data) == frame_count * wav_file.getsampwidth() * wav_file.getnchannels()
+        audio = AudioSegment(data=data, sample_width=wav_file.getsampwidth(), frame_rate=frame_rate,
+                             channels=wav_file.getnchannels())
+
+    buffer = io.BytesIO()
+    audio.set_channels(1).set_frame_rate(EXCERPT_FRAME_RATE).export(buffer, format=EXCERPT_FORMAT,
+                                                                     bitrate=EXCERPT_BITRATE)
+    return buffer.getvalue(), complete
+
+
+def recording_signature(audio_path):
+    stat = os.stat(audio_path)
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class ExcerptCache:
+    """
+    Keeps encoded excerpts in memory and encodes missing ones in the worker process. Excerpts are keyed by recording
+    path, start, and length. Recordings are only appended to while they are written, so an excerpt whose whole window
+    was encoded stays valid as long as the recording is not replaced or truncated, while an excerpt cut short by the
+    end of the recording is encoded again once the recording changed. Each owner (the transfer session of a device)
+    has at most one excerpt being encoded and no encoding is started while the CPU is hot. The least recently used
+    excerpts are dropped once the cache holds more than max_bytes.
+
+    Attributes:
+        max_bytes (int): Upper bound on the size of the cached excerpts
+        entries (OrderedDict): (path, start, length) -> (encoded excerpt, signature of the recording, True if the whole
+            window was encoded)
+        size (int): Bytes currently cached
+        pending (dict): Key -> (future, signature of the recording, owner) of the excerpts being encoded
+        failed (dict): Key -> signature of the recording an excerpt could not be encoded from, it is only retried once
+            the recording changed
+
+    Methods:
+        request(audio_path, start, length, owner): Starts encoding an excerpt unless it is cached or being encoded
+        get(audio_path, start, length, owner): Gets an encoded excerpt
+        has_failed(audio_path, start, length): Checks if an excerpt could not be encoded from the current recording
+    """
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        """
+        Initialize the class
+
+        Args:
+            max_bytes (int): Upper bound on the size of the cached excerpts
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.pending = {}
+        self.failed = {}
+
+
+    def request(self, audio_path, start, length, owner=None):
+        """
+        Starts encoding an excerpt in the worker process unless it is cached, being encoded, or failed before. Nothing
+        is started while owner already has an excerpt being encoded, the next read requests it again.
+
+        Args:
+            audio_path (str): Path of the recording
+            start (float): Start of the excerpt in seconds
+            length (float): Length of the excerpt in seconds
+            owner (): Session the excerpt is encoded for
+        """
+        key = (audio_path, start, length)
+        signature = recording_signature(audio_path)
+        if key in self.pending or self.lookup(key, signature) is not None or self.failed.get(key) == signature:
+            return
+        if any(pending_owner is owner for _, _, pending_owner in self.pending.values()):
+            return
+        if cpu_too_hot():
+            return
+        self.pending[key] = (get_worker_pool().submit(encode_excerpt, audio_path, start, length), signature, owner)
+        print(f"Encoding {length} s excerpt of {audio_path} from {start} s")
+
+
+    def collect(self):
+        """
+        Moves the excerpts which finished encoding into the cache.
+        """
+        for key, (future, signature, owner) in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[key]
+            try:
+                data, complete = future.result()
+            except Exception as e:
+                print(f"Error encoding excerpt of {key[0]}: {e}")
+                self.failed[key] = signature
+                continue
+            self.failed.pop(key, None)
+            self.drop(key)
+            self.entries[key] = (data, signature, complete)
+            self.size += len(data)
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                _, (old_data, _, _) = self.entries.popitem(last=False)
+                self.size -= len(old_data)
+
+
+    def lookup(self, key, signature):
+        """
+        Gets a cached excerpt if it is still valid for the current version of the recording, dropping it otherwise.
+
+        Args:
+            key (tuple): (path, start, length) of the excerpt
+            signature (tuple): (inode, size, mtime) of the recording
+
+        Returns:
+            bytes: The encoded excerpt, None if it is not cached or out of date
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        data, cached_signature, complete = entry
+        if complete:
+            # The frames of the window do not change while the recording grows
+            valid = cached_signature[0] == signature[0] and cached_signature[1] <= signature[1]
+        else:
+            valid = cached_signature == signature
+        if not valid:
+            self.drop(key)
+            return None
+        self.entries.move_to_end(key)
+        return data
+
+
+    def drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+
+    def get(self, audio_path, start, length, owner=None):
+        """
+        Gets an encoded excerpt, requesting it if it is not cached.
+
+        Args:
+            audio_path (str): Path of the recording
+            start (float): Start of the excerpt in seconds
+            length (float): Length of the excerpt in seconds
+            owner (): Session the excerpt is read by
+
+        Returns:
+            bytes: The encoded excerpt, None while it is being encoded or if it could not be encoded
+        """
+        self.collect()
+        data = self.lookup((audio_path, start, length), recording_signature(audio_path))
+        if data is None:
+            self.request(audio_path, start, length, owner)
+        return data
+
+
+    def has_failed(self, audio_path, start, length):
+        """
+        Checks if an excerpt could not be encoded from the current version of the recording.
+
+        Returns:
+            bool: True if encoding failed, e.g. the excerpt starts after the end of the recording
+        """
+        return self.failed.get((audio_path, start, length)) == recording_signature(audio_path)
+
+
+_excerpt_cache = None
+
+
+def get_excerpt_cache():
+    """
+    Gets the excerpt cache shared by all characteristics.
+
+    Returns:
+        ExcerptCache: The shared cache
+    """
+    global _excerpt_cache
+    if _excerpt_cache is None:
+        _excerpt_cache = ExcerptCache()
+    return _excerpt_cache
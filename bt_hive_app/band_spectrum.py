@@ -0,0 +1,159 @@
+import math, os, struct
+import numpy as np
+from bt_hive_app.file_index import write_file_atomic, SIDECAR_DIR
+
+
+# Band edges in Hz, narrow bands around the colony hum (fundamental around 200 - 500 Hz) and wider ones above it
+BAND_EDGES = (50, 100, 150, 200, 250, 300, 350, 400, 450, 500, 600, 800, 1000, 1500, 2000, 4000)
+# Frames per FFT window, about 93 ms and 10.8 Hz per bin at 44.1 kHz
+FFT_SIZE = 4096
+# Seconds of audio summarised by one row, raised for long recordings so there are at most MAX_ROWS rows
+ROW_SECONDS = 10
+MAX_ROWS = 64
+
+# Sidecar layout: header, the band edges (uint16 Hz each), then one row per ROW_SECONDS
+#   header: magic, version, recording size, recording mtime (ns), frame rate, frames per row, band count, row count
+#   row:    dominant frequency (uint16 Hz), then the level of every band in dB below a full scale sine (uint8, 255 for
+#           silence)
+SPECTRUM_MAGIC = b'HSPC'
+SPECTRUM_VERSION = 1
+SPECTRUM_HEADER = struct.Struct('<4sBQqIIBI')
+BAND_EDGE = struct.Struct('<H')
+DOMINANT_FREQUENCY = struct.Struct('<H')
+
+
+def spectrum_path(audio_path):
+    """
+    Path of the spectrum sidecar of a recording.
+    """
+    return os.path.join(SIDECAR_DIR, os.path.basename(audio_path) + '.spc')
+
+
+class SpectrumBuilder:
+    """
+    Computes the band energies of a recording block by block with Hann windowed FFTs of the channels' mean. The power
+    spectra of the windows starting in a row are averaged, each row is then reduced to its band levels and the
+    frequency with the most energy.
+
+    Attributes:
+        frame_rate (int): Frame rate of the recording
+        channels (int): Number of interleaved channels
+        full_scale (int): Largest sample value of the recording's sample width
+        row_frames (int): Frames summarised by one row
+        window (ndarray): Hann window
+        bins (ndarray): Frequency of every FFT bin
+        pending (ndarray): Frames not yet covered by a whole window
+        position (int): Frame the pending frames start at
+        sums (dict): Row -> [sum of the window power spectra, window count]
+        rows (list): Encoded rows
+
+    Methods:
+        add(samples): Adds the windows of a block
+        save(path, stat): Writes the sidecar
+    """
+    def __init__(self, frame_rate, channels, sample_width, frame_count):
+        """
+        Initialize the class
+
+        Args:
+            frame_rate (int): Frame rate of the recording
+            channels (int): Number of interleaved channels
+            sample_width (int): Bytes per sample
+            frame_count (int): Number of frames in the recording, used to size the rows
+        """
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.full_scale = 1 << (8 * sample_width - 1)
+        duration = frame_count / frame_rate
+        self.row_frames = frame_rate * max(ROW_SECONDS, math.ceil(duration / MAX_ROWS))
+        self.window = np.hanning(FFT_SIZE)
+        self.bins = np.fft.rfftfreq(FFT_SIZE, 1 / frame_rate)
+        self.pending = np.zeros(0)
+        self.position = 0
+        self.sums = {}
+        self.rows = []
+
+
+    def add(self, samples):
+        """
+        Adds the whole windows covered by a block, the frames left over are kept for the next block.
+
+        Args:
+            samples (ndarray): Interleaved samples of the block
+        """
+        frames = np.concatenate((self.pending, samples.reshape(-1, self.channels).mean(axis=1)))
+        count = len(frames) // FFT_SIZE
+        if count:
+            windows = frames[:count * FFT_SIZE].reshape(count, FFT_SIZE) * self.window
+            power = np.abs(np.fft.rfft(windows, axis=1)) ** 2
+            rows = (self.position + np.arange(count) * FFT_SIZE) // self.row_frames
+            for row in np.unique(rows):
+                entry = self.sums.setdefault(int(row), [0, 0])
+                entry[0] = entry[0] + power[rows == row].sum(axis=0)
+                entry[1] += int((rows == row).sum())
+            # Rows before the current one are complete
+            for row in sorted(r for r in self.sums if r < rows[-1]):
+                self.finish_row(row)
+        self.pending = frames[count * FFT_SIZE:]
+        self.position += count * FFT_SIZE
+
+
+    def finish_row(self, row):
+        """
+        Reduces the averaged spectrum of a row to its dominant frequency and band levels.
+        """
+        total, count = self.sums.pop(row)
+        spectrum = total / count
+        # Power of the bin holding a full scale sine
+        reference = (self.full_scale * self.window.sum() / 2) ** 2
+        in_range = (self.bins >= BAND_EDGES[0]) & (self.bins < BAND_EDGES[-1])
+        dominant = int(round(self.bins[in_range][np.argmax(spectrum[in_range])]))
+        levels = bytearray()
+        for low, high in zip(BAND_EDGES, BAND_EDGES[1:]):
+            energy = spectrum[(self.bins >= low) & (self.bins < high)].sum()
+            level = -10 * math.log10(energy / reference) if energy > 0 else 255
+            levels.append(min(max(int(round(level)), 0), 255))
+        self.rows.append(DOMINANT_FREQUENCY.pack(min(dominant, 0xFFFF)) + bytes(levels))
+
+
+    def save(self, path, stat):
+        """
+        Finishes the last row and writes the sidecar, replacing it atomically.
+
+        Args:
+            path (str): Path of the sidecar
+            stat (os.stat_result): Stat of the recording, stored to detect when the recording changes
+
+        Returns:
+            int: Number of rows
+        """
+        for row in sorted(self.sums):
+            self.finish_row(row)
+        header = SPECTRUM_HEADER.pack(SPECTRUM_MAGIC, SPECTRUM_VERSION, stat.st_size, stat.st_mtime_ns,
+                                      self.frame_rate, self.row_frames, len(BAND_EDGES) - 1, len(self.rows))
+        header += b''.join(BAND_EDGE.pack(edge) for edge in BAND_EDGES)
+        write_file_atomic(path, header + b''.join(self.rows))
+        return len(self.rows)
+
+
+def get_spectrum_path(audio_path):
+    """
+    Gets the spectrum sidecar of a recording if it was computed for the current version of the recording.
+
+    Args:
+        audio_path (str): Path of the recording
+
+    Returns:
+        str: Path of the sidecar, None if it is missing or out of date
+    """
+    path = spectrum_path(audio_path)
+    try:
+        stat = os.stat(audio_path)
+        with open(path, 'rb') as file:
+            header = SPECTRUM_HEADER.unpack(file.read(SPECTRUM_HEADER.size))
+    except (OSError, struct.error):
+        return None
+    magic, version, size, mtime = header[:4]
+    if magic != SPECTRUM_MAGIC or version != SPECTRUM_VERSION or size != stat.st_size or mtime != stat.st_mtime_ns:
+        return None
+    return path
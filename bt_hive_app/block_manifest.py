@@ -0,0 +1,67 @@
+import struct, zlib
+
+
+# Files are checksummed in blocks of this many bytes
+BLOCK_SIZE = 4096
+# Manifest header: file size, block size, number of blocks, followed by the CRC32 of every block (uint32 each)
+MANIFEST_HEADER = struct.Struct('<III')
+BLOCK_CRC = struct.Struct('<I')
+# Resumed chunks start with the file offset of their data, a chunk holding only RESUME_END ends the resume
+CHUNK_OFFSET = struct.Struct('<I')
+RESUME_END = 0xFFFFFFFF
+
+
+def block_count(size, block_size=BLOCK_SIZE):
+    """
+    Number of blocks a file of size bytes is split into, the last block may be shorter.
+    """
+    return (size + block_size - 1) // block_size
+
+
+def build_manifest(file, size, block_size=BLOCK_SIZE):
+    """
+    Builds the manifest of a file: its size, the block size, and the CRC32 of every block. The application compares
+    the checksums against the blocks it already holds to find the ones it still needs.
+
+    Args:
+        file (): File or buffer opened in binary mode
+        size (int): Number of bytes of the file to cover
+        block_size (int): Size of a block
+
+    Returns:
+        bytes: The manifest
+    """
+    count = block_count(size, block_size)
+    manifest = bytearray(MANIFEST_HEADER.pack(size, block_size, count))
+    file.seek(0)
+    for block in range(count):
+        data = file.read(min(block_size, size - block * block_size))
+        manifest += BLOCK_CRC.pack(zlib.crc32(data) & 0xFFFFFFFF)
+    return bytes(manifest)
+
+
+def missing_ranges(held_blocks, size, block_size=BLOCK_SIZE):
+    """
+    Gets the byte ranges of the blocks the application does not hold yet. Neighbouring blocks are merged into one range.
+
+    Args:
+        held_blocks (bytes): Bitmap of the blocks the application holds with a matching checksum, bit i % 8 of byte
+            i // 8 is set for block i. Blocks past the end of the bitmap count as missing.
+        size (int): Size of the file
+        block_size (int): Size of a block
+
+    Returns:
+        list: [start, end) byte ranges still to be sent, in file order
+    """
+    ranges = []
+    for block in range(block_count(size, block_size)):
+        byte = block // 8
+        if byte < len(held_blocks) and held_blocks[byte] & (1 << (block % 8)):
+            continue
+        start = block * block_size
+        end = min(start + block_size, size)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
@@ -0,0 +1,74 @@
+import dbus, os
+from service import Characteristic
+import bt_hive_app.helper_methods as help
+from bt_hive_app.file_catalog import get_file_catalog, get_catalog_updater, from_timestamp
+
+
+class CatalogQueryCharacteristic(Characteristic):
+    """
+    Characteristic used to look up recorded files by sensor type and time range. The handles returned can be written
+    to a FileTransferCharacteristic with file_type 'catalog' to pull the file.
+
+    Attributes:
+        service (): Service containing this characteristic
+        uuid (str): uuid of the characteristic
+
+    Methods:
+        WriteValue(value, options): Runs a query against the file catalog
+        ReadValue(options): Returns the next page of query results
+    """
+    def __init__(self, service, uuid):
+        """
+        Initialize the class
+
+        Args:
+            service (): Service containing this characteristic
+            uuid (str): uuid of the characteristic
+        """
+        Characteristic.__init__(
+            self, uuid,
+            ['read', 'write'], service)
+        self.results = []
+        self.result_offset = 0
+        # The catalog is kept up to date in the background, queries only read it
+        get_catalog_updater()
+
+
+    def WriteValue(self, value, options):
+        """
+        Runs a query against the file catalog. The catalog is updated by a background thread (at most UPDATE_INTERVAL
+        seconds behind), a query also wakes the thread so the next query sees files recorded since.
+
+        Args:
+            value (): Query from the application, e.g. 'sensor=scale,start=2024-06-01 00-00-00,end=2024-06-01 23-59-59'
+            options (): Additional options for writing value
+        """
+        try:
+            query = help.parse_options(value)
+            rows = get_file_catalog().query(query['sensor'], query['start'], query['end'])
+            get_catalog_updater().request_update()
+            self.results = [f"{handle},{from_timestamp(recorded_at)},{size},{os.path.basename(path)}\n".encode()
+                            for handle, path, recorded_at, size in rows]
+            print(f"Catalog query {query} matched {len(self.results)} files")
+        except Exception as e:
+            print(f"Error querying catalog: {e}")
+            self.results = []
+        self.result_offset = 0
+
+
+    def ReadValue(self, options):
+        """
+        Returns as many results as fit in one read, one 'handle,recorded_at,size,file_name' line per file.
+
+        Args:
+            options (): Additional options for reading value
+
+        Returns:
+            list: Lines of results, 'EOF' once all results have been read.
+        """
+        if self.result_offset >= len(self.results):
+            self.result_offset = 0
+            return [dbus.Byte(b) for b in 'EOF'.encode()]
+
+        data, self.result_offset = help.pack_lines(self.results, self.result_offset, help.get_payload_size(options))
+        return [dbus.Byte(b) for b in data]
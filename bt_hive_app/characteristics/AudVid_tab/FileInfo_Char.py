@@ -1,7 +1,30 @@
 import dbus, os
 from service import Characteristic
 import bt_hive_app.helper_methods as help
-from pydub import AudioSegment
+from bt_hive_app.audio_analysis import get_audio_metadata_cache, get_audio_analysis_worker
+from bt_hive_app.transfer_sessions import SessionTable
+
+
+class FileInfoSession:
+    """
+    Response format selected by one connected device.
+
+    Attributes:
+        extended (bool): True to append the duration and report recordings not analysed yet as pending
+    """
+    def __init__(self):
+        """
+        Initialize the class
+        """
+        self.extended = False
+
+
+    def reset(self):
+        pass
+
+
+    def close(self):
+        pass
 
 
 class FileInfoCharacteristic(Characteristic):
@@ -13,10 +36,11 @@ class FileInfoCharacteristic(Characteristic):
         uuid (str): uuid for the characteristic 
         file_path (str): Path of file data is being pulled from
         file_type (str): Either 'audio' or 'video' 
+        sessions (SessionTable): FileInfoSession of each connected device
     
     Methods:
         ReadValue(): Oversees process of reading file data
-        calculate_rms_and_check_silence(audio_segment): Calculates RMS level of audio segment
+        WriteValue(value, options): Selects the response format
     """
     def __init__(self, service, uuid, file_path, file_type):
         """
@@ -30,71 +54,80 @@ class FileInfoCharacteristic(Characteristic):
         """
         super().__init__(
             uuid,
-            ['read'],
+            ['read', 'write'],
             service)
         self.file_path = file_path
         self.file_type = file_type
+        self.sessions = SessionTable(FileInfoSession)
+        if file_type == 'audio':
+            # Analyse finished recordings in the background so reads return immediately
+            get_audio_analysis_worker(file_path)
 
 
     def ReadValue(self, options):
         """
-        Function responsible for reading information from file at file_path
+        Function responsible for reading information from file at file_path. Audio metadata comes from the cache
+        filled by the background analysis (audio_analysis.py), a recording which was not analysed yet is queued. In the
+        extended format it is reported as pending, otherwise nothing is returned until it has been analysed.
 
         Returns:
-
+            list: 'path, File Size: <wav> bytes, File Size: <mp3> bytes, RMS Level: <rms>, Silence Detected: Yes|No'
+                as bytes, followed by ', Duration: <s> s' in the extended format where the silence can also be 'Pending'
         """
-        temp_file_path = self.file_path
-
-        # Get most recent sensor file
-        if self.file_type == 'audio':
-            temp_file_path = help.get_most_recent_audio_file(temp_file_path)
-        elif self.file_type == 'video':
-            temp_file_path = help.get_most_recent_video_file(temp_file_path)
-
-        # Get file size
-        file_size_wav = os.path.getsize(temp_file_path)
-
-        # Convert .wav file to .mp3
-        if temp_file_path.endswith('.wav'):
-            audio = AudioSegment.from_wav(temp_file_path)
-            mp3_file_name = os.path.basename(temp_file_path).replace('.wav', '.mp3')
-            mp3_file_path = os.path.join('/home/bee/GATT_server', mp3_file_name)
-            audio.export(mp3_file_path, format='mp3')
-            file_size_mp3 = os.path.getsize(mp3_file_path)
-            os.remove(mp3_file_path)
-
-            # Calculate RMS level
-            rms_level, silence_detected = self.calculate_rms_and_check_silence(audio)
-        else:
+        try:
+            extended = self.sessions.get(options).extended
+            temp_file_path = self.file_path
+
+            # Get most recent sensor file
+            if self.file_type == 'audio':
+                temp_file_path = help.get_most_recent_audio_file(temp_file_path)
+            elif self.file_type == 'video':
+                temp_file_path = help.get_most_recent_video_file(temp_file_path)
+
+            # Get file size
+            file_size_wav = os.path.getsize(temp_file_path)
             file_size_mp3 = 0
             rms_level = 0
-            silence_detected = False
-
-        # Return file data
-        file_info = (f"{temp_file_path}, File Size: {file_size_wav} bytes, File Size: {file_size_mp3} bytes, "
-                     f"RMS Level: {rms_level}, Silence Detected: {'Yes' if silence_detected else 'No'}")
-        print('FileInfoCharacteristic Read: {}'.format(file_info))
-
-        return [dbus.Byte(c) for c in file_info.encode()]
-    
-
-    def calculate_rms_and_check_silence(self, audio_segment):
+            silence_detected = 'No'
+            duration = 0
+
+            if temp_file_path.endswith('.wav'):
+                metadata = get_audio_metadata_cache().get(temp_file_path)
+                if metadata is None:
+                    get_audio_analysis_worker(self.file_path).request(temp_file_path)
+                    if not extended:
+                        print(f"{temp_file_path} not analysed yet")
+                        return []
+                    silence_detected = 'Pending'
+                else:
+                    file_size_mp3 = metadata['mp3_size']
+                    rms_level = metadata['rms']
+                    silence_detected = 'Yes' if metadata['silent'] else 'No'
+                    duration = metadata['duration']
+
+            # Return file data
+            file_info = (f"{temp_file_path}, File Size: {file_size_wav} bytes, File Size: {file_size_mp3} bytes, "
+                         f"RMS Level: {rms_level}, Silence Detected: {silence_detected}")
+            if extended:
+                file_info += f", Duration: {duration:.1f} s"
+            print('FileInfoCharacteristic Read: {}'.format(file_info))
+
+            return [dbus.Byte(c) for c in file_info.encode()]
+        except Exception as e:
+            print(f"Error reading file info: {e}")
+            return []
+
+
+    def WriteValue(self, value, options):
         """
-        Function used to calculate the rms level of the audio recording and determine if it is silent
+        Selects the response format of the device which wrote. 'format=extended' appends the duration of the
+        recording and reports recordings not analysed yet with 'Silence Detected: Pending', 'format=basic' returns to
+        the original response.
 
         Args:
-            audio_segment (): audio segment taken from the read .wav file
-        
-        Returns:
-            int: RMS level of audio segment
-            bool: True if silence was detected, False otherwise
+            value (): 'format=basic|extended' sent from the application
+            options (): Additional options for writing value
         """
-        rms_level = audio_segment.rms
-        print('RMS Level: {}'.format(rms_level))
-        
-        # Silence threshold
-        silence_threshold = 100
-        silence_detected = rms_level < silence_threshold
-        print('Silence detected' if silence_detected else 'Sound detected')
-
-        return rms_level, silence_detected
+        request = help.parse_options(value)
+        if request.get('format') in ('basic', 'extended'):
+            self.sessions.get(options).extended = request['format'] == 'extended'
@@ -1,6 +1,8 @@
-import dbus, os
+import dbus
 from service import Characteristic
-from datetime import datetime
+import bt_hive_app.helper_methods as help
+from bt_hive_app.line_index import LineTransfer
+from bt_hive_app.transfer_sessions import SessionTable
 
 
 class FileRead_LBL_Characteristic(Characteristic):
@@ -11,11 +13,12 @@ class FileRead_LBL_Characteristic(Characteristic):
         service (): Service containing this characteristic
         uuid (str): uuid of the characteristic
         base_path (str): Path of directory to get most recent file from
+        sessions (SessionTable): Position and settings (LineTransfer) of each connected device's read through the file
     
     Methods:
-        get_most_recent_file(base_path): Gets most recent file at base_path
         ReadValue(): Reads line at offset from file
-        reset(): Resets offset to 0
+        WriteValue(value, options): Selects line or batched reads, CSV or compact format, or a time range
+        reset_offset(): Resets offset to 0
     """
     def __init__(self, service, uuid, base_path):
         """
@@ -24,68 +27,18 @@ class FileRead_LBL_Characteristic(Characteristic):
         Args:
             service: Service the characteristic is located under
             uuid (str): Characteristic's UUID
-            base_path (str): Full path up to where get_most_recent_file() needs to be called.
+            base_path (str): Full path up to where help.get_most_recent_csv_file() needs to be called.
         """
         Characteristic.__init__(
             self,
             uuid,
-            ['read'],
+            ['read', 'write'],
             service)
         self.folder_path = base_path
-        self.line_offset = -1
+        self.sessions = SessionTable(LineTransfer)
         # print(f"Characteristic initialized with UUID: {uuid}")
     
 
-    def get_most_recent_file(self, base_path):
-        """
-        Function used to get most recent file from the base_path. Ensures were pulling the most up to date info from the Pi.
-
-        Args:
-            base_path (str): Path of directory we are pulling most recent file from.
-
-        Returns:
-            str: Full path of the most recent file in the base_path directory if successful, None otherwise.
-
-        Raises:
-            ValueError: If no files are found in the directory.
-        """
-        # List all directories in the base path
-        entries = os.listdir(base_path)
-        
-        # Filter out possible non directory entries or directories which dont match the data format
-        date_dirs = []
-        for entry in entries:
-            entry_path = os.path.join(base_path, entry)
-            if os.path.isdir(entry_path):
-                try:
-                    # Try to parse the directory name as a date
-                    date = datetime.strptime(entry, "%Y-%m-%d")
-                    date_dirs.append((entry, date))
-                except ValueError:
-                    # Skip directories that don't match the date format
-                    pass
-        if not date_dirs:
-            return None
-
-        # Find most recent date
-        most_recent_dir = max(date_dirs, key=lambda x: x[1])[0]
-        full_path = os.path.join(base_path, most_recent_dir)
-
-        # List files in this directory
-        files = []
-        most_recent_file = '';
-        for file in os.listdir(full_path):
-            if file.endswith('.csv'):
-                files.append(file)
-                most_recent_file = file
-
-        if (len(files) < 1):
-            raise ValueError(f"No files in the directory {full_path}, found {len(files)}")
-        
-        # Get full path of the file
-        return (full_path + '/' + most_recent_file)
-
-
     def ReadValue(self, options):
         """
         Function responsible for reading line from specified file.
@@ -93,20 +46,12 @@ class FileRead_LBL_Characteristic(Characteristic):
         Returns:
             list: Contains line of data if successful, empty otherwise.
         """
-        self.file_path = self.get_most_recent_file(self.folder_path)
+        file_path = help.get_most_recent_csv_file(self.folder_path)
 
-        if self.file_path is not None:
+        if file_path is not None:
             try:
-                with open(self.file_path, 'r') as file:
-                    lines = file.readlines()
-                    all_data = ''.join(lines)
-                    # print(f"Returning data: {all_data}")
-                    if (self.line_offset >= len(lines)):
-                        self.line_offset = -1
-                        return [dbus.Byte(b) for b in 'EOF'.encode()]
-                    
-                    self.line_offset += 1
-                    return [dbus.Byte(b) for b in lines[self.line_offset].encode()]
+                data = self.sessions.get(options).read(file_path, help.get_payload_size(options))
+                return [dbus.Byte(b) for b in data]
             except Exception as e:
                 # Error while reading file
                 return []
@@ -115,10 +60,26 @@ class FileRead_LBL_Characteristic(Characteristic):
             return []
         
 
-    def reset_offset(self):
+    def WriteValue(self, value, options):
+        """
+        Switches between returning one line per read ('mode=line') and returning as many lines as fit in one read
+        ('mode=batch'), and between CSV text ('format=csv') and the compact binary format ('format=compact').
+        Writing 'start=HH-MM-SS' and/or 'end=HH-MM-SS' limits the next read through the file to the rows recorded in
+        that range.
+
+        Args:
+            value (): Mode, format, and/or time range sent from the application
+            options (): Additional options for writing value
+        """
+        self.sessions.get(options).configure(help.parse_options(value))
+
+
+    def reset_offset(self, options=None):
         """
         Function responsible for resetting the offset, ensures we start reading from the beginning of the file.
+
+        Args:
+            options (): Options of the reset write, only the session of the device it came from is reset. Every
+                session is reset if None.
         """
-        self.line_offset = -1
-        self.file_path = None
-        self.lines = []
+        self.sessions.reset(options)
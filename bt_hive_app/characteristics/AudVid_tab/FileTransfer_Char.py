@@ -1,25 +1,122 @@
-import dbus, os, subprocess
+import dbus, io, os, subprocess
 from service import Characteristic
 import bt_hive_app.helper_methods as help
+from bt_hive_app.file_catalog import get_file_catalog
+from bt_hive_app.encoded_files import get_encoded_file_cache, COMPACT, ZLIB
+from bt_hive_app.frame_cache import get_frame_cache, VIDEO_FRAME_NUMBER
+from bt_hive_app.h264_index import get_keyframe_indexer
+from bt_hive_app.audio_analysis import get_audio_analysis_worker
+from bt_hive_app.waveform_envelope import get_envelope_path
+from bt_hive_app.band_spectrum import get_spectrum_path
+from bt_hive_app.audio_excerpts import get_excerpt_cache, DEFAULT_EXCERPT_SECONDS, MAX_EXCERPT_SECONDS
+from bt_hive_app.video_previews import get_preview_worker, get_preview_path, PREVIEW_KINDS, FRAME, THUMBNAIL, \
+    THUMBNAIL_WIDTH, THUMBNAIL_QUALITY
+from bt_hive_app.block_manifest import build_manifest, missing_ranges, CHUNK_OFFSET, RESUME_END
+from bt_hive_app.transfer_sessions import FileSession, SessionTable, session_key
+
+
+# Default time between two notifications of a streamed transfer in ms
+STREAM_INTERVAL = 15
+# Chunks sent per timeout when BlueZ handed out a notify socket, sending to it does not block the main loop
+STREAM_BURST = 8
+# Sent instead of the file while it is still being prepared in the background, the application reads again later
+PENDING = b'Pending'
+
+
+class FileTransferSession(FileSession):
+    """
+    Transfer state of one connected device, on top of the open file and cursor of a FileSession.
+
+    Attributes:
+        stateless (bool): True if the offset passed with each read selects the chunk instead of the cursor
+        compact (bool): True to transfer sensor files in the compact format of sensor_codec.py
+        compress (bool): True to transfer sensor files compressed with zlib
+        quality (int): JPEG quality of video frames
+        width (int): Width video frames are scaled down to, None for full resolution
+        preview (str): Video preview to transfer, one of video_previews.PREVIEW_KINDS
+        excerpt (tuple): (recording path, start, length) of the audio excerpt to transfer instead of the waveform
+            envelope, None for the envelope
+        catalog_path (str): File selected with a catalog handle
+        source (): Open file, or buffer holding the encoded file in compact or compressed mode, chunks are read from it
+        source_size (int): Size of source
+        pinned (bool): True once a manifest was built, source is then kept for the following reads and resumes
+        manifest (bytes): Manifest being read, None outside of a manifest read
+        resume_ranges (list): [start, end) byte ranges still to be sent by a resume, None outside of a resume
+    """
+    def __init__(self):
+        """
+        Initialize the class
+        """
+        FileSession.__init__(self)
+        self.stateless = False
+        self.compact = False
+        self.compress = False
+        self.quality = help.DEFAULT_JPEG_QUALITY
+        self.width = None
+        self.preview = FRAME
+        self.excerpt = None
+        self.catalog_path = None
+        self.source = None
+        self.source_size = 0
+        self.pinned = False
+        self.manifest = None
+        self.resume_ranges = None
+
+
+    def reset(self):
+        FileSession.reset(self)
+        self.pinned = False
+        self.manifest = None
+        self.resume_ranges = None
+
+
+    def close(self):
+        FileSession.close(self)
+        self.source = None
+        self.source_size = 0
+        self.pinned = False
+        self.manifest = None
+        self.resume_ranges = None
 
 
 class FileTransferCharacteristic(Characteristic):
     """
-    The following characteristic transfers a file from the pi to the application.
+    The following characteristic transfers a file from the pi to the application. Every connected device gets its own
+    FileTransferSession (keyed by the 'device' option BlueZ passes), so several devices can transfer at the same time
+    and the file stays open between chunks. Streamed transfers use the notify socket BlueZ hands out through
+    AcquireNotify when the application supports it. Transfers can be resumed after a dropped connection by reading
+    the block manifest of the file and sending the blocks already held.
 
     Attributes:
         service (): Service containing this characteristic
         uuid (str): uuid of the characteristic
         file_path (str): Path of the file being transferred
-        file_type (str): Either 'video', audio', 'sensor', or 'other'
+        file_type (str): Either 'video', 'audio', 'spectrum', 'sensor', 'catalog', or 'other'
+        sessions (SessionTable): FileTransferSession of each connected device
+        notifying (bool): True while the application is subscribed to notifications
+        streaming (bool): True while chunks are being pushed as notifications
     
     Methods:
-        ReadValue(): Passes file to other read method based on file_type.
-        ReadStaticFile(): Reads file directly from file path.
-        ReadVideoFile(): Reads frame from most recent video file.
-        ReadWaveformFile(): Reads waveform image from
+        ReadValue(): Reads the next chunk of the file, manifest, or resume.
+        WriteValue(value, options): Selects the file to transfer when file_type is 'catalog', the sensor file format,
+            or the transfer mode, or starts a manifest read or a resume.
+        StartNotify(): Called when the application subscribes to notifications.
+        StopNotify(): Called when the application unsubscribes, cancels a streamed transfer.
+        start_stream(request, options): Starts pushing the file as notifications.
+        stop_stream(options): Cancels a streamed transfer.
+        stream_callback(stream_id): Sends the next chunk of a streamed transfer.
+        transfer_finished(session): Checks if a session has nothing left to send after a short chunk.
+        open_source(session): Opens the file the next transfer reads from.
+        select_excerpt(session, request): Selects the audio excerpt to transfer.
+        load_manifest(session): Builds the block manifest of the file.
+        resume(session, held_blocks): Starts sending only the blocks the application does not hold.
+        read_resume_chunk(session, options): Reads the next chunk of a resume.
+        read_offset(session, options): Gets the offset of the next chunk.
+        read_chunk(session, file, options): Reads the chunk selected by the offset from an open file.
         reset_offset(): Resets offset to 0
     """
+    acquire_notify = True
+
     def __init__(self, service, uuid, file_path, file_type):
         """
         Initialize the class
@@ -28,151 +125,473 @@ class FileTransferCharacteristic(Characteristic):
             service (): Service the characteristic will be located under
             uuid (str): This characteristic's UUID
             file_path (str): Path of the file which needs to be transferred
-            file_type (str): Either 'video', 'audio', 'sensor', or 'other'.
+            file_type (str): Either 'video', 'audio', 'spectrum', 'sensor', 'catalog', or 'other'.
         """
         Characteristic.__init__(
             self,
             uuid,
-            ['read'],
+            ['read', 'write', 'notify'],
             service)
         self.file_type = file_type
         self.file_path = file_path
-        self.offset = 0
+        self.sessions = SessionTable(FileTransferSession)
+        self.notifying = False
+        self.streaming = False
+        self.stream_id = 0
+        self.stream_options = None
+        self.stream_pending = None
+        self.stream_interval = STREAM_INTERVAL
+        if file_type == 'video':
+            # Index finished recordings in the background so frame extraction can seek to a keyframe, and prepare
+            # their previews so the first transfer does not have to decode the video
+            get_keyframe_indexer(file_path)
+            get_preview_worker(file_path)
+        elif file_type in ('audio', 'spectrum'):
+            # Waveform envelopes and band spectra are computed by the background audio analysis
+            get_audio_analysis_worker(file_path)
         # print(f"FileTransferCharacteristic initialized with UUID: {uuid}")
     
 
     def ReadValue(self, options):
         """
-        Function called by the application. Calls read method based off of file_type.
+        Function called by the application. Reads the next chunk of the manifest or resume in progress, or of the file.
+        The file is opened at the start of a transfer and read from the session afterwards.
 
-        Returns:
+        Args:
+            options (): Additional options for reading value, 'mtu' sets the chunk size and in stateless mode 'offset'
+                selects the chunk
 
+        Returns:
+            list: Chunk of the file, a chunk shorter than the payload size is the last one. PENDING if the file is still
+                being prepared in the background.
         """
-        if self.file_type == 'video':
-            return self.ReadVideoFile()
-        elif self.file_type == 'audio':
-            return self.readWaveformFile()
-        elif self.file_type == 'other':
-            result = self.ReadStaticFile(self.file_path)
-            return result
-        elif self.file_type == 'sensor':
-            base_path = help.get_most_recent_sensor_file(self.file_path)
-            return self.ReadStaticFile(base_path)
+        session = self.sessions.get(options)
+        try:
+            if session.manifest is not None:
+                chunk, last_chunk = self.read_chunk(session, io.BytesIO(session.manifest), options)
+                if last_chunk and not session.stateless:
+                    session.manifest = None
+                return [dbus.Byte(b) for b in chunk]
+
+            if session.resume_ranges is not None:
+                return [dbus.Byte(b) for b in self.read_resume_chunk(session, options)]
+
+            if session.source is None or (self.read_offset(session, options) == 0 and not session.pinned):
+                opened = self.open_source(session)
+                if opened is None:
+                    session.close()
+                    return [dbus.Byte(b) for b in PENDING]
+                if not opened:
+                    return []
+
+            chunk, last_chunk = self.read_chunk(session, session.source, options)
+            if last_chunk and self.file_type == 'other':
+                help.delete_file(self.file_path)
+
+            return [dbus.Byte(b) for b in chunk]
 
+        except Exception as e:
+            print(f"Error reading file: {e}")
+            return []
 
-    def ReadStaticFile(self, base_path):
+
+    def WriteValue(self, value, options):
         """
-        Function responsible for reading a file straight from the file_path
+        Selects the catalog file to transfer, the handle comes from a CatalogQueryCharacteristic result. Writing
+        'format=compact' transfers sensor files in the compact format of sensor_codec.py instead of as CSV text,
+        'format=csv' switches back. Writing 'compress=zlib' transfers sensor files compressed with zlib (on top of the
+        format), 'compress=none' switches back. Writing 'quality=<0-100>' and/or 'width=<pixels>' sets the JPEG quality
+        and width of video frames, e.g. a small preview, 'width=0' returns to full resolution. Writing
+        'preview=thumbnail|middle|sheet' transfers one of the previews generated in the background (video_previews.py)
+        instead of the frame, 'preview=frame' switches back. Writing 'excerpt=<start seconds>' (optionally with
+        'length=<seconds>', 10 by default and at most 30) transfers that part of the most recent audio recording encoded
+        as low bitrate MP3 instead of the waveform envelope, 'excerpt=none' switches back. Writing 'mode=stateless'
+        makes the 'offset' BlueZ passes with each read select the chunk, so lost or retried reads return the same chunk
+        again and reads can be pipelined. 'mode=cursor' switches back to the characteristic keeping the offset. All of
+        these only apply to the device which wrote them and restart its transfer.
+        Writing 'manifest' opens the file and makes the following reads return its block manifest (see
+        block_manifest.py). Writing 'have=<hex bitmap>' afterwards resumes the transfer, only the blocks whose bit is
+        not set are sent, each chunk prefixed with the uint32 offset of its data.
+        Writing 'stream=start' (optionally with 'interval=<ms>') pushes the file as notifications instead of waiting for
+        reads, 'stream=cancel' stops it.
 
         Args:
-            base_path (str): Path of file being transferred
-
-        Returns:
-            list: Contains chunk of data read from file if successful, empty otherwise.
+            value (): 'handle=<handle>', 'format=compact|csv', 'compress=zlib|none', 'quality=<0-100>',
+                'width=<pixels>', 'preview=frame|thumbnail|middle|sheet', 'excerpt=<start>|none', 'length=<seconds>',
+                'mode=stateless|cursor', 'manifest', 'have=<bitmap>', and/or 'stream=start|cancel' sent from the
+                application
+            options (): Additional options for writing value
         """
         try:
-            mtu = 512
-            
-            # If at beginning of file
-            if self.offset == 0:
-                print("IMAGE PATH: ", base_path)
-                print("IMAGE SIZE: ", os.path.getsize(base_path))
-
-            if os.path.exists(base_path):
-                with open(base_path, 'rb') as file:
-                    file.seek(self.offset)
-                    chunk = file.read(mtu)
-                    
-                    print(f"Read {len(chunk)} bytes from file starting at offset {self.offset}")
-                    if len(chunk) < mtu:
-                        self.offset = 0  # Reset for next read if this is the last chunk
-                        if (self.file_type == 'other'):
-                            help.delete_file(base_path)
-                    else:
-                        self.offset += len(chunk)
-
-                    return [dbus.Byte(b) for b in chunk]
+            request = help.parse_options(value)
+            session = self.sessions.get(options)
+            # Only a write from the device being streamed to interrupts the stream
+            self.stop_stream(options)
+            if 'have' in request:
+                self.resume(session, bytes.fromhex(request['have']))
             else:
-                print("No file exists for picture")
-            
+                if request.get('mode') in ('stateless', 'cursor'):
+                    session.stateless = request['mode'] == 'stateless'
+                if request.get('format') in ('csv', 'compact'):
+                    session.compact = request['format'] == 'compact'
+                if request.get('compress') in ('zlib', 'none'):
+                    session.compress = request['compress'] == 'zlib'
+                if 'quality' in request:
+                    session.quality = min(max(int(request['quality']), 0), 100)
+                if 'width' in request:
+                    session.width = int(request['width']) or None
+                if request.get('preview') in PREVIEW_KINDS:
+                    session.preview = request['preview']
+                if 'excerpt' in request and self.file_type == 'audio':
+                    self.select_excerpt(session, request)
+                if 'handle' in request and self.file_type == 'catalog':
+                    handle = int(request['handle'])
+                    session.catalog_path = get_file_catalog().get_path(handle)
+                    print(f"Catalog handle {handle} selected: {session.catalog_path}")
+                session.reset()
+                if 'manifest' in request:
+                    self.load_manifest(session)
+            if request.get('stream') == 'start':
+                self.start_stream(request, options)
         except Exception as e:
-            print(f"Error reading file: {e}")
-            return []
-    
+            print(f"Error configuring file transfer: {e}")
+
+
+    def StartNotify(self):
+        """
+        Called by BlueZ when the application subscribes to notifications, also called once a notify socket is acquired.
+        """
+        self.notifying = True
+
+
+    def StopNotify(self):
+        """
+        Called by BlueZ when the application unsubscribes, a streamed transfer can not continue without notifications.
+        """
+        self.notifying = False
+        self.stop_stream()
+
+
+    def start_stream(self, request, options):
+        """
+        Starts pushing the file as notifications, one chunk every stream_interval ms on the GLib main loop, or up to
+        STREAM_BURST chunks if a notify socket was acquired. Chunks are read the same way as ReadValue would read them,
+        so the stream ends with the first chunk shorter than the payload size (or the RESUME_END chunk of a resume).
+        Notifications reach every subscribed device, so a stream is refused while another device's stream is running.
+
+        Args:
+            request (dict): Parsed stream request, 'interval' optionally sets the time between chunks in ms
+            options (): Options passed to WriteValue, used for the MTU if no notify socket was acquired
+        """
+        if not self.notifying:
+            print("Stream requested without a notification subscription")
+            return
+        if self.streaming and session_key(options) != session_key(self.stream_options):
+            print(f"Stream requested while streaming to {session_key(self.stream_options)}")
+            return
+
+        self.stream_interval = int(request.get('interval', STREAM_INTERVAL))
+        # Notifications carry 2 more header bytes than read responses, size the chunks the same way ReadValue does
+        mtu = self.notify_mtu if self.notify_socket is not None else options.get('mtu')
+        payload_size = help.get_payload_size({'mtu': mtu}, header_size=help.NOTIFY_HEADER_SIZE)
+        self.stream_options = {'mtu': payload_size + help.READ_HEADER_SIZE, 'offset': 0}
+        if 'device' in options:
+            # Stream through the session of the device which started it
+            self.stream_options['device'] = options['device']
+        self.stream_pending = None
+        self.stream_id += 1
+        self.streaming = True
+        stream_id = self.stream_id
+        print(f"Streaming {self.file_type} file in {payload_size} byte chunks")
+        self.add_timeout(self.stream_interval, lambda: self.stream_callback(stream_id))
+
+
+    def stop_stream(self, options=None):
+        """
+        Cancels a streamed transfer, the pending timeout stops itself on its next call.
+
+        Args:
+            options (): Options of the write cancelling the stream, the stream is only cancelled if it goes through the
+                session of the device which wrote. Always cancelled if None.
+        """
+        if options is not None and self.streaming and session_key(options) != session_key(self.stream_options):
+            return
+        if self.streaming:
+            print("Stream cancelled")
+        self.streaming = False
+        self.stream_options = None
+        self.stream_pending = None
+
+
+    def stream_callback(self, stream_id):
+        """
+        Sends the next chunk(s) of a streamed transfer. A chunk the notify socket had no room for is kept in
+        stream_pending and sent again on the next call.
+
+        Args:
+            stream_id (int): Stream the timeout belongs to, timeouts of cancelled streams stop themselves
 
-    def ReadVideoFile(self):
+        Returns:
+            bool: True to be called again
         """
-        Function responisble for retrieving and reading data from a frame from the most recent video recording
+        if not self.streaming or stream_id != self.stream_id:
+            return False
+
+        payload_size = help.get_payload_size(self.stream_options)
+        burst = STREAM_BURST if self.notify_socket is not None else 1
+        for _ in range(burst):
+            if self.stream_pending is None:
+                self.stream_pending = self.ReadValue(self.stream_options) or []
+                self.stream_options['offset'] += len(self.stream_pending)
+
+            value = self.stream_pending
+            if not self.send_notification(value):
+                # Notify socket full, try again on the next call
+                return True
+            self.stream_pending = None
+
+            if not self.streaming:
+                # Notify socket was released while sending
+                return False
+            if len(value) < payload_size and self.transfer_finished(self.sessions.get(self.stream_options)):
+                print("Stream finished")
+                self.streaming = False
+                self.stream_options = None
+                return False
+        return True
+
+
+    def transfer_finished(self, session):
+        """
+        Checks if a session has nothing left to send once a chunk shorter than the payload size was read. Chunks of a
+        resume are short at the end of every missing range, the resume only ends with its RESUME_END chunk.
+        """
+        return session.manifest is None and session.resume_ranges is None
+
+
+    def open_source(self, session):
+        """
+        Opens the file the next transfer reads from: a preview of the most recent video (pre-generated, or served from
+        the frame cache so the video is only decoded once per frame), the waveform envelope, band spectrum, or selected
+        excerpt of the most recent audio recording, the most recent sensor file, the selected catalog file, or
+        file_path. In compact and/or compressed mode sensor files are encoded here, through a cache so an unchanged
+        file is only encoded once, and the chunks are served from the encoded data.
+
+        Args:
+            session (FileTransferSession): Session of the device reading
 
         Returns:
-            list: Contains chunk of data if read was successful, empty otherwise.
+            bool: True if a file was opened, None if it is still being prepared in the background
         """
-        try:
-            base_path = help.get_most_recent_video_file(self.file_path)
+        if self.file_type == 'video':
+            video_path = help.get_most_recent_video_file(self.file_path)
+            # The pre-generated frame only matches the default encoding parameters
+            custom_frame = session.quality != help.DEFAULT_JPEG_QUALITY or session.width is not None
+            path = None
+            if video_path is not None and not (session.preview == FRAME and custom_frame):
+                path = get_preview_path(video_path, session.preview)
+            if path is None and session.preview not in (FRAME, THUMBNAIL):
+                # The middle frame and contact sheet are only generated by the preview worker
+                if video_path is None:
+                    print("No video available for preview transfer")
+                    return False
+                print(f"{session.preview.capitalize()} preview of {video_path} not generated yet")
+                get_preview_worker(self.file_path).request(video_path)
+                return None
+            if path is None:
+                # Not generated yet (or still recording), fall back to decoding the frame
+                quality, width = session.quality, session.width
+                if session.preview == THUMBNAIL:
+                    quality, width = THUMBNAIL_QUALITY, THUMBNAIL_WIDTH
+                frame = get_frame_cache().get(video_path, VIDEO_FRAME_NUMBER, quality, width)
+                if frame is None:
+                    print("No frame available for video transfer")
+                    return False
+                session.close()
+                session.source = io.BytesIO(frame)
+                session.source_size = len(frame)
+                print(f"Frame {VIDEO_FRAME_NUMBER} of {video_path}: {len(frame)} bytes")
+                return True
+        elif self.file_type == 'audio' and session.excerpt is not None:
+            excerpt = get_excerpt_cache().get(*session.excerpt, owner=session)
+            if excerpt is None:
+                if get_excerpt_cache().has_failed(*session.excerpt):
+                    print(f"Excerpt of {session.excerpt[0]} could not be encoded")
+                    return False
+                print(f"Excerpt of {session.excerpt[0]} not encoded yet")
+                return None
+            session.close()
+            session.source = io.BytesIO(excerpt)
+            session.source_size = len(excerpt)
+            print(f"Excerpt of {session.excerpt[0]}: {len(excerpt)} bytes")
+            return True
+        elif self.file_type in ('audio', 'spectrum'):
+            audio_path = help.get_most_recent_audio_file(self.file_path)
+            get_sidecar_path = get_envelope_path if self.file_type == 'audio' else get_spectrum_path
+            path = get_sidecar_path(audio_path) if audio_path is not None else None
+            if audio_path is not None and path is None:
+                print(f"{self.file_type.capitalize()} summary of {audio_path} not computed yet")
+                get_audio_analysis_worker(self.file_path).request(audio_path)
+                return None
+        elif self.file_type == 'sensor':
+            path = help.get_most_recent_sensor_file(self.file_path)
+        elif self.file_type == 'catalog':
+            path = session.catalog_path
+        else:
+            path = self.file_path
+
+        if path is None or not os.path.exists(path):
+            print(f"No file exists for {self.file_type} transfer")
+            return False
+
+        file = session.open(path)
+        print("IMAGE PATH: ", path)
+        print("IMAGE SIZE: ", session.size)
+
+        encoding = ()
+        if path.endswith('.csv'):
+            encoding = ((COMPACT,) if session.compact else ()) + ((ZLIB,) if session.compress else ())
+        if encoding:
+            data = get_encoded_file_cache().get(path, file, encoding)
+            session.source = io.BytesIO(data)
+            session.source_size = len(data)
+        else:
+            session.source = file
+            session.source_size = session.size
+        return True
+
+
+    def select_excerpt(self, session, request):
+        """
+        Selects the audio excerpt the following reads transfer and starts encoding it in the background, so it is
+        usually ready by the time the application reads.
 
-            mtu = 512
+        Args:
+            session (FileTransferSession): Session of the device which wrote the request
+            request (dict): 'excerpt=<start seconds>' or 'excerpt=none', optionally 'length=<seconds>'
+        """
+        if request['excerpt'] == 'none':
+            session.excerpt = None
+            return
+        audio_path = help.get_most_recent_audio_file(self.file_path)
+        if audio_path is None:
+            print("No audio recording to take an excerpt from")
+            return
+        start = max(float(request['excerpt']), 0)
+        length = min(max(float(request.get('length', DEFAULT_EXCERPT_SECONDS)), 0.1), MAX_EXCERPT_SECONDS)
+        session.excerpt = (audio_path, start, length)
+        get_excerpt_cache().request(audio_path, start, length, owner=session)
+
+
+    def load_manifest(self, session):
+        """
+        Opens the file and builds its block manifest, the following reads return the manifest. The file is kept open
+        (pinned) so a resume sends blocks of exactly the file the manifest describes.
 
-            image_path = help.extract_frame(base_path, 100, '/home/bee/GATT_server/output_frame.jpg')
+        Args:
+            session (FileTransferSession): Session of the device reading
+        """
+        if not self.open_source(session):
+            return
+        session.manifest = build_manifest(session.source, session.source_size)
+        session.pinned = True
+        print(f"Manifest of {session.path}: {session.source_size} bytes, {len(session.manifest)} byte manifest")
 
-            with open(image_path, 'rb') as file:
-                file.seek(self.offset)
-                chunk = file.read(mtu)
-                
-                print(f"Read {len(chunk)} bytes from file starting at offset {self.offset}")
-                if len(chunk) < mtu:
-                    self.offset = 0  # Reset for next read if this is the last chunk
-                else:
-                    self.offset += len(chunk)
 
-                help.delete_file(image_path)
-                return [dbus.Byte(b) for b in chunk]
-                
-        except Exception as e:
-            print(f"Error reading file: {e}")
-            return []
-    
+    def resume(self, session, held_blocks):
+        """
+        Starts sending only the blocks the application does not hold yet, or holds with a checksum that does not match
+        the manifest.
+
+        Args:
+            session (FileTransferSession): Session of the device reading
+            held_blocks (bytes): Bitmap of the blocks the application holds, bit i % 8 of byte i // 8 for block i
+        """
+        if session.source is None or not session.pinned:
+            print("Read the manifest before resuming a transfer")
+            return
+        session.manifest = None
+        session.resume_ranges = missing_ranges(held_blocks, session.source_size)
+        missing = sum(end - start for start, end in session.resume_ranges)
+        print(f"Resuming transfer of {session.path}: {missing} of {session.source_size} bytes missing")
+
 
-    def readWaveformFile(self):
+    def read_resume_chunk(self, session, options):
         """
-        Function responsible for retrieving and reading a waveform image file.
+        Reads the next chunk of a resume. Each chunk starts with the uint32 file offset of its data and never spans two
+        missing ranges. Once every range has been sent a chunk holding only RESUME_END is returned.
+
+        Args:
+            session (FileTransferSession): Session of the device reading
+            options (): Options passed to ReadValue
 
         Returns:
-            list: Contains chunk of bytes from file if successful, empty otherwise.
+            bytes: Chunk of the resume
         """
-        try:
-            mtu = 512
-            base_path = help.get_most_recent_audio_file(self.file_path)
-            
-            if self.offset == 0:
-                self.image_path = help.create_waveform_file(base_path)
-                print("IMAGE PATH: ", self.image_path)
-                print("IMAGE SIZE: ", os.path.getsize(self.image_path))
-
-            with open(self.image_path, 'rb') as file:
-                file.seek(self.offset)
-                chunk = file.read(mtu)
-                
-                print(f"Read {len(chunk)} bytes from file starting at offset {self.offset}")
-                if len(chunk) < mtu:
-                    self.offset = 0  # Reset for next read if this is the last chunk
-                    help.delete_file(self.image_path)
-                else:
-                    self.offset += len(chunk)
-
-                # help.delete_file(image_path)
-                return [dbus.Byte(b) for b in chunk]
-            
+        if not session.resume_ranges:
+            session.resume_ranges = None
+            print("Resume finished")
+            return CHUNK_OFFSET.pack(RESUME_END)
+
+        chunk_size = help.get_payload_size(options) - CHUNK_OFFSET.size
+        start, end = session.resume_ranges[0]
+        session.source.seek(start)
+        data = session.source.read(min(chunk_size, end - start))
+        if not data or start + len(data) >= end:
+            session.resume_ranges.pop(0)
+        else:
+            session.resume_ranges[0][0] = start + len(data)
+        return CHUNK_OFFSET.pack(start) + data
+
+
+    def read_offset(self, session, options):
+        """
+        Gets the offset of the next chunk, passed by the application in stateless mode and kept in the session
+        otherwise.
+        """
+        if session.stateless:
+            return int(options.get('offset', 0)) if options else 0
+        return session.offset
 
-        except Exception as e:
-            print(f"Error reading file: {e}")
-            return []
 
+    def read_chunk(self, session, file, options):
+        """
+        Reads the chunk at the offset of this read, sized to the MTU negotiated by BlueZ. Outside of stateless mode the
+        session's offset is advanced, or reset to 0 after the last chunk.
+
+        Args:
+            session (FileTransferSession): Session of the device reading
+            file (): File or buffer opened in binary mode
+            options (): Options passed to ReadValue
+
+        Returns:
+            bytes: Chunk of the file
+            bool: True if this is the last chunk
+        """
+        chunk_size = help.get_payload_size(options)
+        offset = self.read_offset(session, options)
+        file.seek(offset)
+        chunk = file.read(chunk_size)
+
+        print(f"Read {len(chunk)} bytes from file starting at offset {offset}")
+        last_chunk = len(chunk) < chunk_size
+        if not session.stateless:
+            if last_chunk:
+                session.offset = 0  # Reset for next read if this is the last chunk
+            else:
+                session.offset += len(chunk)
+        return chunk, last_chunk
 
-    def reset_offset(self):
+
+    def reset_offset(self, options=None):
         """
         Function used to reset the offset, ensures the file transfer starts at the beginning of the file.
+
+        Args:
+            options (): Options of the reset write, only the session of the device it came from is reset. Every
+                session is reset if None.
         """
-        self.offset = 0
+        self.sessions.reset(options)
 
 
 class ResetOffsetCharacteristic(Characteristic):
@@ -213,7 +632,7 @@ class ResetOffsetCharacteristic(Characteristic):
         """
         # print("ResetOffsetCharacteristic WriteValue called with value:", value)
         try:
-            self.file_transfer_characteristic.reset_offset()
+            self.file_transfer_characteristic.reset_offset(options)
             print("Offset reset")
         except Exception as e:
             print(f"Error resetting offset: {e}")
@@ -0,0 +1,117 @@
+import dbus
+from service import Characteristic
+import bt_hive_app.helper_methods as help
+from bt_hive_app.audio_analysis import get_audio_metadata_cache, get_audio_analysis_worker, format_level_profile
+from bt_hive_app.transfer_sessions import SessionTable
+
+
+class LevelProfileSession:
+    """
+    Position of one connected device in the profile it is reading.
+
+    Attributes:
+        results (list): Lines of the profile being read, None until the first read of a pass
+        result_offset (int): Index of the next line to return
+
+    Methods:
+        reset(): Starts over with a freshly loaded profile on the next read
+        close(): Drops the profile, called when the session expires
+    """
+    def __init__(self):
+        """
+        Initialize the class
+        """
+        self.results = None
+        self.result_offset = 0
+
+
+    def reset(self):
+        self.results = None
+        self.result_offset = 0
+
+
+    def close(self):
+        self.reset()
+
+
+class LevelProfileCharacteristic(Characteristic):
+    """
+    Characteristic returning the level profile of the most recent audio recording: RMS and peak level per second and
+    the silent stretches, computed by the background analysis (audio_analysis.py).
+
+    Attributes:
+        service (): Service containing this characteristic
+        uuid (str): uuid of the characteristic
+        file_path (str): Audio directory, e.g. '/home/bee/appmais/bee_tmp/audio/'
+        sessions (SessionTable): LevelProfileSession of each connected device
+
+    Methods:
+        load_profile(): Formats the profile of the most recent recording
+        ReadValue(options): Returns the next page of the profile
+    """
+    def __init__(self, service, uuid, file_path):
+        """
+        Initialize the class
+
+        Args:
+            service (): Service containing this characteristic
+            uuid (str): uuid of the characteristic
+            file_path (str): Audio directory
+        """
+        Characteristic.__init__(
+            self,
+            uuid,
+            ['read'],
+            service)
+        self.file_path = file_path
+        self.sessions = SessionTable(LevelProfileSession)
+        get_audio_analysis_worker(file_path)
+
+
+    def load_profile(self):
+        """
+        Formats the profile of the most recent recording, queueing its analysis if it was not analysed yet.
+
+        Returns:
+            list: Encoded lines, 'path,duration,rms,peak' followed by the lines of format_level_profile(), or 'Pending'
+                if the recording was not analysed yet
+        """
+        audio_path = help.get_most_recent_audio_file(self.file_path)
+        if audio_path is None:
+            return []
+        metadata = get_audio_metadata_cache().get(audio_path)
+        if metadata is None:
+            get_audio_analysis_worker(self.file_path).request(audio_path)
+            return [b'Pending\n']
+        header = f"{audio_path},{metadata['duration']:.1f},{metadata['rms']},{metadata['peak']}\n".encode()
+        return [header] + format_level_profile(metadata)
+
+
+    def ReadValue(self, options):
+        """
+        Returns as many lines of the profile as fit in one read. The profile is loaded on the first read of a pass,
+        every connected device pages through its own copy.
+
+        Args:
+            options (): Additional options for reading value
+
+        Returns:
+            list: Lines of the profile, 'EOF' once the whole profile has been read.
+        """
+        session = self.sessions.get(options)
+        try:
+            if session.results is None:
+                session.results = self.load_profile()
+                session.result_offset = 0
+
+            if session.result_offset >= len(session.results):
+                session.reset()
+                return [dbus.Byte(b) for b in 'EOF'.encode()]
+
+            data, session.result_offset = help.pack_lines(session.results, session.result_offset,
+                                                          help.get_payload_size(options))
+            return [dbus.Byte(b) for b in data]
+        except Exception as e:
+            print(f"Error reading level profile: {e}")
+            session.reset()
+            return []
@@ -1,5 +1,10 @@
 import dbus, subprocess
 from service import Characteristic
+import bt_hive_app.helper_methods as help
+
+
+# Time to wait before retrying when the notify socket is full, in ms
+COMMAND_RETRY_INTERVAL = 20
 
 
 class CommandCharacteristic(Characteristic):
@@ -47,12 +52,27 @@ class CommandCharacteristic(Characteristic):
 
 class CommandCharacteristicWResponse(Characteristic):
     """
-    Responsible for recieving and running command sent from application while returning a response
+    Responsible for recieving and running command sent from application while returning a response. If the application
+    subscribes to notifications the output is also pushed in chunks once the command finishes, over the notify socket
+    BlueZ hands out through AcquireNotify when the application supports it. Commands can also be written without
+    response over an acquired write socket.
 
     Attributes:
         service (): Service containing this characteristic
         uuid (str): uuid of the characteristic
+        notifying (bool): True while the application is subscribed to notifications
+        pending_chunks (list): Output chunks not yet sent as notifications
+
+    Methods:
+        WriteValue(value, options): Runs the command
+        ReadValue(options): Returns the output of the last command
+        StartNotify(): Called when the application subscribes to notifications
+        StopNotify(): Called when the application unsubscribes
+        push_result(): Sends the pending output chunks as notifications
     """
+    acquire_notify = True
+    acquire_write = True
+
     def __init__(self, service, uuid):
         """
         Initialize the class
@@ -61,8 +81,10 @@ class CommandCharacteristicWResponse(Characteristic):
             service (): Service containing this characteristic
             uuid (str): uuid of the characteristic
         """
-        Characteristic.__init__(self, uuid, ["write", "read"], service)
+        Characteristic.__init__(self, uuid, ["write", "read", "notify", "write-without-response"], service)
         self.result = ""
+        self.notifying = False
+        self.pending_chunks = []
 
 
     def WriteValue(self, value, options):
@@ -83,7 +105,40 @@ class CommandCharacteristicWResponse(Characteristic):
             self.result = f"Command failed: {e}"
             print("Command failed:", e)
 
+        if self.notifying:
+            mtu = self.notify_mtu if self.notify_socket is not None else options.get('mtu')
+            # Without a known MTU only the 23 byte minimum ATT MTU is safe for notifications
+            chunk_size = help.get_payload_size({'mtu': mtu}, default=help.MIN_PAYLOAD_SIZE,
+                                               header_size=help.NOTIFY_HEADER_SIZE)
+            output = self.result.encode('utf-8')
+            # A chunk shorter than chunk_size marks the end of the output
+            self.pending_chunks = [output[i:i + chunk_size] for i in range(0, len(output) + 1, chunk_size)]
+            self.push_result()
+
 
     def ReadValue(self, options):
         return [dbus.Byte(c) for c in self.result]
-    
\ No newline at end of file
+
+
+    def StartNotify(self):
+        self.notifying = True
+
+
+    def StopNotify(self):
+        self.notifying = False
+        self.pending_chunks = []
+
+
+    def push_result(self):
+        """
+        Sends the pending output chunks as notifications, retrying later if the notify socket is full.
+
+        Returns:
+            bool: Always False so a retry timeout only runs once
+        """
+        while self.pending_chunks and self.notifying:
+            if not self.send_notification([dbus.Byte(b) for b in self.pending_chunks[0]]):
+                self.add_timeout(COMMAND_RETRY_INTERVAL, self.push_result)
+                return False
+            self.pending_chunks.pop(0)
+        return False
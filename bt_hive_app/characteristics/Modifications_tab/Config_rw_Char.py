@@ -1,5 +1,6 @@
-import dbus, configparser
+import dbus
 from service import Characteristic
+from bt_hive_app.config_store import get_config_store, CONFIG_PATH
 
 
 class Config_rw_Characteristic(Characteristic):
@@ -33,7 +34,7 @@ class Config_rw_Characteristic(Characteristic):
             service)
         
         # Path to the configuration file.
-        self.file_path = '/home/bee/AppMAIS/beemon-config.ini'
+        self.file_path = CONFIG_PATH
         # Section name to look for in config file
         self.section_name = section_name
         # Variable name to look for in the configuration file
@@ -51,9 +52,8 @@ class Config_rw_Characteristic(Characteristic):
 
         """
         try:
-            # Cretae a config parser and read the file
-            config = configparser.ConfigParser()
-            config.read(self.file_path)
+            # Get the parsed config file, shared by all characteristics and only parsed again once it changes
+            config = get_config_store(self.file_path).get()
 
             values = []
 
@@ -100,9 +100,8 @@ class Config_rw_Characteristic(Characteristic):
             # Convert the byte values to a string
             data = ''.join(chr(v) for v in value)
 
-            # Create a config parser and read the file
-            config = configparser.ConfigParser()
-            config.read(self.file_path)
+            # Get the parsed config file, shared by all characteristics and only parsed again once it changes
+            config = get_config_store(self.file_path).get()
 
             if self.section_name == 'video':
                 # Update the specific section and variable name if section is 'video'
@@ -116,7 +115,6 @@ class Config_rw_Characteristic(Characteristic):
                     if section != 'video' and self.variable_name in config[section]:
                         config[section][self.variable_name] = data
             # Write the updated config back to the file
-            with open(self.file_path, 'w') as file:
-                config.write(file)
+            get_config_store(self.file_path).save()
         except Exception as e:
             print(f"Error Writing File: {e}")
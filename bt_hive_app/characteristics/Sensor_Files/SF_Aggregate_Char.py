@@ -0,0 +1,110 @@
+import dbus, os
+from service import Characteristic
+import bt_hive_app.helper_methods as help
+from bt_hive_app.sensor_aggregation import parse_rows, aggregate, format_buckets
+from bt_hive_app.csv_range import parse_time, read_time_range
+
+
+class SF_Aggregate_Characteristic(Characteristic):
+    """
+    Characteristic used to chart sensor data without pulling every row. The application writes a sensor, time range,
+    and bucket width and then reads min, max, mean, and count per bucket.
+
+    Attributes:
+        service (): Service containing this characteristic
+        uuid (str): uuid of the characteristic
+        base_path (str): Directory holding one directory per sensor, e.g. '/home/bee/appmais/bee_tmp/'
+
+    Methods:
+        get_sensor_file(sensor, date): Gets the file holding a sensor's readings for a day
+        WriteValue(value, options): Computes the buckets for a request
+        ReadValue(options): Returns the next page of buckets
+    """
+    def __init__(self, service, uuid, base_path):
+        """
+        Initialize the class
+
+        Args:
+            service (): Service containing this characteristic
+            uuid (str): uuid of the characteristic
+            base_path (str): Directory holding one directory per sensor
+        """
+        Characteristic.__init__(
+            self,
+            uuid,
+            ['read', 'write'],
+            service)
+        self.folder_path = base_path
+        self.results = []
+        self.result_offset = 0
+
+
+    def get_sensor_file(self, sensor, date=None):
+        """
+        Gets the file holding a sensor's readings for a day.
+
+        Args:
+            sensor (str): Either 'cpu', 'temp', or 'scale'
+            date (str): Day as 'YYYY-MM-DD', the most recent day if None
+
+        Returns:
+            str: Path of the sensor file, None if there is none.
+        """
+        sensor_path = os.path.join(self.folder_path, sensor)
+        if date is None:
+            return help.get_most_recent_sensor_file(sensor_path)
+
+        date_path = os.path.join(sensor_path, date)
+        if not os.path.isdir(date_path):
+            return None
+        files = sorted(name for name in os.listdir(date_path) if name.endswith('.csv'))
+        return os.path.join(date_path, files[0]) if files else None
+
+
+    def WriteValue(self, value, options):
+        """
+        Computes the buckets for a request such as 'sensor=temp,start=08-00-00,end=20-00-00,bucket=300'. An optional
+        'date=YYYY-MM-DD' selects an older day, the most recent day is used otherwise.
+
+        Args:
+            value (): Request sent from the application
+            options (): Additional options for writing value
+        """
+        self.results = []
+        self.result_offset = 0
+        try:
+            request = help.parse_options(value)
+            file_path = self.get_sensor_file(request['sensor'], request.get('date'))
+            if file_path is None:
+                print(f"No {request['sensor']} file found")
+                return
+
+            start = parse_time(request.get('start', '00-00-00').encode())
+            end = parse_time(request.get('end', '23-59-59').encode()) + 1
+            bucket_width = int(request.get('bucket', 300))
+
+            with open(file_path, 'rb') as file:
+                times, values = parse_rows(read_time_range(file, start, end))
+            self.results = format_buckets(*aggregate(times, values, start, end, bucket_width))
+            print(f"Aggregated {len(times)} rows of {file_path} into {len(self.results)} buckets")
+        except Exception as e:
+            print(f"Error aggregating sensor file: {e}")
+
+
+    def ReadValue(self, options):
+        """
+        Returns as many buckets as fit in one read, one '"HH-MM-SS",count,min,max,mean' line per bucket with the
+        count, min, max, and mean repeated for every value column of the sensor file.
+
+        Args:
+            options (): Additional options for reading value
+
+        Returns:
+            list: Lines of buckets, 'EOF' once all buckets have been read.
+        """
+        if self.result_offset >= len(self.results):
+            self.result_offset = 0
+            return [dbus.Byte(b) for b in 'EOF'.encode()]
+
+        data, self.result_offset = help.pack_lines(self.results, self.result_offset, help.get_payload_size(options))
+        return [dbus.Byte(b) for b in data]
@@ -1,7 +1,9 @@
-import dbus, os
+import dbus
 from service import Characteristic
-from datetime import datetime
 import bt_hive_app.helper_methods as help
+from bt_hive_app.line_index import LineTransfer
+from bt_hive_app.transfer_sessions import SessionTable
+from bt_hive_app.sensor_follower import get_sensor_follower
 
 
 class SF_Read_Characteristic(Characteristic):
@@ -14,9 +16,6 @@ class SF_Read_Characteristic(Characteristic):
         base_path (str): Full or partial path of file being read
     
     Methods:
-        get_most_recent_file(base_path):
-        get_relevant_line():
-        get_update_text():
         ReadValue():
     """
     def __init__(self, service, uuid, base_path):
@@ -34,114 +33,13 @@ class SF_Read_Characteristic(Characteristic):
             ['read'],
             service)
         self.folder_path = base_path
+        self.follower = get_sensor_follower(base_path)
     
 
-    def get_most_recent_file(self, base_path):
-        """
-        Function used to get most recent file from directory located at base_path.
-
-        Args:
-            base_path (str): Base file path of the file needing to be read.
-
-        Returns:
-            full path of most recent file in base_path directory if successful, otherwise None
-
-        Raises:
-            ValueError: If no files exist inside base_path.
-        """
-        # List all directories in the base path
-        entries = os.listdir(base_path)
-        
-        # Filter out possible non directory entries or directories which dont match the data format
-        date_dirs = []
-        for entry in entries:
-            entry_path = os.path.join(base_path, entry)
-            if os.path.isdir(entry_path):
-                try:
-                    # Try to parse the directory name as a date
-                    date = datetime.strptime(entry, "%Y-%m-%d")
-                    date_dirs.append((entry, date))
-                except ValueError:
-                    # Skip directories that don't match the date format
-                    pass
-        if not date_dirs:
-            return None
-
-        # Find most recent date
-        most_recent_dir = max(date_dirs, key=lambda x: x[1])[0]
-        full_path = os.path.join(base_path, most_recent_dir)
-
-        # List files in this directory
-        files = os.listdir(full_path)
-        if (len(files) != 1):
-            raise ValueError(f"Expected exactly one file in directory {full_path}, found {len(files)}")
-        
-        # Get full path of the file
-        return full_path + '/' + files[0]
-
-
-    def get_relevant_line(self):
-        """
-        Function used to get last line in a file that is not the value 'nan'.
-
-        Returns:
-            str: Line containing something other than nan if one exists, otherwise 'nan' meaning the file only contained nan readings.
-        """
-        with open(self.file_path, 'r') as file:
-            lines = file.readlines()
-
-            if ('nan' in lines[-1]):
-                last_valid_line = None
-                for line in reversed(lines):
-                    if 'nan' not in line:
-                        last_valid_line = line
-                        break
-                if last_valid_line is None:
-                    # print('No valid readings found in the file')
-                    last_line = lines[0]
-                else:
-                    # print("last valid before nan: ", last_valid_line)
-                    last_line = last_valid_line
-            else:
-                last_line = lines[-1]
-        
-        return last_line
-    
-
-    def get_update_text(self, last_line):
-        """
-        Function which determines the update text based on if the last line contained nan or not.
-
-        Args:
-            last_line (str): last line of the file, contains an actual value or is 'nan'.
-
-        Returns:
-            str: If last line is a value other than nan, string containing date and time of the recording. Otherwise, string containing date and time when nan values started being recorded.
-        """
-        if 'nan' not in last_line:
-            # Text returned will just contain the update date and time
-            unformatted_time = (last_line.split(',')[0]).replace('"','')
-            time_obj = datetime.strptime(unformatted_time, '%H-%M-%S')
-            formatted_time = time_obj.strftime('%I-%M-%S %p')
-            date = (self.file_path.split('/')[6])
-            
-            update_text = (f"Updated on {date} at {formatted_time}")
-            return update_text
-            
-        else:
-            # Text will contain when nan values started being recorded
-            unformatted_time = (last_line.split(',')[0]).replace('"','')
-            time_obj = datetime.strptime(unformatted_time, '%H-%M-%S')
-            formatted_time = time_obj.strftime('%I-%M-%S %p')
-            date = (self.file_path.split('/')[6])
-            
-            update_text = (f"Returning nan values since {formatted_time} on {date}")
-            return update_text
-           
-
     def ReadValue(self, options):
         """
-        Function used to read last line data.
+        Function used to read last line data. The data is kept up to date by a SensorFollower tailing the sensor file,
+        so no file is read here.
 
         Args:
             options (): Additional options for writing value
@@ -149,19 +47,10 @@ class SF_Read_Characteristic(Characteristic):
         Returns:
             list: Contains data from final line of file if successful, otherwise empty.
         """
-        self.file_path = help.get_most_recent_sensor_file(self.folder_path)
+        payload = self.follower.get_payload()
 
-        if self.file_path is not None:
-            try:
-                last_line = self.get_relevant_line()
-                update_text = self.get_update_text(last_line)
-                
-                returned_data = f"{last_line.strip()}|{update_text}"
-                # print(f"Returning data: {returned_data}")
-                return [dbus.Byte(b) for b in returned_data.encode()]
-            except Exception as e:
-                # print(f"Error occurred while reading the file: {e}")
-                return []
+        if payload is not None:
+            return [dbus.Byte(b) for b in payload]
         else:
             # print("No file found")
             return []
@@ -175,10 +64,11 @@ class SF_Read_LBL_Characteristic(Characteristic):
         service (): Service containing this characteristic
         uuid (str): uuid of the characteristic
         base_path (str): Full or partial path of file to read
+        sessions (SessionTable): Position and settings (LineTransfer) of each connected device's read through the file
     
     Methods:
-        get_most_recent_file(base_path):
         ReadValue(options):
+        WriteValue(value, options): Selects line or batched reads, CSV or compact format, or a time range
         reset(): Reset the offset to 0
     """
     def __init__(self, service, uuid, base_path):
@@ -193,54 +83,13 @@ class SF_Read_LBL_Characteristic(Characteristic):
         Characteristic.__init__(
             self,
             uuid,
-            ['read'],
+            ['read', 'write'],
             service)
         self.folder_path = base_path
-        self.line_offset = 0
+        self.sessions = SessionTable(LineTransfer)
         # print(f"Characteristic initialized with UUID: {uuid}")
     
 
-    def get_most_recent_file(self, base_path):
-        """
-        Get most recent file found in base_poth
-
-        Args:
-            base_path (str): Partial path of file to be read
-
-        Returns:
-            str: Path of most recent file in base_path
-        """
-        # List all directories in the base path
-        entries = os.listdir(base_path)
-        
-        # Filter out possible non directory entries or directories which dont match the data format
-        date_dirs = []
-        for entry in entries:
-            entry_path = os.path.join(base_path, entry)
-            if os.path.isdir(entry_path):
-                try:
-                    # Try to parse the directory name as a date
-                    date = datetime.strptime(entry, "%Y-%m-%d")
-                    date_dirs.append((entry, date))
-                except ValueError:
-                    # Skip directories that don't match the date format
-                    pass
-        if not date_dirs:
-            return None
-
-        # Find most recent date
-        most_recent_dir = max(date_dirs, key=lambda x: x[1])[0]
-        full_path = os.path.join(base_path, most_recent_dir)
-
-        # List files in this directory
-        files = os.listdir(full_path)
-        if (len(files) != 1):
-            raise ValueError(f"Expected exactly one file in directory {full_path}, found {len(files)}")
-        
-        # Get full path of the file
-        return full_path + '/' + files[0]
-
-
     def ReadValue(self, options):
         """
         Reads line of data from file
@@ -249,24 +98,14 @@ class SF_Read_LBL_Characteristic(Characteristic):
             options (): Additional options for reading value
 
         Returns:
-
+            list: Line, batch, or compact rows of the file, 'EOF' at the end, empty if there is no file.
         """
-        self.file_path = self.get_most_recent_file(self.folder_path)
+        file_path = help.get_most_recent_sensor_file(self.folder_path)
 
-        if self.file_path is not None:
+        if file_path is not None:
             try:
-                with open(self.file_path, 'r') as file:
-                    lines = file.readlines()
-                    all_data = ''.join(lines)
-                    # print(f"Returning data: {all_data}")
-                    if (self.line_offset >= len(lines)):
-                        self.line_offset = 0
-                        return [dbus.Byte(b) for b in 'EOF'.encode()]
-                    
-                    returned_line = lines[self.line_offset]
-                    self.line_offset += 1
-                    # return [dbus.Byte(b) for b in lines[self.line_offset].encode()]
-                    return [dbus.Byte(b) for b in returned_line.encode()]
+                data = self.sessions.get(options).read(file_path, help.get_payload_size(options))
+                return [dbus.Byte(b) for b in data]
             except Exception as e:
                 # print(f"Error occurred while reading the file: {e}")
                 return []
@@ -275,13 +114,30 @@ class SF_Read_LBL_Characteristic(Characteristic):
             return []
         
 
-    def reset(self):
+    def WriteValue(self, value, options):
+        """
+        Switches between returning one line per read ('mode=line') and returning as many lines as fit in one read
+        ('mode=batch'). Batches start with a header holding the line count, first line number, and flags.
+        Writing 'format=compact' returns rows in the binary format of sensor_codec.py instead of CSV text, 'format=csv'
+        switches back. Writing 'start=HH-MM-SS' and/or 'end=HH-MM-SS' limits the next read through the file to the rows
+        recorded in that range, the range is found by bisecting the file so the rows before it are never read.
+
+        Args:
+            value (): Mode, format, and/or time range sent from the application
+            options (): Additional options for writing value
         """
-        Reset offset to 0
+        self.sessions.get(options).configure(help.parse_options(value))
+
+
+    def reset(self, options=None):
+        """
+        Reset offset to 0, clear the time range, and close the file being read
+
+        Args:
+            options (): Options of the reset write, only the session of the device it came from is reset. Every
+                session is reset if None.
         """
-        self.line_offset = 0
-        self.file_path = None
-        self.lines = []
+        self.sessions.reset(options)
 
 
 class ResetLineOffsetCharacteristic(Characteristic):
@@ -323,5 +179,5 @@ class ResetLineOffsetCharacteristic(Characteristic):
         """
         command = bytes(value).decode('utf-8')
         if command == 'reset':
-            self.read_line_by_line_characteristic.reset()
+            self.read_line_by_line_characteristic.reset(options)
             # print("Offset reset command received")
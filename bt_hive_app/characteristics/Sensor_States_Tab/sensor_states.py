@@ -1,5 +1,6 @@
-import dbus, configparser
+import dbus
 from service import Characteristic
+from bt_hive_app.config_store import get_config_store, CONFIG_PATH
 
 
 class SensorStateCharacteristic(Characteristic):
@@ -31,7 +32,7 @@ class SensorStateCharacteristic(Characteristic):
             service)
         
         # Path to the configuration file.
-        self.file_path = '/home/bee/AppMAIS/beemon-config.ini'
+        self.file_path = CONFIG_PATH
         # Section name to look for in config file
         self.section_name = section_name
         # Variable name to look for in the configuration file
@@ -49,9 +50,8 @@ class SensorStateCharacteristic(Characteristic):
 
         """
         try:
-            # Create a config parser and read the file
-            config = configparser.ConfigParser()
-            config.read(self.file_path)
+            # Get the parsed config file, shared by all characteristics and only parsed again once it changes
+            config = get_config_store(self.file_path).get()
 
             if self.section_name in config and self.variable_name in config[self.section_name]:
                 value = config[self.section_name][self.variable_name].lower()
@@ -90,9 +90,8 @@ class SensorStateCharacteristic(Characteristic):
             elif data.lower() == 'false':
                 data = 'False'
 
-            # Create a config parser and read the file
-            config = configparser.ConfigParser()
-            config.read(self.file_path)
+            # Get the parsed config file, shared by all characteristics and only parsed again once it changes
+            config = get_config_store(self.file_path).get()
 
             # Update the specific section and variable name if section is 'video'
             if self.section_name in config:
@@ -105,8 +104,7 @@ class SensorStateCharacteristic(Characteristic):
                     config[self.section_name][self.variable_name] = 'False'
 
                 # Write the updated config back to the file
-                with open(self.file_path, 'w') as file:
-                    config.write(file)
+                get_config_store(self.file_path).save()
             else:
                 print(f"Section {self.section_name} not found")
 
@@ -0,0 +1,90 @@
+import configparser, os
+
+
+# Configuration file of the beemon recorders, edited through the modifications and sensor states tabs
+CONFIG_PATH = '/home/bee/AppMAIS/beemon-config.ini'
+
+
+class ConfigStore:
+    """
+    Parsed copy of a config file shared by every characteristic reading it. The file is parsed once and only parsed
+    again when its mtime, size, or inode changes, which is checked with a stat on every access.
+
+    Attributes:
+        file_path (str): Path of the config file
+        config (ConfigParser): Parsed file
+        signature (tuple): (mtime, size, inode) of the parsed version, None if the file has to be parsed again
+
+    Methods:
+        get(): Gets the parsed file
+        save(): Writes the parsed file back after it was modified
+    """
+    def __init__(self, file_path=CONFIG_PATH):
+        """
+        Initialize the class
+
+        Args:
+            file_path (str): Path of the config file
+        """
+        self.file_path = file_path
+        self.config = configparser.ConfigParser()
+        self.signature = None
+
+
+    def stat_signature(self):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+    def get(self):
+        """
+        Gets the parsed file, parsing it again if it changed since it was last parsed. Callers modifying it have to
+        call save() afterwards.
+
+        Returns:
+            ConfigParser: The parsed file, empty if the file does not exist
+        """
+        signature = self.stat_signature()
+        if signature is None or signature != self.signature:
+            config = configparser.ConfigParser()
+            config.read(self.file_path)
+            self.config = config
+            self.signature = signature
+        return self.config
+
+
+    def save(self):
+        """
+        Writes the parsed file back, the written version does not have to be parsed again.
+        """
+        try:
+            with open(self.file_path, 'w') as file:
+                self.config.write(file)
+        except Exception:
+            # The file may only be partially written, parse it again on the next access
+            self.signature = None
+            raise
+        self.signature = self.stat_signature()
+
+
+_config_stores = {}
+
+
+def get_config_store(file_path=CONFIG_PATH):
+    """
+    Gets the store of a config file, creating it on first use.
+
+    Args:
+        file_path (str): Path of the config file
+
+    Returns:
+        ConfigStore: Store shared by every characteristic reading file_path
+    """
+    store = _config_stores.get(file_path)
+    if store is None:
+        store = ConfigStore(file_path)
+        _config_stores[file_path] = store
+    return store
@@ -0,0 +1,153 @@
+import os
+
+
+# Bytes read at a time when looking for the end of the last complete row
+TAIL_BLOCK_SIZE = 4096
+
+
+def parse_time(value):
+    """
+    Parses the '"HH-MM-SS"' first column of a sensor file.
+
+    Args:
+        value (bytes): First column of a row, quotes are optional
+
+    Returns:
+        int: Seconds since midnight
+    """
+    hours, minutes, seconds = value.strip().strip(b'"').split(b'-')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def format_time(seconds):
+    """
+    Formats seconds since midnight as 'HH-MM-SS'.
+
+    Args:
+        seconds (int): Seconds since midnight
+
+    Returns:
+        str: Formatted time
+    """
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}-{seconds % 3600 // 60:02d}-{seconds % 60:02d}"
+
+
+def _row_time_at(file, offset, size):
+    """
+    Finds the first complete row starting at or after offset and parses its time.
+
+    Args:
+        file (): Sensor file opened in binary mode
+        offset (int): Offset to start looking from
+        size (int): Size of the file
+
+    Returns:
+        int: Offset where the row starts, size if there is none
+        int: Time of the row in seconds since midnight, None if there is no row or it could not be parsed
+    """
+    file.seek(offset)
+    if offset > 0:
+        # Skip the rest of the row offset points into
+        file.seek(offset - 1)
+        file.readline()
+    while True:
+        row_start = file.tell()
+        if row_start >= size:
+            return size, None
+        line = file.readline()
+        try:
+            return row_start, parse_time(line.split(b',', 1)[0])
+        except ValueError:
+            # Header or damaged row, use the next one
+            continue
+
+
+def complete_size(file, size):
+    """
+    Gets the size of a sensor file without its last row if that row is still being written.
+
+    Args:
+        file (): Sensor file opened in binary mode
+        size (int): Size of the file
+
+    Returns:
+        int: Offset just past the last newline, 0 if the file has none
+    """
+    end = size
+    while end > 0:
+        start = max(end - TAIL_BLOCK_SIZE, 0)
+        file.seek(start)
+        newline = file.read(end - start).rfind(b'\n')
+        if newline >= 0:
+            return start + newline + 1
+        end = start
+    return 0
+
+
+def find_time_offset(file, target, size=None):
+    """
+    Bisects a sensor file on byte offsets to find the first row whose time is at or after target. Sensor files are
+    written in time order, so this only reads O(log n) rows.
+
+    Args:
+        file (): Sensor file opened in binary mode
+        target (int): Time in seconds since midnight
+        size (int): Size of the file, taken from the file if None
+
+    Returns:
+        int: Offset of the first row at or after target, the size of the file if there is none
+    """
+    if size is None:
+        size = os.fstat(file.fileno()).st_size
+
+    low = 0
+    high = size
+    while low < high:
+        middle = (low + high) // 2
+        row_start, time = _row_time_at(file, middle, size)
+        if time is None or time >= target:
+            high = middle
+        else:
+            # Every row starting before the next one is earlier than target
+            low = file.tell()
+
+    row_start, time = _row_time_at(file, low, size)
+    return row_start
+
+
+def find_time_range(file, start, end):
+    """
+    Gets the byte range holding the rows recorded between start and end. A last row without its newline is left out
+    until it is complete.
+
+    Args:
+        file (): Sensor file opened in binary mode
+        start (int): Start of the range in seconds since midnight, inclusive
+        end (int): End of the range in seconds since midnight, exclusive
+
+    Returns:
+        int: Offset of the first row in the range
+        int: Offset just past the last row in the range
+    """
+    size = complete_size(file, os.fstat(file.fileno()).st_size)
+    start_offset = find_time_offset(file, start, size)
+    end_offset = find_time_offset(file, end, size)
+    return start_offset, max(start_offset, end_offset)
+
+
+def read_time_range(file, start, end):
+    """
+    Reads the rows recorded between start and end without scanning the rows before them.
+
+    Args:
+        file (): Sensor file opened in binary mode
+        start (int): Start of the range in seconds since midnight, inclusive
+        end (int): End of the range in seconds since midnight, exclusive
+
+    Returns:
+        list: Rows in the range including their newlines
+    """
+    start_offset, end_offset = find_time_range(file, start, end)
+    file.seek(start_offset)
+    return file.read(end_offset - start_offset).splitlines(keepends=True)
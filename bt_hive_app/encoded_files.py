@@ -0,0 +1,107 @@
+import io, os, zlib
+from collections import OrderedDict
+from bt_hive_app.sensor_codec import encode_sensor_file
+
+
+# zlib level used for compressed transfers, 6 is the zlib default trade off between size and CPU
+COMPRESSION_LEVEL = 6
+# Upper bound on the bytes kept by the cache, a day of sensor data compresses to a few hundred KB
+MAX_CACHE_BYTES = 4 * 1024 * 1024
+
+COMPACT = 'compact'
+ZLIB = 'zlib'
+
+
+def encode_file(file, size, encoding):
+    """
+    Encodes the first size bytes of a file.
+
+    Args:
+        file (): File opened in binary mode
+        size (int): Number of bytes to encode
+        encoding (tuple): Steps applied in order, COMPACT (sensor_codec.py) and/or ZLIB
+
+    Returns:
+        bytes: Encoded file
+    """
+    file.seek(0)
+    data = file.read(size)
+    if COMPACT in encoding:
+        data = encode_sensor_file(io.BytesIO(data))
+    if ZLIB in encoding:
+        data = zlib.compress(data, COMPRESSION_LEVEL)
+    return data
+
+
+class EncodedFileCache:
+    """
+    Keeps encoded versions of files in memory, keyed by path, size, and mtime, so pulling a file which did not change
+    (e.g. a closed day's sensor file) does not encode it again. The least recently used entries are dropped once the
+    cache holds more than max_bytes.
+
+    Attributes:
+        max_bytes (int): Upper bound on the size of the cached data
+        entries (OrderedDict): (path, size, mtime, encoding) -> encoded data
+        size (int): Bytes currently cached
+
+    Methods:
+        get(path, file, encoding): Gets the encoded version of an open file
+    """
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        """
+        Initialize the class
+
+        Args:
+            max_bytes (int): Upper bound on the size of the cached data
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+
+
+    def get(self, path, file, encoding):
+        """
+        Gets the encoded version of an open file, encoding it if it is not cached.
+
+        Args:
+            path (str): Path of the file
+            file (): The file opened in binary mode
+            encoding (tuple): Steps applied in order, see encode_file()
+
+        Returns:
+            bytes: Encoded file
+        """
+        stat = os.fstat(file.fileno())
+        key = (path, stat.st_size, stat.st_mtime_ns, encoding)
+        data = self.entries.get(key)
+        if data is not None:
+            self.entries.move_to_end(key)
+            return data
+
+        data = encode_file(file, stat.st_size, encoding)
+        print(f"Encoded {path} ({'+'.join(encoding)}): {stat.st_size} bytes as {len(data)} bytes")
+        # Older versions of a file which is still being written are not needed anymore
+        for old_key in [k for k in self.entries if k[0] == path and k[3] == encoding]:
+            self.size -= len(self.entries.pop(old_key))
+        self.entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, old_data = self.entries.popitem(last=False)
+            self.size -= len(old_data)
+        return data
+
+
+_encoded_file_cache = None
+
+
+def get_encoded_file_cache():
+    """
+    Gets the cache shared by all characteristics.
+
+    Returns:
+        EncodedFileCache: The shared cache
+    """
+    global _encoded_file_cache
+    if _encoded_file_cache is None:
+        _encoded_file_cache = EncodedFileCache()
+    return _encoded_file_cache
@@ -0,0 +1,313 @@
+import os, time, sqlite3, calendar, threading
+from datetime import datetime, timezone
+from bt_hive_app.file_index import BEE_TMP_PATH, parse_date_dir
+
+
+CATALOG_PATH = '/home/bee/GATT_server/file_catalog.db'
+SENSOR_TYPES = ('audio', 'video', 'cpu', 'temp', 'scale')
+TIME_FORMAT = '%Y-%m-%d %H-%M-%S'
+# Seconds between two background updates of the catalog
+UPDATE_INTERVAL = 60
+# Seconds after its last change a file is still considered growing, so its directory keeps being listed
+GROWING_WINDOW = 600
+
+
+def to_timestamp(value):
+    """
+    Converts a 'YYYY-MM-DD HH-MM-SS' string or datetime to the integer stored in the catalog.
+
+    Args:
+        value (str or datetime): Time to convert
+
+    Returns:
+        int: Seconds since the epoch, the recording's local time is stored as is.
+    """
+    if isinstance(value, str):
+        value = datetime.strptime(value, TIME_FORMAT)
+    return calendar.timegm(value.timetuple())
+
+
+def from_timestamp(timestamp):
+    """
+    Converts a catalog timestamp back to a 'YYYY-MM-DD HH-MM-SS' string.
+
+    Args:
+        timestamp (int): Seconds since the epoch
+
+    Returns:
+        str: Formatted time
+    """
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime(TIME_FORMAT)
+
+
+def parse_recording_time(date, file_name):
+    """
+    Gets the time a file was recorded from its date directory and the '@HH-MM-SS' suffix of its name.
+
+    Args:
+        date (datetime): Parsed date directory
+        file_name (str): Name of the file
+
+    Returns:
+        datetime: Recording time, midnight of 'date' if the file name has no time suffix.
+    """
+    if '@' in file_name:
+        try:
+            time = datetime.strptime(file_name.split('@')[-1].split('.')[0], '%H-%M-%S')
+            return date.replace(hour=time.hour, minute=time.minute, second=time.second)
+        except ValueError:
+            pass
+    return date
+
+
+class FileCatalog:
+    """
+    SQLite catalog of every file recorded under bee_tmp. The catalog is updated incrementally, a date directory is
+    only listed again when its mtime changes, with the exception of the most recent one and of directories holding
+    files that changed recently, e.g. the last file of the previous day that is still written to after midnight.
+
+    Attributes:
+        db_path (str): Path of the SQLite database
+        root_path (str): bee_tmp directory holding one directory per sensor type
+
+    Methods:
+        update(sensor): Brings the catalog up to date with the files on disk
+        query(sensor, start, end): Gets files recorded between start and end
+        get_path(handle): Gets the path of a file returned by query()
+    """
+    def __init__(self, db_path=CATALOG_PATH, root_path=BEE_TMP_PATH):
+        """
+        Initialize the class
+
+        Args:
+            db_path (str): Path of the SQLite database, created if it does not exist
+            root_path (str): bee_tmp directory holding one directory per sensor type
+        """
+        self.db_path = db_path
+        self.root_path = root_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                sensor TEXT NOT NULL,
+                path TEXT NOT NULL UNIQUE,
+                recorded_at INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS files_sensor_recorded_at ON files (sensor, recorded_at);
+            CREATE TABLE IF NOT EXISTS directories (
+                path TEXT PRIMARY KEY,
+                sensor TEXT NOT NULL,
+                mtime REAL NOT NULL
+            );
+        ''')
+        self.connection.commit()
+
+
+    def update(self, sensor=None):
+        """
+        Brings the catalog up to date with the files on disk.
+
+        Args:
+            sensor (str): Only update this sensor type, all types if None
+        """
+        sensors = SENSOR_TYPES if sensor is None else (sensor,)
+        with self.connection:
+            for sensor_type in sensors:
+                self._update_sensor(sensor_type)
+
+
+    def query(self, sensor, start, end, limit=None):
+        """
+        Gets files of one sensor type recorded between start and end.
+
+        Args:
+            sensor (str): Sensor type, e.g. 'scale'
+            start (str or datetime): Start of the range, inclusive
+            end (str or datetime): End of the range, inclusive
+            limit (int): Maximum number of rows to return
+
+        Returns:
+            list: (handle, path, recorded_at, size) tuples ordered by recording time
+        """
+        sql = ('SELECT id, path, recorded_at, size FROM files '
+               'WHERE sensor = ? AND recorded_at BETWEEN ? AND ? ORDER BY recorded_at, path')
+        parameters = [sensor, to_timestamp(start), to_timestamp(end)]
+        if limit is not None:
+            sql += ' LIMIT ?'
+            parameters.append(limit)
+        return self.connection.execute(sql, parameters).fetchall()
+
+
+    def get_path(self, handle):
+        """
+        Gets the path of a file returned by query().
+
+        Args:
+            handle (int): Handle returned by query()
+
+        Returns:
+            str: Path of the file, None if the handle is unknown.
+        """
+        row = self.connection.execute('SELECT path FROM files WHERE id = ?', (handle,)).fetchone()
+        return row[0] if row else None
+
+
+    def _update_sensor(self, sensor):
+        """
+        Updates the rows of one sensor type.
+        """
+        sensor_path = os.path.join(self.root_path, sensor)
+        try:
+            names = os.listdir(sensor_path)
+        except OSError as e:
+            print(f"Could not list {sensor_path}: {e}")
+            return
+
+        date_dirs = {}
+        for name in names:
+            date = parse_date_dir(name)
+            dir_path = os.path.join(sensor_path, name)
+            if date is not None and os.path.isdir(dir_path):
+                date_dirs[dir_path] = date
+
+        known = dict(self.connection.execute('SELECT path, mtime FROM directories WHERE sensor = ?', (sensor,)))
+
+        # Forget date directories that were removed, e.g. after an upload
+        for dir_path in set(known) - set(date_dirs):
+            self.connection.execute('DELETE FROM files WHERE path > ? AND path < ?', (dir_path + '/', dir_path + '0'))
+            self.connection.execute('DELETE FROM directories WHERE path = ?', (dir_path,))
+
+        most_recent = max(date_dirs, key=date_dirs.get) if date_dirs else None
+        # Growing files do not change the mtime of their directory
+        growing = {os.path.dirname(path) for (path,) in self.connection.execute(
+            'SELECT path FROM files WHERE sensor = ? AND mtime > ?', (sensor, time.time() - GROWING_WINDOW))}
+        for dir_path, date in date_dirs.items():
+            try:
+                dir_mtime = os.stat(dir_path).st_mtime
+            except OSError:
+                continue
+            if known.get(dir_path) == dir_mtime and dir_path != most_recent and dir_path not in growing:
+                continue
+            self._update_directory(sensor, dir_path, date)
+            self.connection.execute(
+                'INSERT INTO directories (path, sensor, mtime) VALUES (?, ?, ?) '
+                'ON CONFLICT(path) DO UPDATE SET mtime = excluded.mtime',
+                (dir_path, sensor, dir_mtime))
+
+
+    def _update_directory(self, sensor, dir_path, date):
+        """
+        Updates the rows of the files in one date directory.
+        """
+        present = set()
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                present.add(entry.path)
+                recorded_at = to_timestamp(parse_recording_time(date, entry.name))
+                self.connection.execute(
+                    'INSERT INTO files (sensor, path, recorded_at, size, mtime) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime',
+                    (sensor, entry.path, recorded_at, stat.st_size, stat.st_mtime))
+
+        # '0' sorts right after '/', so this range covers every path inside dir_path and can use the path index
+        rows = self.connection.execute('SELECT path FROM files WHERE path > ? AND path < ?', (dir_path + '/', dir_path + '0'))
+        for (path,) in rows.fetchall():
+            if path not in present:
+                self.connection.execute('DELETE FROM files WHERE path = ?', (path,))
+
+
+_file_catalog = None
+
+
+def get_file_catalog():
+    """
+    Gets the catalog shared by all characteristics, creating it on first use.
+
+    Returns:
+        FileCatalog: Shared catalog
+    """
+    global _file_catalog
+    if _file_catalog is None:
+        _file_catalog = FileCatalog()
+    return _file_catalog
+
+
+class CatalogUpdater:
+    """
+    Background thread keeping the catalog up to date, so listing and stating the archive never blocks the GLib main
+    loop. The thread uses its own connection to the database, queries on the main loop see its updates once they are
+    committed.
+
+    Attributes:
+        db_path (str): Path of the SQLite database
+        root_path (str): bee_tmp directory holding one directory per sensor type
+        wake (Event): Set to update the catalog before the next interval is over
+        thread (Thread): Updating thread, None until started
+
+    Methods:
+        start(): Starts the updating thread
+        request_update(): Updates the catalog as soon as possible
+    """
+    def __init__(self, db_path=CATALOG_PATH, root_path=BEE_TMP_PATH):
+        """
+        Initialize the class
+
+        Args:
+            db_path (str): Path of the SQLite database
+            root_path (str): bee_tmp directory holding one directory per sensor type
+        """
+        self.db_path = db_path
+        self.root_path = root_path
+        self.wake = threading.Event()
+        self.thread = None
+
+
+    def start(self):
+        """
+        Starts the updating thread.
+        """
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, name='catalog-updater', daemon=True)
+        self.thread.start()
+
+
+    def request_update(self):
+        """
+        Updates the catalog as soon as possible, without waiting for the update.
+        """
+        self.wake.set()
+
+
+    def run(self):
+        catalog = FileCatalog(self.db_path, self.root_path)
+        while True:
+            try:
+                catalog.update()
+            except Exception as e:
+                print(f"Error updating file catalog: {e}")
+            self.wake.wait(UPDATE_INTERVAL)
+            self.wake.clear()
+
+
+_catalog_updater = None
+
+
+def get_catalog_updater():
+    """
+    Gets the background updater of the shared catalog, creating and starting it on first use.
+
+    Returns:
+        CatalogUpdater: Shared updater
+    """
+    global _catalog_updater
+    if _catalog_updater is None:
+        _catalog_updater = CatalogUpdater()
+        _catalog_updater.start()
+    return _catalog_updater
@@ -0,0 +1,436 @@
+import ctypes, ctypes.util, os, struct, tempfile, time
+from datetime import datetime
+
+
+# inotify(7) event flags used by the index
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = IN_CREATE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct('iIII')
+
+BEE_TMP_PATH = '/home/bee/appmais/bee_tmp/'
+# Indexes and summaries computed from recordings are stored here, named after the recording they describe
+SIDECAR_DIR = '/home/bee/GATT_server/sidecars/'
+# A recording not modified for this many seconds is finished
+FINISHED_AGE = 60
+
+
+def file_sort_key(file_name):
+    """
+    Sort key used to order recordings inside a date directory. Recordings are named '...@HH-MM-SS.ext',
+    files without the '@' suffix are ordered by name.
+
+    Args:
+        file_name (str): Name of the file
+
+    Returns:
+        tuple: Key which is larger for more recent files
+    """
+    return (file_name.split('@')[-1].split('.')[0], file_name)
+
+
+def parse_date_dir(name):
+    """
+    Parses a 'YYYY-MM-DD' directory name.
+
+    Args:
+        name (str): Directory name
+
+    Returns:
+        datetime: Parsed date if the name matches the format, None otherwise.
+    """
+    try:
+        return datetime.strptime(name, "%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def write_file_atomic(path, data):
+    """
+    Writes a sidecar or preview through a uniquely named temporary file in the same directory and renames it over path,
+    so readers only ever see complete files and two writers of the same file never share a temporary file.
+
+    Args:
+        path (str): Path of the file to write, its directory is created if needed
+        data (bytes): Content of the file
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def is_finished(path, finished_age=FINISHED_AGE):
+    """
+    Checks if a recording is finished, i.e. was not modified for finished_age seconds.
+
+    Args:
+        path (str): Path of the recording
+        finished_age (int): Seconds since the last modification after which a recording is finished
+
+    Returns:
+        bool: True if the recording is finished, False if it is still being written or does not exist
+    """
+    try:
+        return time.time() - os.path.getmtime(path) >= finished_age
+    except OSError:
+        return False
+
+
+def finished_recordings(base_path, extension, days=2, finished_age=FINISHED_AGE):
+    """
+    Lists the finished recordings of the most recent date directories, used by background jobs processing each
+    recording once. The directories are listed directly rather than through the shared index, which is only used from
+    the GLib main loop.
+
+    Args:
+        base_path (str): Sensor directory, e.g. '/home/bee/appmais/bee_tmp/video/'
+        extension (str): File extension of the recordings
+        days (int): Number of date directories to look at
+        finished_age (int): Seconds since the last modification after which a recording is finished
+
+    Returns:
+        list: Paths of the finished recordings, oldest first
+    """
+    if not os.path.isdir(base_path):
+        return []
+    date_dirs = sorted(name for name in os.listdir(base_path) if parse_date_dir(name) is not None)
+    recordings = []
+    for date_dir in date_dirs[-days:]:
+        date_path = os.path.join(base_path, date_dir)
+        for name in sorted(os.listdir(date_path), key=file_sort_key):
+            path = os.path.join(date_path, name)
+            if name.endswith(extension) and is_finished(path, finished_age):
+                recordings.append(path)
+    return recordings
+
+
+class _WatchedDirectory:
+    """
+    State kept for one sensor directory (e.g. bee_tmp/video/).
+
+    Attributes:
+        base_path (str): Sensor directory holding the date directories
+        base_wd (int): inotify watch on base_path
+        date_dir (str): Name of the most recent date directory
+        date_wd (int): inotify watch on the most recent date directory
+        latest (dict): File extension -> name of the most recent file with that extension
+        dirty (bool): True if the state needs to be rebuilt from disk
+    """
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.base_wd = None
+        self.date_dir = None
+        self.date_wd = None
+        self.latest = {}
+        self.dirty = True
+
+
+class LatestFileIndex:
+    """
+    Keeps the most recent date directory and most recent file per extension for every sensor directory in memory.
+    The directories are watched with inotify so a lookup only has to apply the events queued since the last one,
+    a full rescan of a directory only happens when it is first used, when the newest entry is removed, or when the
+    inotify queue overflows.
+
+    Attributes:
+        fd (int): inotify file descriptor, None if inotify is not available (every lookup then rescans)
+
+    Methods:
+        latest_file(base_path, extension): Gets the most recent file below base_path
+        latest_date_dir(base_path): Gets the most recent date directory below base_path
+        invalidate(base_path): Forces a rescan on the next lookup
+    """
+    def __init__(self):
+        """
+        Initialize the class
+        """
+        self.directories = {}
+        self.watches = {}
+        self.fd = None
+        self.libc = None
+
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self.fd = fd
+            else:
+                print(f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        except (OSError, AttributeError) as e:
+            print(f"inotify not available, falling back to directory scans: {e}")
+
+
+    def latest_file(self, base_path, extension=None):
+        """
+        Gets the most recent file in the most recent date directory of base_path.
+
+        Args:
+            base_path (str): Sensor directory, e.g. '/home/bee/appmais/bee_tmp/audio/'
+            extension (str): Only consider files ending with this extension ('.wav'), any file if None
+
+        Returns:
+            str: Full path of the most recent file, None if there is no date directory or no matching file.
+        """
+        entry = self._lookup(base_path)
+        if entry.date_dir is None:
+            return None
+
+        if extension is None:
+            if not entry.latest:
+                return None
+            file_name = max(entry.latest.values(), key=file_sort_key)
+        else:
+            file_name = entry.latest.get(extension.lower())
+            if file_name is None:
+                return None
+
+        return os.path.join(entry.base_path, entry.date_dir, file_name)
+
+
+    def latest_date_dir(self, base_path):
+        """
+        Gets the most recent date directory of base_path.
+
+        Args:
+            base_path (str): Sensor directory
+
+        Returns:
+            str: Full path of the most recent date directory, None if there is none.
+        """
+        entry = self._lookup(base_path)
+        if entry.date_dir is None:
+            return None
+        return os.path.join(entry.base_path, entry.date_dir)
+
+
+    def invalidate(self, base_path=None):
+        """
+        Forces a rescan of base_path, or of every directory if base_path is None, on the next lookup.
+
+        Args:
+            base_path (str): Sensor directory to invalidate
+        """
+        if base_path is None:
+            for entry in self.directories.values():
+                entry.dirty = True
+        else:
+            entry = self.directories.get(os.path.normpath(base_path))
+            if entry is not None:
+                entry.dirty = True
+
+
+    def _lookup(self, base_path):
+        """
+        Returns the up to date state for base_path, registering it on first use.
+        """
+        key = os.path.normpath(base_path)
+        entry = self.directories.get(key)
+        if entry is None:
+            entry = _WatchedDirectory(key)
+            self.directories[key] = entry
+
+        self._drain_events()
+        if entry.dirty or self.fd is None:
+            self._rescan(entry)
+        return entry
+
+
+    def _add_watch(self, path, entry, kind):
+        """
+        Adds an inotify watch for path and remembers which directory state it belongs to.
+
+        Returns:
+            int: Watch descriptor, None if the watch could not be added.
+        """
+        if self.fd is None:
+            return None
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            print(f"Could not watch {path}: {os.strerror(ctypes.get_errno())}")
+            return None
+        self.watches[wd] = (entry, kind)
+        return wd
+
+
+    def _remove_watch(self, wd):
+        """
+        Removes an inotify watch added by _add_watch.
+        """
+        if wd is None or self.fd is None:
+            return
+        self.watches.pop(wd, None)
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+
+    def _rescan(self, entry):
+        """
+        Rebuilds the state of a sensor directory from disk.
+        """
+        entry.latest = {}
+        entry.date_dir = None
+
+        try:
+            names = os.listdir(entry.base_path)
+        except OSError as e:
+            print(f"Could not list {entry.base_path}: {e}")
+            return
+
+        if entry.base_wd is None:
+            entry.base_wd = self._add_watch(entry.base_path, entry, 'base')
+
+        date_dirs = []
+        for name in names:
+            date = parse_date_dir(name)
+            if date is not None and os.path.isdir(os.path.join(entry.base_path, name)):
+                date_dirs.append((date, name))
+
+        if date_dirs:
+            date_dir = max(date_dirs)[1]
+            self._set_date_dir(entry, date_dir)
+        else:
+            self._remove_watch(entry.date_wd)
+            entry.date_wd = None
+
+        # Without a base watch new date directories would go unnoticed, keep rescanning
+        entry.dirty = entry.base_wd is None
+
+
+    def _set_date_dir(self, entry, date_dir):
+        """
+        Points entry at date_dir, moving the date directory watch and listing its files.
+        """
+        if date_dir != entry.date_dir or entry.date_wd is None:
+            self._remove_watch(entry.date_wd)
+            entry.date_wd = self._add_watch(os.path.join(entry.base_path, date_dir), entry, 'date')
+        entry.date_dir = date_dir
+        entry.latest = {}
+
+        full_path = os.path.join(entry.base_path, date_dir)
+        try:
+            for name in os.listdir(full_path):
+                if not os.path.isdir(os.path.join(full_path, name)):
+                    self._add_file(entry, name)
+        except OSError as e:
+            print(f"Could not list {full_path}: {e}")
+
+
+    def _add_file(self, entry, name):
+        """
+        Records name as the most recent file for its extension if it is newer than the current one.
+        """
+        extension = os.path.splitext(name)[1].lower()
+        current = entry.latest.get(extension)
+        if current is None or file_sort_key(name) > file_sort_key(current):
+            entry.latest[extension] = name
+
+
+    def _drain_events(self):
+        """
+        Reads and applies all inotify events queued since the last lookup.
+        """
+        if self.fd is None:
+            return
+
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                print(f"Error reading inotify events: {e}")
+                self.invalidate()
+                return
+
+            position = 0
+            while position + EVENT_HEADER.size <= len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, position)
+                position += EVENT_HEADER.size
+                name = os.fsdecode(data[position:position + length].rstrip(b'\0'))
+                position += length
+                self._apply_event(wd, mask, name)
+
+
+    def _apply_event(self, wd, mask, name):
+        """
+        Updates the in memory state for a single inotify event.
+        """
+        if mask & IN_Q_OVERFLOW:
+            print("inotify queue overflowed, rescanning sensor directories")
+            self.invalidate()
+            return
+
+        watch = self.watches.get(wd)
+        if watch is None:
+            return
+        entry, kind = watch
+
+        if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+            # The watched directory itself is gone
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                if kind == 'base':
+                    entry.base_wd = None
+                else:
+                    entry.date_wd = None
+            entry.dirty = True
+            return
+
+        created = mask & (IN_CREATE | IN_MOVED_TO)
+        removed = mask & (IN_DELETE | IN_MOVED_FROM)
+
+        if kind == 'base':
+            if not mask & IN_ISDIR:
+                return
+            date = parse_date_dir(name)
+            if date is None:
+                return
+            if created and (entry.date_dir is None or date > parse_date_dir(entry.date_dir)):
+                self._set_date_dir(entry, name)
+            elif removed and name == entry.date_dir:
+                entry.dirty = True
+        else:
+            if mask & IN_ISDIR:
+                return
+            if created:
+                self._add_file(entry, name)
+            elif removed and name in entry.latest.values():
+                entry.dirty = True
+
+
+_file_index = None
+
+
+def get_file_index():
+    """
+    Gets the index shared by all characteristics, creating it on first use.
+
+    Returns:
+        LatestFileIndex: Shared index
+    """
+    global _file_index
+    if _file_index is None:
+        _file_index = LatestFileIndex()
+    return _file_index
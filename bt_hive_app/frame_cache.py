@@ -0,0 +1,83 @@
+import os
+from collections import OrderedDict
+import bt_hive_app.helper_methods as help
+
+
+# Frame sent to the application from the most recent video
+VIDEO_FRAME_NUMBER = 100
+# Upper bound on the bytes of encoded frames kept in memory
+MAX_CACHE_BYTES = 8 * 1024 * 1024
+
+
+class FrameCache:
+    """
+    Keeps encoded video frames in memory so a frame is decoded once instead of once per transfer. Frames are keyed by
+    video path, mtime, frame number, and JPEG quality and width, so a video which is still being recorded is decoded
+    again once it changes. The least recently used frames are dropped once the cache holds more than max_bytes.
+
+    Attributes:
+        max_bytes (int): Upper bound on the size of the cached frames
+        frames (OrderedDict): (path, mtime, frame number, quality, width) -> JPEG bytes
+        size (int): Bytes currently cached
+
+    Methods:
+        get(video_path, frame_number, quality, width): Gets an encoded frame
+    """
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        """
+        Initialize the class
+
+        Args:
+            max_bytes (int): Upper bound on the size of the cached frames
+        """
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()
+        self.size = 0
+
+
+    def get(self, video_path, frame_number=VIDEO_FRAME_NUMBER, quality=help.DEFAULT_JPEG_QUALITY, width=None):
+        """
+        Gets an encoded frame, decoding it only if it is not cached.
+
+        Args:
+            video_path (str): Path of the video
+            frame_number (int): Frame to extract
+            quality (int): JPEG quality from 0 to 100
+            width (int): Width to scale the frame down to, full resolution if None
+
+        Returns:
+            bytes: The encoded frame, None if it could not be extracted
+        """
+        if video_path is None:
+            return None
+        key = (video_path, os.stat(video_path).st_mtime_ns, frame_number, quality, width)
+        frame = self.frames.get(key)
+        if frame is not None:
+            self.frames.move_to_end(key)
+            return frame
+
+        frame = help.extract_frame(video_path, frame_number, quality, width)
+        if frame is None:
+            return None
+        self.frames[key] = frame
+        self.size += len(frame)
+        while self.size > self.max_bytes and len(self.frames) > 1:
+            _, old_frame = self.frames.popitem(last=False)
+            self.size -= len(old_frame)
+        return frame
+
+
+_frame_cache = None
+
+
+def get_frame_cache():
+    """
+    Gets the frame cache shared by all characteristics.
+
+    Returns:
+        FrameCache: The shared cache
+    """
+    global _frame_cache
+    if _frame_cache is None:
+        _frame_cache = FrameCache()
+    return _frame_cache
@@ -0,0 +1,320 @@
+import os, struct, tempfile, threading, time, bisect
+from bt_hive_app.file_index import finished_recordings, write_file_atomic, SIDECAR_DIR
+
+
+# Sidecar layout: header, then one KEYFRAME record per IDR frame
+#   header:   magic, version, video size, video mtime (ns), end of the stream headers (SPS/PPS), frame count
+#   keyframe: frame number, offset decoding of that frame can start from (its SPS/PPS if repeated inline)
+INDEX_MAGIC = b'HKIX'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('<4sBQqQI')
+KEYFRAME = struct.Struct('<IQ')
+
+NAL_SLICE = 1
+NAL_IDR = 5
+START_CODE = b'\x00\x00\x01'
+SCAN_BLOCK_SIZE = 1 << 20
+
+# Seconds between two scans of the video directory
+INDEX_INTERVAL = 60
+# Segments handed to OpenCV are written to RAM backed storage when available
+SEGMENT_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def scan_nal_units(file, block_size=SCAN_BLOCK_SIZE):
+    """
+    Scans a raw Annex-B H.264 stream for NAL units.
+
+    Args:
+        file (): Video opened in binary mode
+        block_size (int): Number of bytes read at a time
+
+    Yields:
+        int: Offset of the NAL unit's start code
+        int: NAL header byte
+        int: First byte after the header, 0 if the stream ends there
+    """
+    file.seek(0)
+    buffer = b''
+    base = 0
+    while True:
+        block = file.read(block_size)
+        eof = not block
+        buffer += block
+        search = 0
+        while True:
+            pos = buffer.find(START_CODE, search)
+            if pos < 0 or (pos + 5 > len(buffer) and not eof):
+                break
+            if pos + 3 < len(buffer):
+                start = pos - 1 if pos > 0 and buffer[pos - 1] == 0 else pos
+                yield base + start, buffer[pos + 3], buffer[pos + 4] if pos + 4 < len(buffer) else 0
+            search = pos + 3
+        if eof:
+            return
+        # Keep the bytes a start code or NAL header could still span
+        cut = max(pos - 1, 0) if pos >= 0 else max(search, len(buffer) - 3)
+        buffer = buffer[cut:]
+        base += cut
+
+
+def build_index(file):
+    """
+    Finds the frames and keyframes of a raw H.264 stream. A slice NAL unit whose first_mb_in_slice is 0 (the first bit
+    after the header is set) starts a new frame, IDR slices start a keyframe.
+
+    Args:
+        file (): Video opened in binary mode
+
+    Returns:
+        int: Offset of the first slice, the bytes before it hold the stream headers
+        int: Number of frames
+        list: (frame number, offset) of every keyframe
+    """
+    headers_end = None
+    frame_count = 0
+    keyframes = []
+    unit_start = None
+    for offset, header, first_byte in scan_nal_units(file):
+        nal_type = header & 0x1f
+        if nal_type in (NAL_SLICE, NAL_IDR):
+            if headers_end is None:
+                headers_end = offset
+            if first_byte & 0x80:
+                if nal_type == NAL_IDR:
+                    keyframes.append((frame_count, unit_start if unit_start is not None else offset))
+                frame_count += 1
+            unit_start = None
+        elif unit_start is None:
+            # SPS, PPS, SEI, ... in front of the next frame belong to it
+            unit_start = offset
+    return headers_end or 0, frame_count, keyframes
+
+
+def sidecar_path(video_path):
+    """
+    Path of the sidecar index of a video.
+    """
+    return os.path.join(SIDECAR_DIR, os.path.basename(video_path) + '.kfi')
+
+
+class KeyframeIndex:
+    """
+    Keyframe positions of one video, used to start decoding at the keyframe before a frame instead of at the start of
+    the video.
+
+    Attributes:
+        video_size (int): Size of the indexed video
+        video_mtime (int): mtime of the indexed video in ns
+        headers_end (int): Offset of the first slice, the bytes before it hold the stream headers
+        frame_count (int): Number of frames
+        frames (list): Frame number of every keyframe
+        offsets (list): Offset decoding of every keyframe starts from
+
+    Methods:
+        keyframe_before(frame_number): Gets the keyframe to start decoding a frame from
+        save(path): Writes the index to a sidecar file
+        load(path): Reads an index from a sidecar file
+    """
+    def __init__(self, video_size, video_mtime, headers_end, frame_count, keyframes):
+        """
+        Initialize the class
+        """
+        self.video_size = video_size
+        self.video_mtime = video_mtime
+        self.headers_end = headers_end
+        self.frame_count = frame_count
+        self.frames = [frame for frame, offset in keyframes]
+        self.offsets = [offset for frame, offset in keyframes]
+
+
+    def keyframe_before(self, frame_number):
+        """
+        Gets the keyframe to start decoding a frame from.
+
+        Args:
+            frame_number (int): Frame to decode
+
+        Returns:
+            int: Frame number of the keyframe, None if there is no keyframe at or before frame_number
+            int: Offset decoding starts from
+            int: Offset of the next keyframe (or the end of the video), the frame lies before it
+        """
+        position = bisect.bisect_right(self.frames, frame_number) - 1
+        if position < 0:
+            return None, 0, self.video_size
+        end = self.offsets[position + 1] if position + 1 < len(self.offsets) else self.video_size
+        return self.frames[position], self.offsets[position], end
+
+
+    def save(self, path):
+        """
+        Writes the index to a sidecar file, replacing it atomically.
+        """
+        data = INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.video_size, self.video_mtime, self.headers_end,
+                                 self.frame_count)
+        data += b''.join(KEYFRAME.pack(frame, offset) for frame, offset in zip(self.frames, self.offsets))
+        write_file_atomic(path, data)
+
+
+    @staticmethod
+    def load(path):
+        """
+        Reads an index from a sidecar file.
+
+        Returns:
+            KeyframeIndex: The index, None if the file is missing or not a valid index
+        """
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            magic, version, video_size, video_mtime, headers_end, frame_count = INDEX_HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            return None
+        keyframes = list(KEYFRAME.iter_unpack(data[INDEX_HEADER.size:]))
+        return KeyframeIndex(video_size, video_mtime, headers_end, frame_count, keyframes)
+
+
+def index_video(video_path):
+    """
+    Builds the index of a video and writes its sidecar.
+
+    Returns:
+        KeyframeIndex: The new index
+    """
+    with open(video_path, 'rb') as file:
+        stat = os.fstat(file.fileno())
+        index = KeyframeIndex(stat.st_size, stat.st_mtime_ns, *build_index(file))
+    index.save(sidecar_path(video_path))
+    print(f"Indexed {video_path}: {index.frame_count} frames, {len(index.frames)} keyframes")
+    return index
+
+
+_indexes = {}
+
+
+def get_keyframe_index(video_path):
+    """
+    Gets the index of a video from its sidecar. Indexes are cached in memory and dropped once the video changes.
+
+    Args:
+        video_path (str): Path of the video
+
+    Returns:
+        KeyframeIndex: The index, None if the video was not indexed yet or changed since
+    """
+    stat = os.stat(video_path)
+    index = _indexes.get(video_path)
+    if index is None or index.video_size != stat.st_size or index.video_mtime != stat.st_mtime_ns:
+        index = KeyframeIndex.load(sidecar_path(video_path))
+        if index is None or index.video_size != stat.st_size or index.video_mtime != stat.st_mtime_ns:
+            _indexes.pop(video_path, None)
+            return None
+        _indexes[video_path] = index
+    return index
+
+
+def write_segment(video_path, frame_number):
+    """
+    Writes the part of a video needed to decode a frame to a temporary file: the stream headers followed by the
+    group of pictures from the keyframe before the frame up to the next keyframe.
+
+    Args:
+        video_path (str): Path of the video
+        frame_number (int): Frame to decode
+
+    Returns:
+        str: Path of the segment, the caller deletes it. None if the video is not indexed.
+        int: Number of frames to skip in the segment to reach frame_number
+    """
+    index = get_keyframe_index(video_path)
+    if index is None or frame_number >= index.frame_count:
+        return None, frame_number
+    keyframe, start, end = index.keyframe_before(frame_number)
+    if keyframe is None:
+        return None, frame_number
+
+    with open(video_path, 'rb') as video:
+        headers = video.read(index.headers_end) if start > index.headers_end else b''
+        video.seek(start)
+        data = video.read(end - start)
+    fd, segment_path = tempfile.mkstemp(suffix='.h264', dir=SEGMENT_DIR)
+    with os.fdopen(fd, 'wb') as segment:
+        segment.write(headers + data)
+    return segment_path, frame_number - keyframe
+
+
+class KeyframeIndexer:
+    """
+    Background thread indexing finished videos of the two most recent date directories of a video directory. Each
+    video is scanned once, the sidecar is reused afterwards.
+
+    Attributes:
+        base_path (str): Video directory, e.g. '/home/bee/appmais/bee_tmp/video/'
+        thread (Thread): Indexing thread, None until started
+
+    Methods:
+        start(): Starts the indexing thread
+        index_finished_videos(): Indexes every finished video without a valid sidecar
+    """
+    def __init__(self, base_path):
+        """
+        Initialize the class
+
+        Args:
+            base_path (str): Video directory
+        """
+        self.base_path = base_path
+        self.thread = None
+
+
+    def start(self):
+        """
+        Starts the indexing thread.
+        """
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, name='keyframe-indexer', daemon=True)
+        self.thread.start()
+
+
+    def run(self):
+        while True:
+            try:
+                self.index_finished_videos()
+            except Exception as e:
+                print(f"Error indexing videos: {e}")
+            time.sleep(INDEX_INTERVAL)
+
+
+    def index_finished_videos(self):
+        """
+        Indexes every finished video without a valid sidecar.
+        """
+        for video_path in finished_recordings(self.base_path, '.h264'):
+            if get_keyframe_index(video_path) is None:
+                index_video(video_path)
+
+
+_indexers = {}
+
+
+def get_keyframe_indexer(base_path):
+    """
+    Gets the indexer for a video directory, creating and starting it on first use.
+
+    Args:
+        base_path (str): Video directory
+
+    Returns:
+        KeyframeIndexer: Indexer shared by every characteristic reading base_path
+    """
+    key = os.path.normpath(base_path)
+    indexer = _indexers.get(key)
+    if indexer is None:
+        indexer = KeyframeIndexer(base_path)
+        _indexers[key] = indexer
+        indexer.start()
+    return indexer
@@ -1,5 +1,15 @@
 import os, cv2
-from datetime import datetime
+from bt_hive_app.file_index import get_file_index
+from bt_hive_app.h264_index import write_segment
+
+
+MAX_ATTRIBUTE_SIZE = 512
+MIN_PAYLOAD_SIZE = 20
+# ATT header in front of the value: opcode for read responses, opcode and handle for notifications
+READ_HEADER_SIZE = 1
+NOTIFY_HEADER_SIZE = 3
+# cv2's default JPEG quality
+DEFAULT_JPEG_QUALITY = 95
 
 
 def get_most_recent_sensor_file(base_path):
@@ -7,47 +17,54 @@ def get_most_recent_sensor_file(base_path):
     Gets the most recent sensor file, these are the files stores in the 'appmais' directory where sensor data is stored
 
     Args:
-        base_path (str): 
+        base_path (str): Sensor directory, e.g. '/home/bee/appmais/bee_tmp/cpu/'
+
+    Returns:
+        str: Path to most recent sensor file, None if there is none.
     """
     try:
-        # List all directories in the base path
-        print("GETTING ENTRIES")
-        print(f"BASE_PATH: {base_path}")
-        print(f"ENTRIES: {os.listdir(base_path)}")
-        entries = os.listdir(base_path)
-        print(f"Entries: {entries}")
-                
-        # Filter out possible non directory entries or directories which dont match the data format
-        date_dirs = []
-        for entry in entries:
-            entry_path = os.path.join(base_path, entry)
-            if os.path.isdir(entry_path):
-                try:
-                    # Try to parse the directory name as a date
-                    date = datetime.strptime(entry, "%Y-%m-%d")
-                    date_dirs.append((entry, date))
-                except ValueError:
-                    # Skip directories that don't match the date format
-                    pass
-        if not date_dirs:
-            print("Not date_dirs")
-            return None
+        return get_file_index().latest_file(base_path)
+    except Exception as e:
+        print(f"Failure within get_most_recent_sensor_file(): {e}")
+
+
+def get_most_recent_csv_file(base_path):
+        """
+        Get most recent csv file
+
+        Args:
+            base_path (str): Path to pull most recent file from
+
+        Returns:
+            str: Path to most recent csv file, None if there is no date directory
+
+        Raises:
+            ValueError: If the most recent date directory contains no csv file.
+        """
+        return _get_most_recent_file(base_path, '.csv')
 
-        # Find most recent date
-        most_recent_dir = max(date_dirs, key=lambda x: x[1])[0]
-        print(f"Most_recent_dir: {most_recent_dir}")
-        full_path = os.path.join(base_path, most_recent_dir)
-        print(f"Full_path: {full_path}")
-
-        # List files in this directory
-        files = os.listdir(full_path)
-        # if (len(files) != 1):
-        #     raise ValueError(f"Expected exactly one file in directory {full_path}, found {len(files)}")
-            
-        # Get full path of the file
-        return full_path + '/' + files[0]
-    except:
-        print("Failure within get_most_recent_sensor_file()")
+
+def _get_most_recent_file(base_path, extension):
+        """
+        Looks up the most recent file with 'extension' in the shared file index.
+
+        Args:
+            base_path (str): Path to pull most recent file from
+            extension (str): File extension to look for
+
+        Returns:
+            str: Path to most recent file, None if there is no date directory
+
+        Raises:
+            ValueError: If the most recent date directory contains no matching file.
+        """
+        index = get_file_index()
+        file_path = index.latest_file(base_path, extension)
+        if file_path is None:
+            date_dir = index.latest_date_dir(base_path)
+            if date_dir is not None:
+                raise ValueError(f"No {extension} files in the directory {date_dir}")
+        return file_path
 
 '''
 def create_waveform_file(audio_file):
@@ -73,6 +90,66 @@ def create_waveform_file(audio_file):
 '''
 
 
+def get_payload_size(options, default=512, header_size=READ_HEADER_SIZE):
+        """
+        Gets the number of bytes that fit in one read response, derived from the MTU BlueZ passes in 'options'.
+
+        Args:
+            options (dict): Options passed to ReadValue or WriteValue
+            default (int): Size to use if BlueZ did not pass an MTU
+            header_size (int): ATT header size of the PDU carrying the value, NOTIFY_HEADER_SIZE for notifications
+
+        Returns:
+            int: Payload size in bytes, at most the 512 byte attribute limit
+        """
+        mtu = options.get('mtu') if options else None
+        if mtu is None:
+            return default
+        return max(min(int(mtu) - header_size, MAX_ATTRIBUTE_SIZE), MIN_PAYLOAD_SIZE)
+
+
+def pack_lines(lines, start, max_bytes):
+        """
+        Packs as many whole lines as fit in max_bytes, used to page text results over several reads.
+
+        Args:
+            lines (list): Encoded lines including their newlines
+            start (int): Index of the first line to pack
+            max_bytes (int): Maximum number of bytes to return, at least one line is always returned
+
+        Returns:
+            bytes: The packed lines
+            int: Index of the first line that did not fit
+        """
+        data = b''
+        index = start
+        while index < len(lines):
+            if data and len(data) + len(lines[index]) > max_bytes:
+                break
+            data += lines[index]
+            index += 1
+        return data, index
+
+
+def parse_options(value):
+        """
+        Parses an options string written by the application, e.g. 'sensor=scale,start=2024-06-01 00-00-00'
+
+        Args:
+            value (): Bytes received from the application
+
+        Returns:
+            dict: Option name -> value, options written without '=' map to an empty string.
+        """
+        options = {}
+        for option in bytes(value).decode('utf-8').split(','):
+            if option.strip() == '':
+                continue
+            name, _, option_value = option.partition('=')
+            options[name.strip()] = option_value.strip()
+        return options
+
+
 def delete_file(file_path):
         """
         Delete file located at 'file_path'
@@ -101,50 +178,7 @@ def get_most_recent_video_file(base_path):
         Returns:
             str: Path to most recent video file
         """
-        # List all directories in the base path
-        entries = os.listdir(base_path)
-        
-        # Filter out possible non directory entries or directories which dont match the data format
-        date_dirs = []
-        for entry in entries:
-            entry_path = os.path.join(base_path, entry)
-            if os.path.isdir(entry_path):
-                try:
-                    # Try to parse the directory name as a date
-                    date = datetime.strptime(entry, "%Y-%m-%d")
-                    date_dirs.append((entry, date))
-                except ValueError:
-                    # Skip directories that don't match the date format
-                    pass
-        if not date_dirs:
-            return None
-
-        # Find most recent date
-        most_recent_dir = max(date_dirs, key=lambda x: x[1])[0]
-        full_path = os.path.join(base_path, most_recent_dir)
-
-        # List files in this directory
-        files = []
-        most_recent_file = '';
-        for file in os.listdir(full_path):
-            if file.endswith('.h264'):
-                files.append(file)
-                if most_recent_file == '':
-                    most_recent_file = file
-                else:
-                    split_file = (file.split('@')[-1].split('.')[0].split('-'))
-                    split_mr_file = (most_recent_file.split('@')[-1].split('.')[0].split('-'))
-                    
-                    if split_file[0] > split_mr_file[0]:
-                        most_recent_file = file
-                    elif split_file[0] == split_mr_file[0] and split_file[1] > split_mr_file[1]:
-                        most_recent_file = file
-
-        if (len(files) < 1):
-            raise ValueError(f"No files in the directory {full_path}, found {len(files)}")
-        
-        # Get full path of the file
-        return (full_path + '/' + most_recent_file)
+        return _get_most_recent_file(base_path, '.h264')
 
 
 def get_most_recent_audio_file(base_path):
@@ -157,96 +191,65 @@ def get_most_recent_audio_file(base_path):
         Returns:
             str: Full path of most recent audio file
         """
-        print("Getting most recent file")
-        # List all directories in the base path
-        entries = os.listdir(base_path)
-        
-        # Filter out possible non directory entries or directories which dont match the data format
-        date_dirs = []
-        for entry in entries:
-            entry_path = os.path.join(base_path, entry)
-            if os.path.isdir(entry_path):
-                try:
-                    # Try to parse the directory name as a date
-                    date = datetime.strptime(entry, "%Y-%m-%d")
-                    date_dirs.append((entry, date))
-                except ValueError:
-                    # Skip directories that don't match the date format
-                    pass
-        if not date_dirs:
-            return None
-
-        # Find most recent date
-        most_recent_dir = max(date_dirs, key=lambda x: x[1])[0]
-        full_path = os.path.join(base_path, most_recent_dir)
-
-        # List files in this directory
-        files = []
-        most_recent_file = '';
-        for file in os.listdir(full_path):
-            if file.endswith('.wav'):
-                files.append(file)
-                if most_recent_file == '':
-                    most_recent_file = file
-                else:
-                    split_file = (file.split('@')[-1].split('.')[0].split('-'))
-                    split_mr_file = (most_recent_file.split('@')[-1].split('.')[0].split('-'))
-                    
-                    if split_file[0] > split_mr_file[0]:
-                        most_recent_file = file
-                    elif split_file[0] == split_mr_file[0] and split_file[1] > split_mr_file[1]:
-                        most_recent_file = file
-
-        if (len(files) < 1):
-            raise ValueError(f"No files in the directory {full_path}, found {len(files)}")
-        
-        # Get full path of the file
-        return (full_path + '/' + most_recent_file)
+        return _get_most_recent_file(base_path, '.wav')
 
 
-def extract_frame(video_file, frame_number, output_file):
+def extract_frame(video_file, frame_number, quality=DEFAULT_JPEG_QUALITY, width=None):
         """
-        Extracts fram from video located at 'video_file'
+        Extracts frame from video located at 'video_file' and encodes it as JPEG in memory, nothing is written to disk.
 
         Args:
             video_file (str): Path of video to extract frame from
             frame_number (int): Frame number to extract
-            output_file (): File to save frame to
-        
+            quality (int): JPEG quality from 0 to 100
+            width (int): Width to scale the frame down to keeping its aspect ratio, full resolution if None or larger
+                than the frame
+
         Returns:
-            : output_file
+            bytes: Encoded frame, None if it could not be extracted
         """
-        # Open the video file
-        cap = cv2.VideoCapture(video_file)
-
-        # Check if the video file was opened successfully
-        if not cap.isOpened():
-            print(f"Error: Could not open video file '{video_file}'")
-            return
-
-        # Get total number of frames in the video
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        # print(f"Total frames in the video: {total_frames}")
+        # Decode only from the keyframe before the frame if the video was indexed (h264_index.py)
+        try:
+            segment_path, skip_frames = write_segment(video_file, frame_number)
+        except OSError as e:
+            print(f"Error reading keyframe index of '{video_file}': {e}")
+            segment_path, skip_frames = None, frame_number
 
-        # Set the desired frame number
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+        # Open the video file
+        cap = cv2.VideoCapture(segment_path or video_file)
 
-        # Read the frame
-        ret, frame = cap.read()
+        try:
+            # Check if the video file was opened successfully
+            if not cap.isOpened():
+                print(f"Error: Could not open video file '{video_file}'")
+                return None
+
+            if segment_path is None:
+                # Set the desired frame number, decodes every frame before it
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            else:
+                for _ in range(skip_frames):
+                    cap.grab()
+
+            # Read the frame
+            ret, frame = cap.read()
+        finally:
+            cap.release()
+            if segment_path is not None:
+                os.remove(segment_path)
 
-        if ret:
-            # Save the frame as an image file
-            cv2.imwrite(output_file, frame)
-            print(f"Frame {frame_number} saved as {output_file}")
+        if not ret:
+            print(f"Error: Could not read frame {frame_number} from video")
+            return None
 
-            # Get size of the saved image file
-            file_size = os.path.getsize(output_file)
-            # print(f"Size of {output_file}: {file_size} bytes")
+        height, frame_width = frame.shape[:2]
+        if width and width < frame_width:
+            frame = cv2.resize(frame, (width, max(1, round(height * width / frame_width))), interpolation=cv2.INTER_AREA)
 
-            cap.release()
-            return output_file
-        else:
-            print(f"Error: Could not read frame {frame_number} from video")
-            cap.release()
+        ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+        if not ret:
+            print(f"Error: Could not encode frame {frame_number}")
             return None
-        
\ No newline at end of file
+
+        print(f"Frame {frame_number} encoded, {len(buffer)} bytes")
+        return buffer.tobytes()
@@ -0,0 +1,547 @@
+import os, struct, bisect
+from array import array
+from collections import OrderedDict
+from bt_hive_app.csv_range import find_time_range, parse_time
+from bt_hive_app.sensor_codec import SensorRowEncoder, count_columns
+
+
+BLOCK_SIZE = 64 * 1024
+MAX_CACHED_INDEXES = 16
+
+# Batch header: number of lines, line number of the first line, flags
+BATCH_HEADER = struct.Struct('<HIB')
+BATCH_EOF = 0x01
+BATCH_SCHEMA = 0x02
+
+
+class LineIndex:
+    """
+    Byte offset of every line in a text file. The index is built once and extended when the file grows, it is only
+    rebuilt if the file is replaced (new inode) or truncated.
+
+    Attributes:
+        path (str): Path of the indexed file
+        inode (int): Inode of the indexed file
+        size (int): Number of bytes indexed so far
+        offsets (array): Start offset of every line, the last entry may equal size if the file ends with a newline
+
+    Methods:
+        update(file): Indexes bytes appended since the last update
+        line_count(): Number of lines in the file
+        read_line(file, line_number): Reads a single line
+        read_lines(file, first_line, max_bytes, end_line): Reads as many whole lines as fit in max_bytes
+    """
+    def __init__(self, path, inode):
+        """
+        Initialize the class
+
+        Args:
+            path (str): Path of the indexed file
+            inode (int): Inode of the indexed file
+        """
+        self.path = path
+        self.inode = inode
+        self.size = 0
+        self.offsets = array('Q', [0])
+
+
+    def update(self, file):
+        """
+        Indexes bytes appended to the file since the last update.
+
+        Args:
+            file (): File opened in binary mode
+        """
+        size = os.fstat(file.fileno()).st_size
+        if size < self.size:
+            # File was truncated, start over
+            self.size = 0
+            self.offsets = array('Q', [0])
+        if size == self.size:
+            return
+
+        file.seek(self.size)
+        position = self.size
+        while position < size:
+            block = file.read(min(BLOCK_SIZE, size - position))
+            if not block:
+                break
+            start = block.find(b'\n')
+            while start >= 0:
+                self.offsets.append(position + start + 1)
+                start = block.find(b'\n', start + 1)
+            position += len(block)
+        self.size = position
+
+
+    def line_count(self):
+        """
+        Number of complete lines in the file, a partially written last line is only counted once its newline is written.
+
+        Returns:
+            int: Number of lines
+        """
+        # The last offset is where the next line starts, or the start of the line still being written
+        return len(self.offsets) - 1
+
+
+    def read_line(self, file, line_number):
+        """
+        Reads a single line by seeking to its offset.
+
+        Args:
+            file (): File opened in binary mode
+            line_number (int): Line to read, starting at 0
+
+        Returns:
+            bytes: Line including its newline
+        """
+        start = self.offsets[line_number]
+        if line_number + 1 < len(self.offsets):
+            end = self.offsets[line_number + 1]
+        else:
+            end = self.size
+        file.seek(start)
+        return file.read(end - start)
+
+
+    def read_lines(self, file, first_line, max_bytes, end_line=None):
+        """
+        Reads consecutive whole lines starting at first_line with a single read. At least one line is returned even if
+        it is longer than max_bytes.
+
+        Args:
+            file (): File opened in binary mode
+            first_line (int): First line to read
+            max_bytes (int): Maximum number of bytes to return
+            end_line (int): Line to stop before, the end of the file if None
+
+        Returns:
+            bytes: The lines including their newlines
+            int: Number of lines read
+        """
+        line_count = self.line_count()
+        if end_line is not None:
+            line_count = min(line_count, end_line)
+        if first_line >= line_count:
+            return b'', 0
+
+        start = self.offsets[first_line]
+        # Index of the last line start (or end of file) still within max_bytes
+        last = bisect.bisect_right(self.offsets, start + max_bytes, first_line) - 1
+        count = min(max(last - first_line, 1), line_count - first_line)
+
+        if first_line + count < len(self.offsets):
+            end = self.offsets[first_line + count]
+        else:
+            end = self.size
+        file.seek(start)
+        return file.read(end - start), count
+
+
+_line_indexes = OrderedDict()
+
+
+def get_line_index(path, file):
+    """
+    Gets the up to date line index for an open file. Indexes are cached by path and reused as long as the inode
+    stays the same.
+
+    Args:
+        path (str): Path of the file
+        file (): The file opened in binary mode
+
+    Returns:
+        LineIndex: Index covering the whole file
+    """
+    inode = os.fstat(file.fileno()).st_ino
+    index = _line_indexes.get(path)
+    if index is None or index.inode != inode:
+        index = LineIndex(path, inode)
+        _line_indexes[path] = index
+    _line_indexes.move_to_end(path)
+    while len(_line_indexes) > MAX_CACHED_INDEXES:
+        _line_indexes.popitem(last=False)
+
+    index.update(file)
+    return index
+
+
+class LineReader:
+    """
+    Keeps one file open for the length of a line by line read and serves lines through its LineIndex.
+
+    Attributes:
+        path (str): Path of the open file
+        file (): Open file, None if no file is open
+
+    Methods:
+        open(path): Opens path unless it is already open
+        line_count(): Number of lines in the open file
+        read_line(line_number): Reads a single line from the open file
+        read_batch(first_line, payload_size, end_line): Packs as many lines as fit in payload_size behind a BATCH_HEADER
+        time_range_offsets(start, end): Gets the byte range of the rows recorded between two times
+        read_line_at(offset, end_offset): Reads the line starting at a byte offset
+        read_range_batch(offset, end_offset, payload_size, first_line): Packs the lines starting at a byte offset
+        close(): Closes the open file
+    """
+    def __init__(self):
+        """
+        Initialize the class
+        """
+        self.path = None
+        self.file = None
+        self.index = None
+
+
+    def open(self, path):
+        """
+        Opens path, the current handle is reused if it still refers to the file at path.
+
+        Args:
+            path (str): Path of the file to read
+        """
+        if self.file is not None and self.path == path:
+            if os.stat(path).st_ino == os.fstat(self.file.fileno()).st_ino:
+                return
+        self.close()
+        self.file = open(path, 'rb')
+        self.path = path
+
+
+    def line_count(self):
+        """
+        Number of complete lines in the open file, indexing any bytes appended since the last call.
+
+        Returns:
+            int: Number of lines
+        """
+        self.index = get_line_index(self.path, self.file)
+        return self.index.line_count()
+
+
+    def read_line(self, line_number):
+        """
+        Reads a single line from the open file.
+
+        Args:
+            line_number (int): Line to read, starting at 0
+
+        Returns:
+            bytes: Line including its newline
+        """
+        if self.index is None:
+            self.line_count()
+        return self.index.read_line(self.file, line_number)
+
+
+    def read_batch(self, first_line, payload_size, end_line=None):
+        """
+        Packs as many whole lines as fit in payload_size, starting at first_line, behind a BATCH_HEADER.
+
+        Args:
+            first_line (int): First line to read
+            payload_size (int): Maximum size of the returned batch including the header
+            end_line (int): Line to stop before, the end of the file if None
+
+        Returns:
+            bytes: Header followed by the lines
+            int: Number of lines in the batch
+            bool: True if the batch reaches end_line or the end of the file
+        """
+        line_count = self.line_count()
+        if end_line is not None:
+            line_count = min(line_count, end_line)
+        data, count = self.index.read_lines(self.file, first_line, payload_size - BATCH_HEADER.size, line_count)
+        eof = first_line + count >= line_count
+        return BATCH_HEADER.pack(count, first_line, BATCH_EOF if eof else 0) + data, count, eof
+
+
+    def time_range_offsets(self, start, end):
+        """
+        Gets the byte range of the rows of a sensor file recorded between start and end. The rows are found by
+        bisecting the file on their time column, the file is not indexed, so only the rows in the range are read
+        afterwards.
+
+        Args:
+            start (int): Start of the range in seconds since midnight, inclusive
+            end (int): End of the range in seconds since midnight, exclusive
+
+        Returns:
+            int: Offset of the first row in the range
+            int: Offset just past the last row in the range
+        """
+        return find_time_range(self.file, start, end)
+
+
+    def read_line_at(self, offset, end_offset):
+        """
+        Reads the line starting at offset without going through the LineIndex.
+
+        Args:
+            offset (int): Offset of the line
+            end_offset (int): Offset the line is cut at
+
+        Returns:
+            bytes: Line including its newline, empty if offset is not before end_offset
+        """
+        if offset >= end_offset:
+            return b''
+        self.file.seek(offset)
+        return self.file.readline(end_offset - offset)
+
+
+    def read_range_batch(self, offset, end_offset, payload_size, first_line):
+        """
+        Packs as many whole lines as fit in payload_size, starting at offset and stopping at end_offset, behind a
+        BATCH_HEADER. At least one line is packed even if it is longer than payload_size.
+
+        Args:
+            offset (int): Offset of the first line to read
+            end_offset (int): Offset to stop before
+            payload_size (int): Maximum size of the returned batch including the header
+            first_line (int): Line number written to the header
+
+        Returns:
+            bytes: Header followed by the lines
+            int: Number of lines in the batch
+            bool: True if the batch reaches end_offset or the end of the file
+        """
+        self.file.seek(offset)
+        data = self.file.read(max(min(payload_size - BATCH_HEADER.size, end_offset - offset), 0))
+        if data and offset + len(data) < end_offset:
+            # Cut after the last whole line, or finish the line if a single line does not fit
+            cut = data.rfind(b'\n') + 1
+            if cut:
+                data = data[:cut]
+            else:
+                data += self.file.readline(end_offset - offset - len(data))
+        count = data.count(b'\n')
+        if data and not data.endswith(b'\n'):
+            count += 1
+        eof = not data or offset + len(data) >= end_offset
+        return BATCH_HEADER.pack(count, first_line, BATCH_EOF if eof else 0) + data, count, eof
+
+
+    def close(self):
+        """
+        Closes the open file.
+        """
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.path = None
+        self.index = None
+
+
+class LineTransfer:
+    """
+    State of one read through a file line by line, shared by the line by line characteristics. Depending on the
+    options written by the application a read returns one line, or a batch of as many lines as fit in one read, either
+    as CSV text or in the compact format of sensor_codec.py. 'EOF' is returned once the end of the file (or of the
+    selected time range) has been reached, the next read then starts over. A time range is read straight from the byte
+    range found by bisection, line numbers then count from the first row of the range.
+
+    Attributes:
+        reader (LineReader): Reader for the file being transferred
+        next_line (int): Number of the next line to return
+        next_offset (int): Offset of the next line to return while reading a time range
+        end_offset (int): Offset just past the time range, None to read the whole file
+        time_range (tuple): (start, end) in seconds since midnight selected by the application, None for the whole file
+        batch_mode (bool): True to return batches instead of single lines
+        compact (bool): True to return rows in the compact format
+        encoder (SensorRowEncoder): Encoder of the current pass in compact format
+
+    Methods:
+        configure(request): Applies options written by the application
+        read(path, payload_size): Returns the data for the next read
+        reset(): Starts over at the beginning of the file
+        close(): Closes the file being read
+    """
+    def __init__(self):
+        """
+        Initialize the class
+        """
+        self.reader = LineReader()
+        self.next_line = 0
+        self.next_offset = 0
+        self.end_offset = None
+        self.time_range = None
+        self.batch_mode = False
+        self.compact = False
+        self.encoder = None
+
+
+    def configure(self, request):
+        """
+        Applies options written by the application and starts over at the beginning of the file.
+
+        Args:
+            request (dict): Parsed options, 'mode' is 'line' or 'batch', 'format' is 'csv' or 'compact', and
+                'start'/'end' are 'HH-MM-SS' times limiting the next pass to the rows recorded in that range
+        """
+        mode = request.get('mode')
+        if mode in ('line', 'batch'):
+            self.batch_mode = mode == 'batch'
+        data_format = request.get('format')
+        if data_format in ('csv', 'compact'):
+            self.compact = data_format == 'compact'
+        self.reset()
+
+        if 'start' in request or 'end' in request:
+            self.time_range = (parse_time(request.get('start', '00-00-00').encode()),
+                               parse_time(request.get('end', '23-59-59').encode()) + 1)
+
+
+    def read(self, path, payload_size):
+        """
+        Returns the data for the next read.
+
+        Args:
+            path (str): File being transferred
+            payload_size (int): Maximum size of a batch
+
+        Returns:
+            bytes: A line, a batch, a schema header (first read of a pass in compact line mode), or 'EOF'
+        """
+        self.reader.open(path)
+        if self.time_range is not None and self.end_offset is None:
+            # First read of a time range, jump straight to its first row
+            self.next_offset, self.end_offset = self.reader.time_range_offsets(*self.time_range)
+        if self.end_offset is None:
+            # Index any lines appended since the last read
+            self.reader.line_count()
+
+        if self.batch_mode:
+            if self.compact:
+                batch, eof = self.read_compact_batch(payload_size)
+            elif self.end_offset is not None:
+                batch, count, eof = self.reader.read_range_batch(self.next_offset, self.end_offset, payload_size,
+                                                                 self.next_line)
+                self.next_offset += len(batch) - BATCH_HEADER.size
+                self.next_line += count
+            else:
+                batch, count, eof = self.reader.read_batch(self.next_line, payload_size)
+                self.next_line += count
+            if eof:
+                self.reset()
+            return batch
+
+        if self.compact:
+            if self.encoder is None:
+                self.encoder = self.create_encoder()
+                return self.encoder.header()
+            # Skip rows which can not be encoded, e.g. a header row
+            line = self.peek_line()
+            while line is not None:
+                self.consume(line)
+                row = self.encoder.encode_row(line)
+                if row:
+                    return row
+                line = self.peek_line()
+
+        line = self.peek_line()
+        if line is None:
+            self.reset()
+            return b'EOF'
+        self.consume(line)
+        return line
+
+
+    def peek_line(self):
+        """
+        Reads the next line of the pass without moving past it.
+
+        Returns:
+            bytes: The line, None at the end of the file or time range
+        """
+        if self.end_offset is not None:
+            return self.reader.read_line_at(self.next_offset, self.end_offset) or None
+        if self.next_line >= self.reader.index.line_count():
+            return None
+        return self.reader.read_line(self.next_line)
+
+
+    def consume(self, line):
+        """
+        Moves past a line returned by peek_line().
+        """
+        self.next_line += 1
+        if self.end_offset is not None:
+            self.next_offset += len(line)
+
+
+    def create_encoder(self):
+        """
+        Creates the encoder for a pass in compact format, the number of columns is taken from the first row with a
+        valid time, as in encode_sensor_file(). The position of the pass is left unchanged.
+        """
+        next_line, next_offset = self.next_line, self.next_offset
+        try:
+            line = self.peek_line()
+            while line is not None:
+                try:
+                    parse_time(line.split(b',', 1)[0])
+                    return SensorRowEncoder(count_columns(line))
+                except ValueError:
+                    # Header or damaged row
+                    self.consume(line)
+                    line = self.peek_line()
+            return SensorRowEncoder(0)
+        finally:
+            self.next_line, self.next_offset = next_line, next_offset
+
+
+    def read_compact_batch(self, payload_size):
+        """
+        Packs as many encoded rows as fit in payload_size behind a BATCH_HEADER. The first batch of a pass also holds
+        the schema header and has the BATCH_SCHEMA flag set.
+
+        Returns:
+            bytes: The batch
+            bool: True if the batch reaches the end of the pass
+        """
+        first_line = self.next_line
+        flags = 0
+        data = b''
+        if self.encoder is None:
+            self.encoder = self.create_encoder()
+            data = self.encoder.header()
+            flags |= BATCH_SCHEMA
+
+        limit = payload_size - BATCH_HEADER.size
+        line = self.peek_line()
+        while line is not None:
+            previous_time = self.encoder.previous_time
+            row = self.encoder.encode_row(line)
+            if self.next_line > first_line and len(data) + len(row) > limit:
+                # Does not fit, encode it again in the next batch
+                self.encoder.previous_time = previous_time
+                break
+            data += row
+            self.consume(line)
+            line = self.peek_line()
+
+        eof = line is None
+        if eof:
+            flags |= BATCH_EOF
+        return BATCH_HEADER.pack(self.next_line - first_line, first_line, flags) + data, eof
+
+
+    def reset(self):
+        """
+        Starts over at the beginning of the file, the batch and format settings are kept.
+        """
+        self.next_line = 0
+        self.next_offset = 0
+        self.end_offset = None
+        self.time_range = None
+        self.encoder = None
+        self.reader.close()
+
+
+    def close(self):
+        """
+        Closes the file being read, called when a transfer session expires.
+        """
+        self.reset()
@@ -0,0 +1,126 @@
+import numpy as np
+from bt_hive_app.csv_range import parse_time, format_time
+
+
+def parse_rows(lines):
+    """
+    Parses sensor file rows into NumPy arrays. Rows that have no valid time or a different number of columns than the
+    first valid row (e.g. a partially written last line) are skipped.
+
+    Args:
+        lines (iterable): Rows of the sensor file as bytes
+
+    Returns:
+        ndarray: Time of each row in seconds since midnight
+        ndarray: Values of each row, one column per sensor value, 'nan' readings are NaN
+    """
+    times = []
+    fields = []
+    column_count = None
+    for line in lines:
+        row = line.rstrip(b'\r\n').split(b',')
+        if len(row) < 2:
+            continue
+        if column_count is None:
+            column_count = len(row)
+        elif len(row) != column_count:
+            continue
+        try:
+            time = parse_time(row[0])
+        except ValueError:
+            continue
+        times.append(time)
+        fields.append(row[1:])
+
+    if not fields:
+        return np.empty(0), np.empty((0, 0))
+
+    values = np.array(fields)
+    try:
+        values = values.astype(np.float64)
+    except ValueError:
+        # A non numeric value somewhere, convert cell by cell so only that cell becomes NaN
+        values = np.array([[_to_float(cell) for cell in row] for row in fields])
+    return np.array(times, dtype=np.float64), values
+
+
+def _to_float(cell):
+    try:
+        return float(cell)
+    except ValueError:
+        return np.nan
+
+
+def aggregate(times, values, start, end, bucket_width):
+    """
+    Computes min, max, mean, and count of every value column per time bucket. NaN readings are left out.
+
+    Args:
+        times (ndarray): Time of each row in seconds since midnight
+        values (ndarray): Values of each row
+        start (int): Start of the first bucket in seconds since midnight
+        end (int): End of the range in seconds since midnight, exclusive
+        bucket_width (int): Width of a bucket in seconds
+
+    Returns:
+        ndarray: Start time of every bucket
+        ndarray: Count per bucket and column
+        ndarray: Minimum per bucket and column, NaN for empty buckets
+        ndarray: Maximum per bucket and column, NaN for empty buckets
+        ndarray: Mean per bucket and column, NaN for empty buckets
+    """
+    bucket_count = max(int(np.ceil((end - start) / bucket_width)), 0)
+    column_count = values.shape[1] if values.ndim == 2 else 0
+    bucket_starts = start + np.arange(bucket_count) * bucket_width
+
+    in_range = (times >= start) & (times < end)
+    buckets = ((times[in_range] - start) // bucket_width).astype(np.intp)
+    values = values[in_range]
+
+    counts = np.zeros((bucket_count, column_count), dtype=np.int64)
+    minimums = np.full((bucket_count, column_count), np.inf)
+    maximums = np.full((bucket_count, column_count), -np.inf)
+    sums = np.zeros((bucket_count, column_count))
+
+    for column in range(column_count):
+        column_values = values[:, column]
+        valid = ~np.isnan(column_values)
+        column_buckets = buckets[valid]
+        column_values = column_values[valid]
+
+        counts[:, column] = np.bincount(column_buckets, minlength=bucket_count)
+        sums[:, column] = np.bincount(column_buckets, weights=column_values, minlength=bucket_count)
+        np.minimum.at(minimums[:, column], column_buckets, column_values)
+        np.maximum.at(maximums[:, column], column_buckets, column_values)
+
+    empty = counts == 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    minimums[empty] = np.nan
+    maximums[empty] = np.nan
+    means[empty] = np.nan
+
+    return bucket_starts, counts, minimums, maximums, means
+
+
+def format_buckets(bucket_starts, counts, minimums, maximums, means):
+    """
+    Formats the result of aggregate() as one '"HH-MM-SS",count,min,max,mean,...' line per non empty bucket, with
+    count, min, max, and mean repeated for every value column.
+
+    Returns:
+        list: Encoded lines
+    """
+    lines = []
+    for bucket in range(len(bucket_starts)):
+        if not counts[bucket].any():
+            continue
+        fields = [f'"{format_time(bucket_starts[bucket])}"']
+        for column in range(counts.shape[1]):
+            if counts[bucket, column] == 0:
+                fields.append('0,nan,nan,nan')
+            else:
+                fields.append(f"{counts[bucket, column]},{minimums[bucket, column]:.2f},"
+                              f"{maximums[bucket, column]:.2f},{means[bucket, column]:.2f}")
+        lines.append((','.join(fields) + '\n').encode())
+    return lines
@@ -0,0 +1,158 @@
+import math
+from bt_hive_app.csv_range import parse_time
+
+
+# Compact format: a schema header followed by one record per row
+#   header: b'HS', version (uint8), column count (uint8), decimals of each column (uint8 each)
+#   row:    time delta in seconds from the previous row (zigzag varint),
+#           nan mask with bit i set if column i is nan (varint),
+#           value * 10^decimals of every column that is not nan (zigzag varint)
+MAGIC = b'HS'
+VERSION = 1
+DEFAULT_DECIMALS = 2
+
+
+def encode_varint(value):
+    """
+    Encodes an unsigned integer as a LEB128 varint.
+
+    Args:
+        value (int): Value to encode, must not be negative
+
+    Returns:
+        bytes: Encoded value, one byte for values below 128
+    """
+    data = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            data.append(byte | 0x80)
+        else:
+            data.append(byte)
+            return bytes(data)
+
+
+def zigzag(value):
+    """
+    Maps a signed integer to an unsigned one so small negative values also encode to short varints.
+
+    Args:
+        value (int): Signed value
+
+    Returns:
+        int: 0, -1, 1, -2, ... map to 0, 1, 2, 3, ...
+    """
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def count_columns(line):
+    """
+    Number of value columns in a sensor file row, the time column is not counted.
+
+    Args:
+        line (bytes): Row of the sensor file
+
+    Returns:
+        int: Number of value columns
+    """
+    return len(line.rstrip(b'\r\n').split(b',')) - 1
+
+
+class SensorRowEncoder:
+    """
+    Encodes sensor file rows into the compact format. Times are encoded relative to the previous row so the encoder
+    keeps that state between rows.
+
+    Attributes:
+        column_count (int): Number of value columns
+        decimals (list): Number of decimals kept for each column
+        previous_time (int): Time of the previous encoded row in seconds since midnight
+
+    Methods:
+        header(): Gets the schema header
+        encode_row(line): Encodes one row
+    """
+    def __init__(self, column_count, decimals=DEFAULT_DECIMALS):
+        """
+        Initialize the class
+
+        Args:
+            column_count (int): Number of value columns
+            decimals (int): Number of decimals kept for every column
+        """
+        self.column_count = min(column_count, 255)
+        self.decimals = [decimals] * self.column_count
+        self.scales = [10 ** d for d in self.decimals]
+        self.previous_time = 0
+
+
+    def header(self):
+        """
+        Gets the schema header which has to precede the encoded rows.
+
+        Returns:
+            bytes: Schema header
+        """
+        return MAGIC + bytes([VERSION, self.column_count]) + bytes(self.decimals)
+
+
+    def encode_row(self, line):
+        """
+        Encodes one row. Missing columns are encoded as nan and extra columns are dropped.
+
+        Args:
+            line (bytes): Row of the sensor file
+
+        Returns:
+            bytes: Encoded row, empty if the row has no valid time (e.g. a header row)
+        """
+        fields = line.rstrip(b'\r\n').split(b',')
+        try:
+            time = parse_time(fields[0])
+        except ValueError:
+            return b''
+
+        nan_mask = 0
+        encoded_values = b''
+        for column in range(self.column_count):
+            value = math.nan
+            if column + 1 < len(fields):
+                try:
+                    value = float(fields[column + 1])
+                except ValueError:
+                    pass
+            if math.isnan(value) or math.isinf(value):
+                nan_mask |= 1 << column
+            else:
+                encoded_values += encode_varint(zigzag(round(value * self.scales[column])))
+
+        data = encode_varint(zigzag(time - self.previous_time)) + encode_varint(nan_mask) + encoded_values
+        self.previous_time = time
+        return data
+
+
+def encode_sensor_file(file):
+    """
+    Encodes a whole sensor file, the number of columns is taken from the first row with a valid time.
+
+    Args:
+        file (): Sensor file opened in binary mode
+
+    Returns:
+        bytes: Schema header followed by the encoded rows
+    """
+    encoder = None
+    rows = []
+    for line in file:
+        if encoder is None:
+            try:
+                parse_time(line.split(b',', 1)[0])
+            except ValueError:
+                continue
+            encoder = SensorRowEncoder(count_columns(line))
+        rows.append(encoder.encode_row(line))
+
+    if encoder is None:
+        encoder = SensorRowEncoder(0)
+    return encoder.header() + b''.join(rows)
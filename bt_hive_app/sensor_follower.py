@@ -0,0 +1,212 @@
+import os
+from datetime import datetime
+try:
+    from gi.repository import GObject
+except ImportError:
+    import gobject as GObject
+import bt_hive_app.helper_methods as help
+from bt_hive_app.tail_reader import read_lines_reversed, is_valid_line
+
+
+FOLLOW_INTERVAL = 5000
+
+
+def get_update_text(file_path, last_line):
+    """
+    Function which determines the update text based on if the last line contained nan or not.
+
+    Args:
+        file_path (str): Path of the sensor file, the date is taken from its directory
+        last_line (str): last line of the file, contains an actual value or is 'nan'.
+
+    Returns:
+        str: If last line is a value other than nan, string containing date and time of the recording. Otherwise, string containing date and time when nan values started being recorded.
+    """
+    unformatted_time = (last_line.split(',')[0]).replace('"','')
+    time_obj = datetime.strptime(unformatted_time, '%H-%M-%S')
+    formatted_time = time_obj.strftime('%I-%M-%S %p')
+    date = os.path.basename(os.path.dirname(file_path))
+
+    if 'nan' not in last_line:
+        # Text returned will just contain the update date and time
+        return f"Updated on {date} at {formatted_time}"
+    else:
+        # Text will contain when nan values started being recorded
+        return f"Returning nan values since {formatted_time} on {date}"
+
+
+class SensorFollower:
+    """
+    Follows the current day's file of one sensor directory. Only rows appended since the last poll are parsed, the
+    latest valid reading and the first row of the current run of nan readings are kept in memory along with the
+    'value|update_text' payload returned by SF_Read_Characteristic.
+
+    Attributes:
+        base_path (str): Sensor directory, e.g. '/home/bee/appmais/bee_tmp/temp/'
+        file_path (str): File currently being followed
+        position (int): Offset up to which the file has been read
+        partial (bytes): Last line read so far if it has not been completely written yet
+        last_valid (str): Latest row without nan values, None if there is none
+        nan_start (str): First row of the current run of nan rows, None if the latest row is valid
+
+    Methods:
+        start(): Polls the sensor file every FOLLOW_INTERVAL ms on the GLib main loop
+        poll(): Reads rows appended since the last poll
+        get_payload(): Gets the preformatted payload
+    """
+    def __init__(self, base_path):
+        """
+        Initialize the class
+
+        Args:
+            base_path (str): Sensor directory to follow
+        """
+        self.base_path = base_path
+        self.file_path = None
+        self.inode = None
+        self.position = 0
+        self.partial = b''
+        self.last_valid = None
+        self.nan_start = None
+        self.payload = None
+        self.running = False
+
+
+    def start(self):
+        """
+        Polls the sensor file every FOLLOW_INTERVAL ms on the GLib main loop.
+        """
+        if self.running:
+            return
+        self.running = True
+        self.poll()
+        GObject.timeout_add(FOLLOW_INTERVAL, self.poll_callback)
+
+
+    def poll_callback(self):
+        self.poll()
+        return self.running
+
+
+    def poll(self):
+        """
+        Reads rows appended since the last poll, switching to a new file when a new date directory is created.
+        """
+        try:
+            file_path = help.get_most_recent_sensor_file(self.base_path)
+            if file_path is None:
+                self.file_path = None
+                self.payload = None
+                return
+
+            with open(file_path, 'rb') as file:
+                stat = os.fstat(file.fileno())
+                if file_path != self.file_path or stat.st_ino != self.inode or stat.st_size < self.position:
+                    self.prime(file_path, file, stat)
+                elif stat.st_size > self.position:
+                    file.seek(self.position)
+                    data = self.partial + file.read(stat.st_size - self.position)
+                    self.position = stat.st_size
+
+                    lines = data.split(b'\n')
+                    self.partial = lines.pop()
+                    for line in lines:
+                        self.add_line(line)
+                else:
+                    return
+
+            self.update_payload()
+        except Exception as e:
+            print(f"Error following {self.base_path}: {e}")
+
+
+    def prime(self, file_path, file, stat):
+        """
+        Starts following a new file. The existing rows are scanned backwards from the end until the latest valid one,
+        rows appended after that are then read by poll().
+        """
+        self.file_path = file_path
+        self.inode = stat.st_ino
+        self.last_valid = None
+        self.nan_start = None
+        self.partial = b''
+        self.position = 0
+
+        last_line_start = None
+        for offset, line in read_lines_reversed(file, 0, stat.st_size):
+            if last_line_start is None:
+                # The last line is either empty or still being written, it is kept in self.partial
+                last_line_start = offset
+                self.position = offset
+                continue
+            if is_valid_line(line):
+                self.last_valid = line.decode()
+                break
+            if line.strip() != b'':
+                self.nan_start = line.decode()
+
+        if last_line_start is not None and last_line_start < stat.st_size:
+            file.seek(last_line_start)
+            self.partial = file.read(stat.st_size - last_line_start)
+            self.position = stat.st_size
+
+
+    def add_line(self, line):
+        """
+        Updates the latest reading with one complete row.
+
+        Args:
+            line (bytes): Row without its newline
+        """
+        if is_valid_line(line):
+            self.last_valid = line.decode()
+            self.nan_start = None
+        elif line.strip() != b'' and self.nan_start is None:
+            self.nan_start = line.decode()
+
+
+    def update_payload(self):
+        """
+        Formats the 'value|update_text' payload. The latest valid row is returned if there is one, otherwise the first
+        nan row of the file along with when the nan readings started.
+        """
+        last_line = self.last_valid if self.last_valid is not None else self.nan_start
+        if last_line is None:
+            self.payload = None
+            return
+        update_text = get_update_text(self.file_path, last_line)
+        self.payload = f"{last_line.strip()}|{update_text}".encode()
+
+
+    def get_payload(self):
+        """
+        Gets the preformatted payload, polling once if nothing has been read yet.
+
+        Returns:
+            bytes: 'value|update_text' payload, None if there is no reading.
+        """
+        if self.payload is None:
+            self.poll()
+        return self.payload
+
+
+_sensor_followers = {}
+
+
+def get_sensor_follower(base_path):
+    """
+    Gets the follower for a sensor directory, creating and starting it on first use.
+
+    Args:
+        base_path (str): Sensor directory
+
+    Returns:
+        SensorFollower: Follower shared by every characteristic reading base_path
+    """
+    key = os.path.normpath(base_path)
+    follower = _sensor_followers.get(key)
+    if follower is None:
+        follower = SensorFollower(base_path)
+        _sensor_followers[key] = follower
+        follower.start()
+    return follower
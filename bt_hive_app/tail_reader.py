@@ -0,0 +1,48 @@
+BLOCK_SIZE = 4096
+
+
+def read_lines_reversed(file, start, end, block_size=BLOCK_SIZE):
+    """
+    Yields the lines between byte offsets start and end from last to first, reading backwards in fixed size blocks.
+
+    Args:
+        file (): File opened in binary mode
+        start (int): Offset where a line starts, lines before it are not read
+        end (int): Offset to read up to, usually the size of the file
+        block_size (int): Number of bytes read at a time
+
+    Yields:
+        tuple: (offset of the line, line without its newline)
+    """
+    position = end
+    remainder = b''
+    while position > start:
+        read_start = max(start, position - block_size)
+        file.seek(read_start)
+        chunk = file.read(position - read_start) + remainder
+        position = read_start
+
+        lines = chunk.split(b'\n')
+        # The first piece may continue in the previous block, keep it until that block has been read
+        remainder = lines[0]
+        line_end = read_start + len(chunk)
+        for line in reversed(lines[1:]):
+            line_start = line_end - len(line)
+            yield line_start, line
+            line_end = line_start - 1
+
+    if start < end:
+        yield start, remainder
+
+
+def is_valid_line(line):
+    """
+    Checks if a sensor file line holds a reading.
+
+    Args:
+        line (bytes): Line without its newline
+
+    Returns:
+        bool: True if the line is not blank and contains no 'nan' values
+    """
+    return line.strip() != b'' and b'nan' not in line
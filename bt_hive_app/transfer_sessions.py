@@ -0,0 +1,159 @@
+import os, time
+
+
+# Seconds without a read or write after which a device's session is closed
+SESSION_TIMEOUT = 300
+
+
+def session_key(options):
+    """
+    Gets the key of the session a read or write belongs to.
+
+    Args:
+        options (): Options passed to ReadValue or WriteValue, BlueZ sets 'device' to the object path of the device
+
+    Returns:
+        str: Object path of the device, None if BlueZ did not pass one (all such calls share a session)
+    """
+    device = options.get('device') if options else None
+    return str(device) if device is not None else None
+
+
+class FileSession:
+    """
+    Cursor of one device through a file. The file is kept open between chunks and its size is cached when opened.
+
+    Attributes:
+        path (str): Path of the open file
+        file (): Open file, None if no file is open
+        size (int): Size of the file when it was opened
+        offset (int): Offset of the next chunk
+
+    Methods:
+        open(path): Opens path unless it is already open
+        reset(): Starts over at the beginning of the file
+        close(): Closes the open file
+    """
+    def __init__(self):
+        """
+        Initialize the class
+        """
+        self.path = None
+        self.file = None
+        self.size = 0
+        self.offset = 0
+
+
+    def open(self, path):
+        """
+        Opens path at the start of a transfer, the current handle is reused if it still refers to the file at path.
+        The cached size is refreshed so files which are still being written are sent up to their current end.
+
+        Args:
+            path (str): Path of the file to transfer
+
+        Returns:
+            (): The open file
+        """
+        if self.file is None or self.path != path or os.stat(path).st_ino != os.fstat(self.file.fileno()).st_ino:
+            self.close()
+            self.file = open(path, 'rb')
+            self.path = path
+        self.size = os.fstat(self.file.fileno()).st_size
+        return self.file
+
+
+    def reset(self):
+        """
+        Starts over at the beginning of the file, the file stays open.
+        """
+        self.offset = 0
+
+
+    def close(self):
+        """
+        Closes the open file.
+        """
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.path = None
+        self.size = 0
+        self.offset = 0
+
+
+class SessionTable:
+    """
+    Per device state of a characteristic, so several connected devices can read through files at the same time.
+    Sessions idle for longer than the timeout are closed, which also cleans up after dropped connections.
+
+    Attributes:
+        factory (callable): Creates the state of a new session, it has to provide reset() and close()
+        timeout (int): Seconds of inactivity after which a session is closed
+        sessions (dict): Session key -> [state, time of last use]
+
+    Methods:
+        get(options): Gets the session of the device a call came from
+        reset(options): Resets the session of one device, or of all devices
+        expire(): Closes idle sessions
+    """
+    def __init__(self, factory, timeout=SESSION_TIMEOUT):
+        """
+        Initialize the class
+
+        Args:
+            factory (callable): Creates the state of a new session
+            timeout (int): Seconds of inactivity after which a session is closed
+        """
+        self.factory = factory
+        self.timeout = timeout
+        self.sessions = {}
+
+
+    def get(self, options):
+        """
+        Gets the session of the device a call came from, creating it on the first call.
+
+        Args:
+            options (): Options passed to ReadValue or WriteValue
+
+        Returns:
+            (): State created by factory
+        """
+        self.expire()
+        key = session_key(options)
+        entry = self.sessions.get(key)
+        if entry is None:
+            entry = [self.factory(), 0]
+            self.sessions[key] = entry
+            if key is not None:
+                print(f"Transfer session opened for {key}")
+        entry[1] = time.monotonic()
+        return entry[0]
+
+
+    def reset(self, options=None):
+        """
+        Resets the session of the device a call came from, or every session if options is None.
+
+        Args:
+            options (): Options passed to WriteValue
+        """
+        if options is None:
+            sessions = [entry[0] for entry in self.sessions.values()]
+        else:
+            sessions = [self.get(options)]
+        for session in sessions:
+            session.reset()
+
+
+    def expire(self):
+        """
+        Closes the sessions which were not used for longer than the timeout.
+        """
+        now = time.monotonic()
+        for key, (session, last_used) in list(self.sessions.items()):
+            if now - last_used > self.timeout:
+                session.close()
+                del self.sessions[key]
+                print(f"Transfer session for {key} expired")
@@ -0,0 +1,201 @@
+import os, cv2
+import numpy as np
+import bt_hive_app.helper_methods as help
+from bt_hive_app.frame_cache import VIDEO_FRAME_NUMBER
+from bt_hive_app.file_index import write_file_atomic
+from bt_hive_app.h264_index import get_keyframe_index, index_video
+from bt_hive_app.worker_pool import RecordingWorker
+
+
+# Previews are stored here, named after the video they were taken from
+PREVIEW_DIR = '/home/bee/GATT_server/previews/'
+# Previews generated for every finished video: the frame the video transfer sends by default, a small thumbnail of
+# it, a frame from the middle of the clip, and a contact sheet of frames spread over the clip
+FRAME = 'frame'
+THUMBNAIL = 'thumbnail'
+MIDDLE = 'middle'
+SHEET = 'sheet'
+PREVIEW_KINDS = (FRAME, THUMBNAIL, MIDDLE, SHEET)
+
+THUMBNAIL_WIDTH = 160
+THUMBNAIL_QUALITY = 70
+# The contact sheet is a SHEET_COLUMNS x SHEET_ROWS grid of SHEET_TILE_WIDTH pixel wide frames
+SHEET_COLUMNS = 3
+SHEET_ROWS = 3
+SHEET_TILE_WIDTH = 160
+SHEET_QUALITY = 80
+CONTACT_SHEET = True
+
+
+def preview_path(video_path, kind):
+    """
+    Path of a preview of a video.
+    """
+    return os.path.join(PREVIEW_DIR, f"{os.path.basename(video_path)}.{kind}.jpg")
+
+
+def get_preview_path(video_path, kind):
+    """
+    Gets a preview if it was generated for the current version of the video.
+
+    Args:
+        video_path (str): Path of the video
+        kind (str): One of PREVIEW_KINDS
+
+    Returns:
+        str: Path of the preview, None if it is not ready
+    """
+    path = preview_path(video_path, kind)
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(video_path):
+            return path
+    except OSError:
+        pass
+    return None
+
+
+def scale(frame, width):
+    height, frame_width = frame.shape[:2]
+    if width >= frame_width:
+        return frame
+    return cv2.resize(frame, (width, max(1, round(height * width / frame_width))), interpolation=cv2.INTER_AREA)
+
+
+def write_jpeg(path, frame, quality):
+    """
+    Encodes a frame as JPEG and writes it, replacing path atomically so a transfer never sees half a preview.
+    """
+    ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+    if not ret:
+        raise ValueError(f"Could not encode {path}")
+    write_file_atomic(path, buffer.tobytes())
+
+
+def generate_previews(video_path, contact_sheet=CONTACT_SHEET):
+    """
+    Generates the previews of a video. Runs in the worker process, the video is decoded once from the start up to the
+    last frame needed.
+
+    Args:
+        video_path (str): Path of the video
+        contact_sheet (bool): True to also generate the contact sheet
+
+    Returns:
+        list: Kinds of the previews written
+    """
+    index = get_keyframe_index(video_path) or index_video(video_path)
+    frame_count = index.frame_count
+    if frame_count == 0:
+        raise ValueError(f"No frames in {video_path}")
+
+    default_frame = min(VIDEO_FRAME_NUMBER, frame_count - 1)
+    middle_frame = frame_count // 2
+    sheet_frames = []
+    if contact_sheet:
+        tiles = SHEET_COLUMNS * SHEET_ROWS
+        sheet_frames = [min(int((i + 0.5) * frame_count / tiles), frame_count - 1) for i in range(tiles)]
+    wanted = {default_frame, middle_frame, *sheet_frames}
+
+    frames = {}
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file '{video_path}'")
+        for frame_number in range(max(wanted) + 1):
+            if not cap.grab():
+                break
+            if frame_number in wanted:
+                ret, frame = cap.retrieve()
+                if ret:
+                    # Only the tiles of the contact sheet are needed at their reduced size
+                    frames[frame_number] = frame if frame_number in (default_frame, middle_frame) else \
+                        scale(frame, SHEET_TILE_WIDTH)
+    finally:
+        cap.release()
+
+    os.makedirs(PREVIEW_DIR, exist_ok=True)
+    written = []
+    if default_frame in frames:
+        write_jpeg(preview_path(video_path, FRAME), frames[default_frame], help.DEFAULT_JPEG_QUALITY)
+        write_jpeg(preview_path(video_path, THUMBNAIL), scale(frames[default_frame], THUMBNAIL_WIDTH),
+                   THUMBNAIL_QUALITY)
+        written += [FRAME, THUMBNAIL]
+    if middle_frame in frames:
+        write_jpeg(preview_path(video_path, MIDDLE), frames[middle_frame], help.DEFAULT_JPEG_QUALITY)
+        written.append(MIDDLE)
+    if contact_sheet and frames:
+        tile = scale(next(iter(frames.values())), SHEET_TILE_WIDTH)
+        blank = np.zeros_like(tile)
+        tiles = [scale(frames[n], SHEET_TILE_WIDTH) if n in frames else blank for n in sheet_frames]
+        rows = [cv2.hconcat(tiles[row * SHEET_COLUMNS:(row + 1) * SHEET_COLUMNS]) for row in range(SHEET_ROWS)]
+        write_jpeg(preview_path(video_path, SHEET), cv2.vconcat(rows), SHEET_QUALITY)
+        written.append(SHEET)
+    return written
+
+
+class PreviewWorker(RecordingWorker):
+    """
+    Generates the previews of newly finished videos in the worker process, so the video transfer can send them without
+    decoding anything.
+
+    Attributes:
+        contact_sheet (bool): True to also generate contact sheets
+
+    Methods:
+        is_done(path): Checks if the previews of a video are ready
+        create_job(path): Gets the preview job of a video
+        job_done(path, result): Reports the previews written, a video missing some of them is not retried
+    """
+    def __init__(self, base_path, contact_sheet=CONTACT_SHEET):
+        """
+        Initialize the class
+
+        Args:
+            base_path (str): Video directory to watch
+            contact_sheet (bool): True to also generate contact sheets
+        """
+        RecordingWorker.__init__(self, base_path, '.h264')
+        self.contact_sheet = contact_sheet
+
+
+    def preview_kinds(self):
+        return PREVIEW_KINDS if self.contact_sheet else PREVIEW_KINDS[:-1]
+
+
+    def is_done(self, path):
+        return all(get_preview_path(path, kind) for kind in self.preview_kinds())
+
+
+    def create_job(self, path):
+        return generate_previews, (path, self.contact_sheet)
+
+
+    def job_done(self, path, result):
+        print(f"Previews of {path}: {', '.join(result)}")
+        missing = [kind for kind in self.preview_kinds() if kind not in result]
+        if missing:
+            # Frames could not be decoded (e.g. a truncated clip), decoding it again would give the same result
+            print(f"Could not generate {', '.join(missing)} preview of {path}")
+            self.failed.add(path)
+
+
+_preview_workers = {}
+
+
+def get_preview_worker(base_path):
+    """
+    Gets the preview worker for a video directory, creating and starting it on first use.
+
+    Args:
+        base_path (str): Video directory
+
+    Returns:
+        PreviewWorker: Worker shared by every characteristic reading base_path
+    """
+    key = os.path.normpath(base_path)
+    worker = _preview_workers.get(key)
+    if worker is None:
+        worker = PreviewWorker(base_path)
+        _preview_workers[key] = worker
+        worker.start()
+    return worker
@@ -0,0 +1,140 @@
+import os, struct
+import numpy as np
+from bt_hive_app.file_index import write_file_atomic, SIDECAR_DIR
+
+
+# Sidecar layout: header, then an int8 (min, max) pair per point
+#   header: magic, version, recording size, recording mtime (ns), frame rate, frames per point, sample width (bytes),
+#           peak level (raw sample units, the point values are scaled so the peak is 127), point count
+ENVELOPE_MAGIC = b'HENV'
+ENVELOPE_VERSION = 1
+ENVELOPE_HEADER = struct.Struct('<4sBQqIIBII')
+# Points per second of audio, a 10 minute recording is 2400 points (4.8 KB)
+POINTS_PER_SECOND = 4
+
+
+def envelope_path(audio_path):
+    """
+    Path of the envelope sidecar of a recording.
+    """
+    return os.path.join(SIDECAR_DIR, os.path.basename(audio_path) + '.env')
+
+
+def frames_per_point(frame_rate):
+    return max(frame_rate // POINTS_PER_SECOND, 1)
+
+
+class EnvelopeBuilder:
+    """
+    Computes the min/max envelope of a recording block by block, so the recording never has to be held in memory.
+    Samples at the end of a block which do not fill a whole point are carried over to the next block, so every point
+    but the last covers exactly frames_per_point frames whatever the block size.
+
+    Attributes:
+        frame_rate (int): Frame rate of the recording
+        channels (int): Number of interleaved channels
+        frames_per_point (int): Frames covered by one point
+        mins (list): Arrays of the minimum sample of every point, in raw sample units
+        maxs (list): Arrays of the maximum sample of every point, in raw sample units
+        pending (ndarray): Interleaved samples not yet covering a whole point
+
+    Methods:
+        add(samples): Adds the points of a block
+        finish(): Adds the last, partial point
+        save(path, stat, sample_width): Quantises the envelope and writes the sidecar
+    """
+    def __init__(self, frame_rate, channels):
+        """
+        Initialize the class
+
+        Args:
+            frame_rate (int): Frame rate of the recording
+            channels (int): Number of interleaved channels
+        """
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.frames_per_point = frames_per_point(frame_rate)
+        self.mins = []
+        self.maxs = []
+        self.pending = np.zeros(0, dtype=np.int32)
+
+
+    def add(self, samples):
+        """
+        Adds the points of a block, all channels of a point are combined.
+
+        Args:
+            samples (ndarray): Interleaved samples of the block
+        """
+        point_size = self.frames_per_point * self.channels
+        samples = np.concatenate((self.pending, samples))
+        whole = len(samples) // point_size * point_size
+        self.pending = samples[whole:]
+        if whole:
+            self.add_points(samples[:whole])
+
+
+    def add_points(self, samples):
+        starts = np.arange(0, len(samples), self.frames_per_point * self.channels)
+        self.mins.append(np.minimum.reduceat(samples, starts))
+        self.maxs.append(np.maximum.reduceat(samples, starts))
+
+
+    def finish(self):
+        """
+        Adds the samples left at the end of the recording as a last, shorter point.
+        """
+        if len(self.pending):
+            self.add_points(self.pending)
+            self.pending = np.zeros(0, dtype=np.int32)
+
+
+    def save(self, path, stat, sample_width):
+        """
+        Quantises the envelope to int8, scaled so the loudest sample of the recording is 127, and writes the sidecar,
+        replacing it atomically.
+
+        Args:
+            path (str): Path of the sidecar
+            stat (os.stat_result): Stat of the recording, stored to detect when the recording changes
+            sample_width (int): Bytes per sample of the recording
+
+        Returns:
+            int: Number of points
+        """
+        self.finish()
+        mins = np.concatenate(self.mins) if self.mins else np.zeros(0, dtype=np.int32)
+        maxs = np.concatenate(self.maxs) if self.maxs else np.zeros(0, dtype=np.int32)
+        peak = max(int(maxs.max()), -int(mins.min())) if len(mins) else 0
+        scale = 127 / peak if peak else 0
+        points = np.empty((len(mins), 2), dtype=np.int8)
+        points[:, 0] = np.round(mins * scale)
+        points[:, 1] = np.round(maxs * scale)
+
+        header = ENVELOPE_HEADER.pack(ENVELOPE_MAGIC, ENVELOPE_VERSION, stat.st_size, stat.st_mtime_ns,
+                                      self.frame_rate, self.frames_per_point, sample_width, peak, len(points))
+        write_file_atomic(path, header + points.tobytes())
+        return len(points)
+
+
+def get_envelope_path(audio_path):
+    """
+    Gets the envelope sidecar of a recording if it was computed for the current version of the recording.
+
+    Args:
+        audio_path (str): Path of the recording
+
+    Returns:
+        str: Path of the sidecar, None if it is missing or out of date
+    """
+    path = envelope_path(audio_path)
+    try:
+        stat = os.stat(audio_path)
+        with open(path, 'rb') as file:
+            header = ENVELOPE_HEADER.unpack(file.read(ENVELOPE_HEADER.size))
+    except (OSError, struct.error):
+        return None
+    magic, version, size, mtime = header[:4]
+    if magic != ENVELOPE_MAGIC or version != ENVELOPE_VERSION or size != stat.st_size or mtime != stat.st_mtime_ns:
+        return None
+    return path
@@ -0,0 +1,213 @@
+import abc, os, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+try:
+    from gi.repository import GObject
+except ImportError:
+    import gobject as GObject
+from gpiozero import CPUTemperature
+from bt_hive_app.file_index import finished_recordings, is_finished
+
+
+# Background jobs share one process so they never compete with each other for the Pi's cores
+MAX_WORKERS = 1
+# Niceness added to the worker process, the GATT server and the recorders keep priority over background jobs
+WORKER_NICENESS = 19
+# No new background jobs are started while the CPU is hotter than this (degrees Celsius)
+MAX_CPU_TEMPERATURE = 70.0
+# Time between two checks for new recordings in ms
+WORKER_INTERVAL = 30000
+# The worker is not forked from the GATT server, a fork would copy its D-Bus connection, GLib main loop, and the locks
+# of its threads (e.g. the keyframe indexer) into the worker
+WORKER_START_METHOD = 'forkserver'
+
+
+def lower_priority():
+    """
+    Runs in the worker process when it starts, lowers its scheduling priority.
+    """
+    os.nice(WORKER_NICENESS)
+
+
+def cpu_too_hot(max_temperature=MAX_CPU_TEMPERATURE):
+    """
+    Checks the CPU temperature the same way TempCharacteristic reads it.
+
+    Args:
+        max_temperature (float): Temperature in degrees Celsius above which background work is skipped
+
+    Returns:
+        bool: True if the CPU is hotter than max_temperature, False otherwise or if it could not be read
+    """
+    try:
+        temperature = CPUTemperature().temperature
+    except Exception as e:
+        print(f"Error reading CPU temperature: {e}")
+        return False
+    if temperature > max_temperature:
+        print(f"CPU at {temperature:.1f} C, background jobs paused")
+        return True
+    return False
+
+
+_worker_pool = None
+
+
+def get_worker_pool():
+    """
+    Gets the process pool running background jobs (previews, audio analysis), created on first use. Jobs are submitted
+    from the GLib main loop and their results collected on it once they finish, so the loop never waits on a job.
+
+    Returns:
+        ProcessPoolExecutor: The shared pool
+    """
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=lower_priority,
+                                           mp_context=multiprocessing.get_context(WORKER_START_METHOD))
+    return _worker_pool
+
+
+class RecordingWorker(abc.ABC):
+    """
+    Processes every finished recording of a directory once in the worker process, newest first. The directory is
+    checked on the GLib main loop, one job runs at a time and no new job is started while the CPU is hot. A job's
+    result is collected from an idle callback as soon as the job finishes, and the next job started right away.
+    Subclasses define the job and where its results go.
+
+    Attributes:
+        base_path (str): Recording directory, e.g. '/home/bee/appmais/bee_tmp/video/'
+        extension (str): File extension of the recordings
+        pending (tuple): (path, future) of the job in progress, None if the worker is idle
+        requested (list): Recordings a read asked for, processed before the others
+        failed (set): Recordings whose job failed, they are not retried
+
+    Methods:
+        start(): Checks for recordings every WORKER_INTERVAL ms on the GLib main loop
+        poll(): Collects the finished job and starts the next one
+        job_finished(future): Schedules poll() on the GLib main loop once a job finished
+        request(path): Processes a recording as soon as possible, e.g. the one a read is waiting for
+        is_done(path): Checks if a recording was processed, implemented by subclasses
+        create_job(path): Gets the function and arguments of a job, implemented by subclasses
+        job_done(path, result): Handles the result of a job, implemented by subclasses
+    """
+    def __init__(self, base_path, extension):
+        """
+        Initialize the class
+
+        Args:
+            base_path (str): Recording directory to watch
+            extension (str): File extension of the recordings
+        """
+        self.base_path = base_path
+        self.extension = extension
+        self.pending = None
+        self.requested = []
+        self.failed = set()
+        self.running = False
+
+
+    def start(self):
+        """
+        Checks for recordings every WORKER_INTERVAL ms on the GLib main loop.
+        """
+        if self.running:
+            return
+        self.running = True
+        self.poll()
+        GObject.timeout_add(WORKER_INTERVAL, self.poll_callback)
+
+
+    def poll_callback(self):
+        self.poll()
+        return self.running
+
+
+    def job_finished(self, future):
+        """
+        Called by the pool once a job finished, possibly from another thread. The result is collected on the GLib main
+        loop, GObject.idle_add can be called from any thread.
+
+        Args:
+            future (Future): Future of the finished job
+        """
+        GObject.idle_add(self.idle_callback)
+
+
+    def idle_callback(self):
+        self.poll()
+        return False
+
+
+    def request(self, path):
+        """
+        Processes a recording as soon as the job in progress is done. Recordings which are still being written are
+        ignored, like in finished_recordings(), they are processed once finished.
+
+        Args:
+            path (str): Path of the recording
+        """
+        if path in self.failed or path in self.requested or (self.pending is not None and self.pending[0] == path):
+            return
+        if not is_finished(path):
+            return
+        self.requested.append(path)
+        self.poll()
+
+
+    def poll(self):
+        """
+        Collects the result of the job in progress once it finished, then submits the next recording which was not
+        processed yet.
+        """
+        try:
+            if self.pending is not None:
+                path, future = self.pending
+                if not future.done():
+                    return
+                self.pending = None
+                try:
+                    self.job_done(path, future.result())
+                except Exception as e:
+                    print(f"Error processing {path}: {e}")
+                    self.failed.add(path)
+
+            if cpu_too_hot():
+                return
+            for path in self.requested + list(reversed(finished_recordings(self.base_path, self.extension))):
+                if path in self.failed or not os.path.exists(path) or self.is_done(path):
+                    continue
+                if path in self.requested:
+                    self.requested.remove(path)
+                function, args = self.create_job(path)
+                future = get_worker_pool().submit(function, *args)
+                self.pending = (path, future)
+                future.add_done_callback(self.job_finished)
+                return
+            self.requested = []
+        except Exception as e:
+            print(f"Error checking {self.base_path} for new recordings: {e}")
+
+
+    @abc.abstractmethod
+    def is_done(self, path):
+        """
+        Checks if a recording was processed.
+        """
+
+
+    @abc.abstractmethod
+    def create_job(self, path):
+        """
+        Gets the job processing a recording.
+
+        Returns:
+            callable: Function run in the worker process
+            tuple: Its arguments
+        """
+
+
+    @abc.abstractmethod
+    def job_done(self, path, result):
+        """
+        Handles the result of a job, called on the GLib main loop.
+        """
@@ -1,3 +1,4 @@
+import socket
 import dbus
 import dbus.mainloop.glib
 import dbus.exceptions
@@ -139,7 +140,14 @@ class Service(dbus.service.Object):
 class Characteristic(dbus.service.Object):
     """
     org.bluez.GattCharacteristic1 interface implementation
+
+    Subclasses can set acquire_notify and/or acquire_write to let BlueZ hand notifications and write without response
+    values over a socket (AcquireNotify/AcquireWrite) instead of a D-Bus call per value. Values are then sent with
+    send_notification() and received writes are passed to WriteValue() as usual.
     """
+    acquire_notify = False
+    acquire_write = False
+
     def __init__(self, uuid, flags, service):
         index = service.get_next_index()
         self.path = service.path + '/char' + str(index)
@@ -149,10 +157,14 @@ class Characteristic(dbus.service.Object):
         self.flags = flags
         self.descriptors = []
         self.next_index = 0
+        self.notify_socket = None
+        self.notify_mtu = None
+        self.write_socket = None
+        self.write_mtu = None
         dbus.service.Object.__init__(self, self.bus, self.path)
 
     def get_properties(self):
-        return {
+        properties = {
                 GATT_CHRC_IFACE: {
                         'Service': self.service.get_path(),
                         'UUID': self.uuid,
@@ -162,6 +174,12 @@ class Characteristic(dbus.service.Object):
                                 signature='o')
                 }
         }
+        # BlueZ only uses AcquireNotify/AcquireWrite if these properties exist
+        if self.acquire_notify:
+            properties[GATT_CHRC_IFACE]['NotifyAcquired'] = dbus.Boolean(self.notify_socket is not None)
+        if self.acquire_write:
+            properties[GATT_CHRC_IFACE]['WriteAcquired'] = dbus.Boolean(self.write_socket is not None)
+        return properties
 
     def get_path(self):
         return dbus.ObjectPath(self.path)
@@ -209,6 +227,117 @@ class Characteristic(dbus.service.Object):
         print('Default StopNotify called, returning error')
         raise NotSupportedException()
 
+    @dbus.service.method(GATT_CHRC_IFACE,
+                        in_signature='a{sv}',
+                        out_signature='hq')
+    def AcquireNotify(self, options):
+        if not self.acquire_notify:
+            raise NotSupportedException()
+        if self.notify_socket is not None:
+            raise NotPermittedException()
+
+        self.notify_socket, fd, self.notify_mtu = self.create_acquired_socket(options, self.notify_socket_callback)
+        print(f"Notify socket acquired, mtu {self.notify_mtu}")
+        self.StartNotify()
+        return fd, dbus.UInt16(self.notify_mtu)
+
+    @dbus.service.method(GATT_CHRC_IFACE,
+                        in_signature='a{sv}',
+                        out_signature='hq')
+    def AcquireWrite(self, options):
+        if not self.acquire_write:
+            raise NotSupportedException()
+        if self.write_socket is not None:
+            raise NotPermittedException()
+
+        self.write_socket, fd, self.write_mtu = self.create_acquired_socket(options, self.write_socket_callback)
+        print(f"Write socket acquired, mtu {self.write_mtu}")
+        return fd, dbus.UInt16(self.write_mtu)
+
+    def create_acquired_socket(self, options, callback):
+        """
+        Creates the socket pair for AcquireNotify/AcquireWrite, BlueZ gets one end and the other is watched on the
+        GLib main loop.
+
+        Returns:
+            socket: End kept by the characteristic
+            UnixFd: End passed to BlueZ
+            int: MTU of the connection
+        """
+        local, remote = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        local.setblocking(False)
+        fd = dbus.types.UnixFd(remote)
+        remote.close()
+        GObject.io_add_watch(local.fileno(), GObject.IO_IN | GObject.IO_HUP | GObject.IO_ERR, callback)
+        return local, fd, int(options.get('mtu', 23))
+
+    def notify_socket_callback(self, fd, condition):
+        # BlueZ never writes to the notify socket, it is closed when the device unsubscribes or disconnects
+        self.release_notify()
+        return False
+
+    def write_socket_callback(self, fd, condition):
+        if self.write_socket is None:
+            return False
+        if condition & GObject.IO_IN:
+            try:
+                data = self.write_socket.recv(self.write_mtu)
+            except BlockingIOError:
+                return True
+            except OSError as e:
+                print(f"Error reading write socket: {e}")
+                data = b''
+            if data:
+                try:
+                    self.WriteValue([dbus.Byte(b) for b in data], {'mtu': dbus.UInt16(self.write_mtu)})
+                except Exception as e:
+                    print(f"Error handling acquired write: {e}")
+                return True
+        self.release_write()
+        return False
+
+    def release_notify(self):
+        if self.notify_socket is None:
+            return
+        self.notify_socket.close()
+        self.notify_socket = None
+        print("Notify socket released")
+        try:
+            self.StopNotify()
+        except NotSupportedException:
+            pass
+
+    def release_write(self):
+        if self.write_socket is None:
+            return
+        self.write_socket.close()
+        self.write_socket = None
+        print("Write socket released")
+
+    def send_notification(self, value):
+        """
+        Sends value as a notification, over the acquired socket if BlueZ handed one out and through PropertiesChanged
+        otherwise.
+
+        Args:
+            value (list): Bytes to send
+
+        Returns:
+            bool: False if the socket is full and the value has to be sent again later
+        """
+        if self.notify_socket is not None:
+            try:
+                self.notify_socket.send(bytes(value))
+            except BlockingIOError:
+                return False
+            except OSError as e:
+                print(f"Error writing notify socket: {e}")
+                self.release_notify()
+            return True
+
+        self.PropertiesChanged(GATT_CHRC_IFACE, {'Value': dbus.Array(value, signature='y')}, [])
+        return True
+
     @dbus.service.signal(DBUS_PROP_IFACE,
                          signature='sa{sv}as')
     def PropertiesChanged(self, interface, changed, invalidated):